@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.models import User
-from api.models import Profile, Folder, Document, Tag, DocumentPermission
+from api.models import Profile, Folder, Document, Tag, DocumentPermission, DocumentTask, TranslationCacheEntry, AssistantResponseCacheEntry
 
 # --- Personalización del Admin de Usuarios ---
 
@@ -32,8 +32,8 @@ class FolderAdmin(admin.ModelAdmin):
 
 @admin.register(Document)
 class DocumentAdmin(admin.ModelAdmin):
-    list_display = ('id', 'file', 'owner', 'folder', 'uploaded_at')
-    list_filter = ('owner', 'folder', 'tags')
+    list_display = ('id', 'file', 'owner', 'folder', 'processing_status', 'uploaded_at')
+    list_filter = ('owner', 'folder', 'tags', 'processing_status')
     search_fields = ('file', 'owner__username')
 
 
@@ -47,3 +47,23 @@ class TagAdmin(admin.ModelAdmin):
 class DocumentPermissionAdmin(admin.ModelAdmin):
     list_display = ('document', 'user', 'permission_level')
     search_fields = ('document__file', 'user__username')
+
+
+@admin.register(DocumentTask)
+class DocumentTaskAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'document', 'status', 'attempts', 'created_at', 'finished_at')
+    list_filter = ('kind', 'status')
+    search_fields = ('document__file',)
+
+
+@admin.register(TranslationCacheEntry)
+class TranslationCacheEntryAdmin(admin.ModelAdmin):
+    list_display = ('key', 'source_language', 'target_language', 'hits', 'created_at', 'last_used_at')
+    list_filter = ('source_language', 'target_language')
+    search_fields = ('translated_text',)
+
+
+@admin.register(AssistantResponseCacheEntry)
+class AssistantResponseCacheEntryAdmin(admin.ModelAdmin):
+    list_display = ('key', 'model', 'action', 'prompt_version', 'size', 'hits', 'created_at', 'last_used_at')
+    list_filter = ('model', 'action', 'prompt_version')
@@ -0,0 +1,135 @@
+"""
+Caché persistente de las respuestas del modelo para las acciones deterministas
+del asistente (resumen, mapa conceptual, carpeta sugerida): repetir la misma
+acción sobre el mismo contenido no vuelve a llamar al modelo.
+
+La clave es el hash del modelo (LLMProvider.identifier: las respuestas de un
+modelo, o del modelo falso, no se sirven con otro), la acción, la versión de
+su prompt (PROMPT_VERSIONS en api/gemini_service.py; al cambiar un prompt se
+sube su versión y las respuestas anteriores dejan de usarse) y el contenido
+enviado. Las entradas
+viven en la tabla AssistantResponseCacheEntry, compartida entre procesos, y
+cuando ocupan más de ASSISTANT_CACHE_MAX_BYTES se eliminan las menos usadas.
+Las respuestas vacías y los errores del modelo nunca se guardan.
+"""
+import hashlib
+import threading
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import AssistantResponseCacheEntry
+
+# Cada cuántas escrituras en la tabla se comprueba su tamaño
+_PRUNE_EVERY = 50
+
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+_db_writes = 0
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def cache_key(model, action, prompt_version, content):
+    digest = hashlib.sha256()
+    digest.update(f'{model}\0{action}:{prompt_version}\0'.encode('utf-8'))
+    digest.update(content.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _read(key):
+    response = AssistantResponseCacheEntry.objects.filter(key=key).values_list('response', flat=True).first()
+    if response is not None:
+        AssistantResponseCacheEntry.objects.filter(key=key).update(
+            hits=F('hits') + 1, last_used_at=timezone.now())
+    return response
+
+
+def _write(key, model, action, prompt_version, response):
+    global _db_writes
+    try:
+        with transaction.atomic():
+            AssistantResponseCacheEntry.objects.create(
+                key=key,
+                model=model,
+                action=action,
+                prompt_version=prompt_version,
+                response=response,
+                size=len(response.encode('utf-8')),
+            )
+    except IntegrityError:
+        pass  # otro proceso la guardó a la vez
+    with _stats_lock:
+        _db_writes += 1
+        prune = _db_writes % _PRUNE_EVERY == 0
+    if prune:
+        prune_assistant_cache()
+
+
+def cached_generate(generate, model, action, prompt_version, content, prompt, on_hit=None):
+    """
+    Respuesta del modelo `model` (su identifier) a `prompt` (`generate(prompt)`),
+    que se deriva solo de `content` y de la versión del prompt de `action`. Si
+    ese modelo ya la dio, se devuelve sin llamarlo (y se pasa a `on_hit`).
+    """
+    key = cache_key(model, action, prompt_version, content)
+    cached = _read(key)
+    if cached is not None:
+        _count('hits')
+        if on_hit is not None:
+            on_hit(cached)
+        return cached
+
+    _count('misses')
+    response = generate(prompt)
+    if response and response.strip():
+        _write(key, model, action, prompt_version, response)
+    return response
+
+
+def prune_assistant_cache(max_bytes=None):
+    """
+    Si las respuestas guardadas ocupan más de `max_bytes`, elimina las menos
+    usadas hasta bajar del límite. Devuelve el número de filas eliminadas.
+    """
+    max_bytes = max_bytes if max_bytes is not None else getattr(
+        settings, 'ASSISTANT_CACHE_MAX_BYTES', 50 * 1024 * 1024)
+    excess = (AssistantResponseCacheEntry.objects.aggregate(total=Sum('size'))['total'] or 0) - max_bytes
+    if excess <= 0:
+        return 0
+    oldest = []
+    for pk, size in AssistantResponseCacheEntry.objects.order_by('last_used_at', 'pk').values_list('pk', 'size').iterator():
+        oldest.append(pk)
+        excess -= size
+        if excess <= 0:
+            break
+    deleted, _ = AssistantResponseCacheEntry.objects.filter(pk__in=oldest).delete()
+    return deleted
+
+
+def assistant_cache_stats():
+    """Aciertos y fallos del proceso, entradas y bytes guardados."""
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else 0.0
+    totals = AssistantResponseCacheEntry.objects.aggregate(bytes=Sum('size'))
+    stats['entries'] = AssistantResponseCacheEntry.objects.count()
+    stats['bytes'] = totals['bytes'] or 0
+    return stats
+
+
+def clear_assistant_cache(persistent=True):
+    """Vacía la tabla (si `persistent`) y reinicia los contadores."""
+    global _db_writes
+    if persistent:
+        AssistantResponseCacheEntry.objects.all().delete()
+    with _stats_lock:
+        for name in _stats:
+            _stats[name] = 0
+        _db_writes = 0
@@ -0,0 +1,130 @@
+"""
+Contexto del asistente de IA (GeminiAssistant.process_command).
+
+En lugar de volcar en cada prompt todos los documentos, carpetas y etiquetas
+del usuario, se guarda en la caché de Django una instantánea compacta por
+usuario (4 consultas con values_list, sin N+1) y de ella se eligen los
+documentos más relacionados con lo que pide el usuario: coincidencias con el
+nombre del archivo, sus etiquetas, su carpeta o su ID. Cada sección tiene un
+máximo de entradas (ASSISTANT_CONTEXT_MAX_*).
+
+La instantánea se invalida con las señales de Document, Folder y Tag (ver
+api/models.py) y caduca a los ASSISTANT_CONTEXT_CACHE_TTL segundos.
+"""
+import os
+import re
+import unicodedata
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Document, Folder, Tag
+
+_WORD = re.compile(r'\w+')
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _cache_key(user_id):
+    return f'assistant_context:{user_id}'
+
+
+def invalidate_context(user_id):
+    cache.delete(_cache_key(user_id))
+
+
+def _words(text):
+    """Palabras en minúsculas y sin tildes (al menos 3 letras, o números)."""
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return {word for word in _WORD.findall(text.replace('_', ' ')) if len(word) >= 3 or word.isdigit()}
+
+
+def user_snapshot(user_id):
+    """
+    Documentos (id, nombre, carpeta, etiquetas, palabras para la búsqueda),
+    carpetas (id, nombre) y etiquetas del usuario, del más reciente al más
+    antiguo. Las palabras se calculan aquí para no repetirlo en cada prompt.
+    """
+    key = _cache_key(user_id)
+    snapshot = cache.get(key)
+    if snapshot is not None:
+        return snapshot
+
+    tags_by_document = defaultdict(list)
+    for document_id, tag_name in Document.tags.through.objects.filter(
+            document__owner_id=user_id).values_list('document_id', 'tag__name'):
+        tags_by_document[document_id].append(tag_name)
+
+    snapshot = {
+        'documents': [
+            _document_entry(doc_id, name, folder_name, tags_by_document.get(doc_id, ()))
+            for doc_id, name, folder_name in Document.objects.filter(owner_id=user_id)
+            .order_by('-id').values_list('id', 'file', 'folder__name')
+        ],
+        'folders': list(Folder.objects.filter(owner_id=user_id).order_by('-id').values_list('id', 'name')),
+        'tags': list(Tag.objects.filter(owner_id=user_id).order_by('name').values_list('name', flat=True)),
+    }
+    cache.set(key, snapshot, _setting('ASSISTANT_CONTEXT_CACHE_TTL', 600))
+    return snapshot
+
+
+def _document_entry(doc_id, name, folder_name, tags):
+    search_words = {
+        'name': frozenset(_words(os.path.basename(name))),
+        'tags': frozenset(word for tag in tags for word in _words(tag)),
+        'folder': frozenset(_words(folder_name or '')),
+    }
+    return (doc_id, name, folder_name, tuple(tags), search_words)
+
+
+def _document_score(document, words):
+    doc_id, _, _, _, search_words = document
+    score = 10 if str(doc_id) in words else 0
+    score += 3 * len(words & search_words['name'])
+    score += 2 * len(words & search_words['tags'])
+    score += len(words & search_words['folder'])
+    return score
+
+
+def _top(items, limit, score):
+    """Los `limit` elementos con más puntuación; a igualdad, en su orden (más recientes primero)."""
+    ranked = sorted(enumerate(items), key=lambda pair: (-score(pair[1]), pair[0]))
+    return [item for _, item in ranked[:limit]]
+
+
+def build_context(user, prompt):
+    """Texto con los documentos, carpetas y etiquetas más relevantes para `prompt`."""
+    snapshot = user_snapshot(user.id)
+    words = _words(prompt or '')
+    documents = _top(snapshot['documents'], _setting('ASSISTANT_CONTEXT_MAX_DOCUMENTS', 40),
+                     lambda document: _document_score(document, words))
+    folders = _top(snapshot['folders'], _setting('ASSISTANT_CONTEXT_MAX_FOLDERS', 30),
+                   lambda folder: len(_words(folder[1]) & words))
+    tags = _top(snapshot['tags'], _setting('ASSISTANT_CONTEXT_MAX_TAGS', 50),
+                lambda tag: len(_words(tag) & words))
+
+    lines = ['DOCUMENTOS:']
+    for doc_id, name, folder_name, doc_tags, _ in documents:
+        line = f"- ID: {doc_id}, Nombre: {name}, Carpeta: {folder_name or 'Raíz'}"
+        if doc_tags:
+            line += f", Etiquetas: {', '.join(doc_tags)}"
+        lines.append(line)
+    _append_remaining(lines, len(snapshot['documents']) - len(documents), 'documentos')
+
+    lines += ['', 'CARPETAS:']
+    lines += [f'- ID: {folder_id}, Nombre: {name}' for folder_id, name in folders]
+    _append_remaining(lines, len(snapshot['folders']) - len(folders), 'carpetas')
+
+    lines += ['', 'ETIQUETAS EXISTENTES:']
+    lines += [f'- Nombre: {name}' for name in tags]
+    _append_remaining(lines, len(snapshot['tags']) - len(tags), 'etiquetas')
+    return '\n'.join(lines) + '\n'
+
+
+def _append_remaining(lines, remaining, label):
+    if remaining > 0:
+        lines.append(f'- (y {remaining} {label} más, menos relacionados con la solicitud)')
@@ -0,0 +1,65 @@
+"""
+Respuestas del asistente de IA en streaming (Server-Sent Events).
+
+`ai_assistant_stream` devuelve un text/event-stream con los eventos de
+GeminiAssistant según ocurren:
+
+    event: progress   {"stage": "context" | "interpret" | "action" | "tag_all", ...}
+    event: token      {"text": "..."}   texto generado por el modelo (resúmenes, mapas...); de la caché llega entero en uno
+    event: result     el mismo JSON que devuelve ai_assistant
+    event: error      {"error": "..."}
+
+El asistente es síncrono (ORM y modelo), así que se ejecuta en un hilo fuera
+del de las vistas síncronas y manda los eventos al bucle de asyncio; el
+generador asíncrono que los escribe no ocupa ningún hilo mientras espera.
+"""
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.db import connection
+from rest_framework.renderers import BaseRenderer
+
+from .gemini_service import GeminiAssistant
+
+
+def sse_frame(event, data):
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+
+class EventStreamRenderer(BaseRenderer):
+    """Para que DRF acepte `Accept: text/event-stream`; los errores salen como evento `error`."""
+    media_type = 'text/event-stream'
+    format = 'sse'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return sse_frame('error', data)
+
+
+async def assistant_events(user, prompt):
+    """Frames SSE con el progreso de `prompt`, terminando en `result` (o `error`)."""
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+
+    def emit(event, data):
+        loop.call_soon_threadsafe(queue.put_nowait, (event, data))
+
+    def run():
+        try:
+            result = GeminiAssistant(user, on_event=emit).process_command(prompt)
+            emit('result', result)
+        except Exception as e:
+            emit('error', {'error': str(e)})
+        finally:
+            connection.close()
+            emit(None, None)
+
+    # Si el cliente se desconecta, el hilo termina la acción igualmente
+    worker = asyncio.ensure_future(sync_to_async(run, thread_sensitive=False)())
+    while True:
+        event, data = await queue.get()
+        if event is None:
+            break
+        yield sse_frame(event, data)
+    await worker
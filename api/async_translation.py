@@ -0,0 +1,263 @@
+"""
+Traducción asíncrona para el chat.
+
+`translate_text_async` hace lo mismo que translation.translate_text (mismas
+validaciones y misma caché de dos niveles) pero la llamada al servicio de
+traducción es una corrutina: no ocupa un hilo del executor mientras espera
+la respuesta, así que una ráfaga de mensajes no bloquea las consultas a la BD
+de los consumidores. Las entradas de la caché se guardan con el identifier
+del servicio, separadas de las de googletrans.
+
+La caché en BD se consulta desde TRANSLATION_CACHE_DB_THREADS hilos propios
+con database_sync_to_async: cada hilo conserva su conexión (CONN_MAX_AGE) en
+vez de abrir una por consulta.
+
+El servicio se elige con el ajuste TRANSLATION_PROVIDER:
+
+    TRANSLATION_PROVIDER = {
+        'BACKEND': 'api.async_translation.GoogleTranslateProvider',
+        'OPTIONS': {'timeout': 10},
+    }
+
+Cualquier subclase de TranslationProvider sirve; FakeTranslationProvider
+traduce en local (pruebas y desarrollo sin red). Como mucho hay
+TRANSLATION_MAX_CONCURRENCY traducciones en curso por event loop y cada una
+se corta a los TRANSLATION_TIMEOUT segundos.
+"""
+import asyncio
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import connection
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from .translation import _count, _memory_cache, _read_db, _write_db, cache_key, validate_languages
+
+
+class TranslationProvider:
+    """
+    Interfaz de los servicios de traducción. `translate` devuelve
+    {'translated_text', 'detected_source_language'} o lanza una excepción.
+    """
+
+    async def translate(self, text, target_language, source_language=None):
+        raise NotImplementedError
+
+    async def aclose(self):
+        pass
+
+    @property
+    def identifier(self):
+        """Nombre del servicio; forma parte de la clave de la caché."""
+        return f'{type(self).__module__}.{type(self).__qualname__}'
+
+
+class GoogleTranslateProvider(TranslationProvider):
+    """
+    Endpoint público de Google Translate (el mismo que usa googletrans) con un
+    httpx.AsyncClient de larga duración por event loop, que reutiliza las
+    conexiones entre mensajes.
+    """
+    URL = 'https://translate.googleapis.com/translate_a/single'
+
+    def __init__(self, timeout=10.0, max_connections=20, transport=None):
+        self.timeout = timeout
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self.transport = transport
+        self._clients = weakref.WeakKeyDictionary()
+
+    @property
+    def identifier(self):
+        return 'google-gtx'
+
+    def _client(self):
+        # Un cliente httpx no puede usarse desde otro event loop
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            client = self._clients[loop] = httpx.AsyncClient(
+                timeout=self.timeout, limits=self.limits, transport=self.transport,
+                headers={'User-Agent': 'Mozilla/5.0'})
+        return client
+
+    async def translate(self, text, target_language, source_language=None):
+        response = await self._client().get(self.URL, params={
+            'client': 'gtx',
+            'sl': source_language or 'auto',
+            'tl': target_language,
+            'dt': 't',
+            'q': text,
+        })
+        response.raise_for_status()
+        data = response.json()
+        return {
+            'translated_text': ''.join(segment[0] for segment in data[0] or [] if segment and segment[0]),
+            'detected_source_language': data[2] if len(data) > 2 and data[2] else source_language,
+        }
+
+    async def aclose(self):
+        loop = asyncio.get_running_loop()
+        client = self._clients.pop(loop, None)
+        if client is not None:
+            await client.aclose()
+
+
+class FakeTranslationProvider(TranslationProvider):
+    """Traductor local: '[idioma] texto' tras `delay` segundos. Cuenta las llamadas."""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = []
+        self.active = 0
+        self.peak = 0
+
+    async def translate(self, text, target_language, source_language=None):
+        self.calls.append((text, target_language, source_language))
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.active -= 1
+        return {'translated_text': f'[{target_language}] {text}', 'detected_source_language': source_language}
+
+
+_provider = None
+_semaphores = weakref.WeakKeyDictionary()
+
+_db_lock = threading.Lock()
+_db_executor = None
+_db_threads = 0
+
+
+def get_provider():
+    """Instancia del servicio configurado en TRANSLATION_PROVIDER (una por proceso)."""
+    global _provider
+    if _provider is None:
+        config = getattr(settings, 'TRANSLATION_PROVIDER', {})
+        backend = import_string(config.get('BACKEND', 'api.async_translation.GoogleTranslateProvider'))
+        _provider = backend(**config.get('OPTIONS', {}))
+    return _provider
+
+
+def reset_provider():
+    """
+    Descarta el servicio, los semáforos y los hilos de la caché en BD (se crean
+    de nuevo con los ajustes actuales).
+    """
+    global _provider
+    _provider = None
+    _semaphores.clear()
+    close_db_connections()
+
+
+def _count_thread():
+    global _db_threads
+    with _db_lock:
+        _db_threads += 1
+
+
+def _executor():
+    global _db_executor
+    with _db_lock:
+        if _db_executor is None:
+            _db_executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'TRANSLATION_CACHE_DB_THREADS', 4),
+                thread_name_prefix='translation-cache', initializer=_count_thread)
+        return _db_executor
+
+
+def close_db_connections():
+    """Termina los hilos de la caché en BD y cierra sus conexiones."""
+    global _db_executor, _db_threads
+    with _db_lock:
+        executor, _db_executor = _db_executor, None
+        threads, _db_threads = _db_threads, 0
+    if executor is None:
+        return
+    # Una tarea por hilo: cada una espera en la barrera a las demás, así que
+    # ningún hilo ejecuta dos y todos cierran su propia conexión
+    barrier = threading.Barrier(threads or 1, timeout=5)
+
+    def close():
+        try:
+            barrier.wait()
+        except threading.BrokenBarrierError:
+            pass
+        connection.close()
+
+    for _ in range(threads):
+        executor.submit(close)
+    executor.shutdown(wait=True)
+
+
+async def _in_db_thread(func, *args):
+    """
+    Ejecuta `func` en un hilo de la caché. Como database_sync_to_async, cierra
+    la conexión solo si está rota o supera CONN_MAX_AGE; si no, la reutiliza.
+    """
+    return await database_sync_to_async(func, thread_sensitive=False, executor=_executor())(*args)
+
+
+@receiver(setting_changed)
+def _settings_changed(setting, **kwargs):
+    if setting in ('TRANSLATION_PROVIDER', 'TRANSLATION_MAX_CONCURRENCY', 'TRANSLATION_CACHE_DB_THREADS'):
+        reset_provider()
+
+
+def _semaphore():
+    loop = asyncio.get_running_loop()
+    semaphore = _semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _semaphores[loop] = asyncio.Semaphore(getattr(settings, 'TRANSLATION_MAX_CONCURRENCY', 8))
+    return semaphore
+
+
+async def translate_text_async(text, target_language, source_language=None):
+    """
+    Versión asíncrona de translation.translate_text. Solo la caché en BD pasa
+    por un hilo; los aciertos en memoria y la llamada al servicio no.
+    """
+    error, source_language = validate_languages(target_language, source_language)
+    if error:
+        return error
+
+    provider = get_provider()
+    key = cache_key(text, target_language, source_language, provider=provider.identifier)
+    cached = _memory_cache.get(key)
+    if cached is not None:
+        _count('memory_hits')
+        return dict(cached)
+
+    entry = await _in_db_thread(_read_db, key)
+    if entry is not None:
+        _count('db_hits')
+        result = {
+            'translated_text': entry['translated_text'],
+            'detected_source_language': entry['detected_source_language'],
+        }
+        _memory_cache.set(key, result)
+        return dict(result)
+
+    _count('misses')
+    try:
+        async with _semaphore():
+            result = await asyncio.wait_for(
+                provider.translate(text, target_language, source_language),
+                timeout=getattr(settings, 'TRANSLATION_TIMEOUT', 10))
+    except asyncio.TimeoutError:
+        _count('errors')
+        return {'error': "Ocurrió un error durante la traducción: tiempo de espera agotado"}
+    except Exception as e:
+        _count('errors')
+        return {'error': f"Ocurrió un error durante la traducción: {str(e)}"}
+
+    _memory_cache.set(key, result)
+    await _in_db_thread(_write_db, key, target_language, source_language, result)
+    return dict(result)
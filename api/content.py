@@ -0,0 +1,126 @@
+"""
+Escritura y lectura por páginas de Document.extracted_content.
+
+La extracción escribe el texto en la base de datos por bloques (sin reunir el
+documento entero en memoria) y guarda en `page_offsets` la posición de inicio
+de cada página. Con ese mapa, la búsqueda o el asistente pueden leer una página
+con SUBSTRING en la base de datos en lugar de cargar todo el contenido.
+"""
+from bisect import bisect_right
+
+from django.db.models import F, Value
+from django.db.models.functions import Concat, Length, Substr
+from django.utils import timezone
+
+from .models import Document
+
+# Caracteres acumulados antes de cada escritura incremental
+FLUSH_CHARS = 512 * 1024
+
+
+def write_extracted_content(document, chunks, flush_chars=None):
+    """
+    Consume un iterable de (página, fragmento) y lo añade a extracted_content
+    con UPDATE ... SET extracted_content = extracted_content || fragmento.
+    Al terminar guarda el mapa de páginas y reindexa la búsqueda.
+    Devuelve el número de caracteres escritos.
+    """
+    flush_chars = flush_chars or FLUSH_CHARS
+    queryset = Document.objects.filter(pk=document.pk)
+    queryset.update(extracted_content='', page_offsets=[])
+
+    offsets = []
+    length = 0
+    buffer = []
+    buffered = 0
+
+    def flush():
+        nonlocal buffer, buffered
+        if buffer:
+            queryset.update(extracted_content=Concat(
+                F('extracted_content'), Value(''.join(buffer))))
+            buffer, buffered = [], 0
+
+    for page, chunk in chunks:
+        # Las páginas sin texto comparten posición con la siguiente
+        while len(offsets) <= page:
+            offsets.append(length)
+        buffer.append(chunk)
+        buffered += len(chunk)
+        length += len(chunk)
+        if buffered >= flush_chars:
+            flush()
+    flush()
+
+    queryset.update(page_offsets=offsets, modified_at=timezone.now())
+    from .search import index_documents
+    index_documents([document.pk])
+    return length
+
+
+def page_count(document):
+    """Número de páginas del documento (1 si no hay mapa pero sí contenido)."""
+    return len(document.page_offsets) or 1
+
+
+def page_for_offset(page_offsets, offset):
+    """Página (empezando en 0) que contiene el carácter en la posición `offset`."""
+    if not page_offsets:
+        return 0
+    return max(0, bisect_right(page_offsets, offset) - 1)
+
+
+def _page_bounds(document, page):
+    offsets = document.page_offsets or [0]
+    if page < 0 or page >= len(offsets):
+        raise IndexError(f"El documento no tiene la página {page + 1}")
+    start = offsets[page]
+    end = offsets[page + 1] if page + 1 < len(offsets) else None
+    return start, end
+
+
+def get_page_text(document, page):
+    """
+    Devuelve el texto de la página `page` (empezando en 0) leyendo solo ese
+    tramo de la base de datos. `document` puede tener extracted_content diferido.
+    """
+    start, end = _page_bounds(document, page)
+    length = end - start if end is not None else Length('extracted_content')
+    text = Document.objects.filter(pk=document.pk).annotate(
+        page_text=Substr('extracted_content', start + 1, length)
+    ).values_list('page_text', flat=True).first() or ''
+    # El separador entre páginas pertenece a la página anterior
+    if end is not None and text[-1:] in ('\n', '\f'):
+        text = text[:-1]
+    return text
+
+
+def get_content_excerpt(document_id, max_chars):
+    """Primeros `max_chars` caracteres del contenido, sin cargar el resto."""
+    return Document.objects.filter(pk=document_id).annotate(
+        excerpt=Substr('extracted_content', 1, max_chars)
+    ).values_list('excerpt', flat=True).first() or ''
+
+
+def content_length(document_id):
+    """Longitud en caracteres de extracted_content, calculada en la base de datos."""
+    return Document.objects.filter(pk=document_id).annotate(
+        content_length=Length('extracted_content')
+    ).values_list('content_length', flat=True).first() or 0
+
+
+def iter_content_chunks(document_id, chunk_chars=64 * 1024):
+    """
+    Recorre extracted_content en tramos de `chunk_chars` caracteres, con una
+    consulta SUBSTRING por tramo, sin cargar nunca el texto completo.
+    """
+    total = content_length(document_id)
+    start = 0
+    while start < total:
+        chunk = Document.objects.filter(pk=document_id).annotate(
+            chunk=Substr('extracted_content', start + 1, chunk_chars)
+        ).values_list('chunk', flat=True).first()
+        if not chunk:
+            break
+        yield chunk
+        start += len(chunk)
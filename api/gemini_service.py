@@ -1,33 +1,67 @@
-import google.generativeai as genai
 import os
 from django.conf import settings
 from .models import Document, Folder, Tag, DocumentPermission
 from django.contrib.auth.models import User
 from .text_extractor import extract_text
+from .assistant_context import build_context, invalidate_context
+from .llm import get_llm
+from .assistant_cache import cached_generate
 from django.core.files.base import ContentFile
 import json
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
+from django.db.models.functions import Substr
 from reportlab.lib.pagesizes import letter
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
 from reportlab.lib.styles import getSampleStyleSheet
 
-# Configurar Gemini
-genai.configure(api_key=os.environ.get('GEMINI_API_KEY'))
+# Versión del prompt de cada acción cuya respuesta se guarda en caché (ver
+# api/assistant_cache.py). Subirla al cambiar el prompt invalida las respuestas guardadas.
+PROMPT_VERSIONS = {
+    'create_mindmap': 1,
+    'summarize': 1,
+    'organize': 1,
+}
 
 class GeminiAssistant:
-    def __init__(self, user):
+    def __init__(self, user, llm=None, on_event=None):
         self.user = user
-        self.model = genai.GenerativeModel('gemini-2.5-flash')
+        # Modelo configurado en LLM_PROVIDER (ver api/llm.py)
+        self.llm = llm or get_llm()
+        # Si se indica, recibe (evento, datos) con el progreso y el texto
+        # generado según llega (ver api/assistant_stream.py)
+        self.on_event = on_event
+
+    def _emit(self, event, data):
+        if self.on_event is not None:
+            self.on_event(event, data)
+
+    def _generate(self, prompt):
+        """Texto del modelo; con on_event se pide en streaming y se emite cada fragmento."""
+        if self.on_event is None:
+            return self.llm.generate(prompt)
+        parts = []
+        for chunk in self.llm.stream(prompt):
+            parts.append(chunk)
+            self._emit('token', {'text': chunk})
+        return ''.join(parts)
+
+    def _cached_generate(self, action, content, prompt):
+        """
+        `_generate` con la caché de api/assistant_cache.py. Una respuesta
+        guardada se emite entera como un único fragmento de texto.
+        """
+        return cached_generate(self._generate, self.llm.identifier, action, PROMPT_VERSIONS[action],
+                               content, prompt, on_hit=lambda text: self._emit('token', {'text': text}))
     
     def process_command(self, prompt):
         """
         Procesa el comando del usuario y ejecuta la acción correspondiente
         """
-        # Obtener contexto de documentos y carpetas del usuario
-        documents = Document.objects.filter(owner=self.user)
-        folders = Folder.objects.filter(owner=self.user)
-        
-        context = self._build_context(documents, folders)
+        # Obtener contexto de documentos y carpetas del usuario (solo lo más
+        # relacionado con la solicitud, ver api/assistant_context.py)
+        self._emit('progress', {'stage': 'context'})
+        context = self._build_context(prompt)
         
         # Crear el prompt completo para Gemini
         full_prompt = f"""
@@ -64,9 +98,8 @@ Acciones disponibles:
         """
         
         try:
-            response = self.model.generate_content(full_prompt)
-            
-            raw_text = response.text
+            self._emit('progress', {'stage': 'interpret'})
+            raw_text = self.llm.generate(full_prompt)
             
             json_start = raw_text.find('{')
             json_end = raw_text.rfind('}')
@@ -87,29 +120,15 @@ Acciones disponibles:
                 'message': f'Error al procesar el comando: {str(e)}'
             }
     
-    def _build_context(self, documents, folders):
+    def _build_context(self, prompt):
         """Construye el contexto de documentos, carpetas y etiquetas"""
-        context = "DOCUMENTOS:\n"
-        for doc in documents:
-            context += f"- ID: {doc.id}, Nombre: {doc.file.name}, Carpeta: {doc.folder.name if doc.folder else 'Raíz'}\n"
-        
-        context += "\nCARPETAS:\n"
-        for folder in folders:
-            context += f"- ID: {folder.id}, Nombre: {folder.name}\n"
-        
-        # --- INICIO DE LA MODIFICACIÓN ---
-        context += "\nETIQUETAS EXISTENTES:\n"
-        tags = Tag.objects.filter(owner=self.user)
-        for tag in tags:
-            context += f"- Nombre: {tag.name}\n"
-        # --- FIN DE LA MODIFICACIÓN ---
-
-        return context
+        return build_context(self.user, prompt)
     
     def _execute_action(self, action_data):
         """Ejecuta la acción determinada por Gemini"""
         action = action_data.get('action')
         params = action_data.get('parameters', {})
+        self._emit('progress', {'stage': 'action', 'action': action, 'message': action_data.get('message', '')})
 
         if action == 'create_mindmap':
             if self.user.profile.subscription_plan != 'premium':
@@ -166,26 +185,79 @@ Acciones disponibles:
             'message': f'Etiqueta "{tag_name}" asignada al documento {document.file.name}'
         }
 
-    def _tag_all_documents(self, params):
-        """Etiqueta todos los documentos según su contenido"""
-        documents = Document.objects.filter(owner=self.user)
-        tagged_count = 0
-        
-        for doc in documents:
-            if doc.extracted_content:
-                # Usar Gemini para sugerir etiquetas
-                prompt = f"Analiza este contenido y sugiere UNA etiqueta corta (máx 2 palabras):\n\n{doc.extracted_content[:500]}"
-                response = self.model.generate_content(prompt)
-                tag_name = response.text.strip().replace('"', '')
-                
-                tag, created = Tag.objects.get_or_create(name=tag_name, owner=self.user)
-                doc.tags.add(tag)
-                tagged_count += 1
-        
+    def _tag_all_documents(self, params, batch_size=None, workers=None):
+        """
+        Etiqueta todos los documentos según su contenido. Los fragmentos se
+        envían a Gemini por lotes (un prompt con varios documentos que devuelve
+        un JSON {id: etiqueta}) y los lotes van en paralelo con un pool de
+        hilos acotado. Las etiquetas y las relaciones se crean con bulk_create.
+        """
+        batch_size = batch_size or getattr(settings, 'ASSISTANT_TAG_BATCH_SIZE', 25)
+        workers = workers or getattr(settings, 'ASSISTANT_TAG_WORKERS', 4)
+        snippets = list(
+            Document.objects.filter(owner=self.user).exclude(extracted_content='')
+            .annotate(snippet=Substr('extracted_content', 1, 500))
+            .order_by('id').values_list('id', 'snippet'))
+        batches = [snippets[i:i + batch_size] for i in range(0, len(snippets), batch_size)]
+
+        suggestions, failed = {}, 0
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(batches)))) as pool:
+            for done, (batch, result) in enumerate(zip(batches, pool.map(self._suggest_tags, batches)), 1):
+                suggestions.update(result)
+                failed += len(batch) - len(result)
+                self._emit('progress', {'stage': 'tag_all', 'batches_done': done, 'batches': len(batches)})
+
+        tagged_count = self._apply_tags(suggestions)
+        message = f'{tagged_count} documentos etiquetados automáticamente'
+        if failed:
+            message += f' ({failed} sin etiqueta por errores de la IA)'
         return {
             'success': True,
-            'message': f'{tagged_count} documentos etiquetados automáticamente'
+            'message': message
         }
+
+    def _suggest_tags(self, batch):
+        """Pide a Gemini una etiqueta para cada documento del lote. Devuelve {id: etiqueta}."""
+        if len(batch) == 1:
+            doc_id, snippet = batch[0]
+            prompt = f"Analiza este contenido y sugiere UNA etiqueta corta (máx 2 palabras):\n\n{snippet}"
+        else:
+            documents = '\n\n'.join(f'### Documento {doc_id}\n{snippet}' for doc_id, snippet in batch)
+            prompt = (
+                "Para cada documento, analiza su contenido y sugiere UNA etiqueta corta (máx 2 palabras).\n"
+                "Responde SOLO con un JSON cuyas claves son los números de documento y los valores "
+                'las etiquetas, por ejemplo {"12": "Facturas", "15": "Recetas"}.\n\n' + documents)
+        try:
+            raw_text = self.llm.generate(prompt)
+            if len(batch) == 1:
+                return {batch[0][0]: raw_text}
+            data = json.loads(raw_text[raw_text.find('{'):raw_text.rfind('}') + 1])
+        except Exception as e:
+            print(f"❌ Error etiquetando un lote de {len(batch)} documentos: {e}")
+            return {}
+        ids = {doc_id for doc_id, _ in batch}
+        return {int(key): value for key, value in data.items()
+                if str(key).isdigit() and int(key) in ids and isinstance(value, str)}
+
+    def _apply_tags(self, suggestions):
+        """Crea las etiquetas que falten y las asigna en bloque. Devuelve los documentos etiquetados."""
+        names = {}
+        for doc_id, tag_name in suggestions.items():
+            tag_name = tag_name.strip().replace('"', '')[:50]
+            if tag_name:
+                names[doc_id] = tag_name
+        if not names:
+            return 0
+
+        Tag.objects.bulk_create(
+            [Tag(name=name, owner=self.user) for name in set(names.values())], ignore_conflicts=True)
+        tag_ids = dict(Tag.objects.filter(owner=self.user, name__in=set(names.values())).values_list('name', 'id'))
+        Document.tags.through.objects.bulk_create(
+            [Document.tags.through(document_id=doc_id, tag_id=tag_ids[name]) for doc_id, name in names.items()],
+            ignore_conflicts=True)
+        # bulk_create no envía señales: el contexto del asistente se invalida aquí
+        invalidate_context(self.user.id)
+        return len(names)
     
     def _create_mindmap(self, params):
         """Crea un mapa conceptual de un documento en formato HTML interactivo"""
@@ -211,7 +283,9 @@ Acciones disponibles:
             file_ext = os.path.splitext(filename)[1].lower()
             
             # Mensaje específico según el tipo de archivo
-            if file_ext in ['.docx', '.doc']:
+            if document.processing_status in (Document.STATUS_PENDING, Document.STATUS_PROCESSING):
+                message = f'⏳ El documento "{filename}" todavía se está procesando. Intenta nuevamente en unos segundos.'
+            elif file_ext in ['.docx', '.doc']:
                 message = f'⚠️ El documento "{filename}" aún no ha sido procesado. Los archivos .docx pueden tardar unos segundos. Por favor, recarga la página e intenta nuevamente en 10 segundos.'
             elif file_ext == '.pdf':
                 message = f'⚠️ El documento "{filename}" no tiene contenido extraído. Puede ser un PDF escaneado (imagen). Intenta con otro documento o espera a que se procese.'
@@ -339,8 +413,7 @@ Acciones disponibles:
         {document.extracted_content[:3000]}
         """
         
-        response = self.model.generate_content(prompt)
-        mindmap_html = response.text
+        mindmap_html = self._cached_generate('create_mindmap', document.extracted_content[:3000], prompt)
         
         # Limpiar el HTML si viene con markdown
         if '```html' in mindmap_html:
@@ -374,8 +447,7 @@ Acciones disponibles:
         
         # Generar contenido con Gemini
         prompt = f"Escribe un documento completo sobre: {topic}. Debe ser informativo y bien estructurado."
-        response = self.model.generate_content(prompt)
-        content = response.text
+        content = self._generate(prompt)
         
         # Buscar o crear carpeta
         folder = None
@@ -407,8 +479,7 @@ Acciones disponibles:
         
         # Generar resumen
         prompt = f"Resume el siguiente texto de manera concisa:\n\n{document.extracted_content}"
-        response = self.model.generate_content(prompt)
-        summary = response.text
+        summary = self._cached_generate('summarize', document.extracted_content, prompt)
         
         if create_new:
             # Determinar carpeta destino
@@ -452,8 +523,7 @@ Acciones disponibles:
         
         # Traducir con Gemini
         prompt = f"Traduce el siguiente texto a {target_lang}:\n\n{document.extracted_content}"
-        response = self.model.generate_content(prompt)
-        translated_text = response.text
+        translated_text = self._generate(prompt)
         
         # Actualizar documento
         document.extracted_content = translated_text
@@ -471,8 +541,8 @@ Acciones disponibles:
         
         # Analizar contenido para sugerir carpeta
         prompt = f"Basándote en este contenido, sugiere UN nombre de carpeta corto (máx 3 palabras) para organizarlo:\n\n{document.extracted_content[:500]}"
-        response = self.model.generate_content(prompt)
-        folder_name = response.text.strip().replace('"', '')
+        folder_name = self._cached_generate(
+            'organize', document.extracted_content[:500], prompt).strip().replace('"', '')
         
         # Crear o buscar carpeta
         folder, created = Folder.objects.get_or_create(name=folder_name, owner=self.user)
@@ -0,0 +1,158 @@
+"""
+Clientes de modelos de lenguaje para el asistente de IA (api/gemini_service.py).
+
+El modelo se elige con el ajuste LLM_PROVIDER:
+
+    LLM_PROVIDER = {
+        'BACKEND': 'api.llm.GeminiProvider',
+        'OPTIONS': {'model': 'gemini-2.5-flash'},
+    }
+
+Cualquier subclase de LLMProvider sirve. FakeLLMProvider responde en local de
+forma determinista con una latencia configurable (pruebas, benchmarks y
+desarrollo sin red ni clave de API).
+"""
+import json
+import os
+import random
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+
+class LLMProvider:
+    """
+    Interfaz de los modelos: `generate` recibe el prompt y devuelve el texto
+    de la respuesta; `stream` lo devuelve en fragmentos según se genera.
+    """
+
+    def generate(self, prompt):
+        raise NotImplementedError
+
+    def stream(self, prompt):
+        yield self.generate(prompt)
+
+    @property
+    def identifier(self):
+        """Proveedor y modelo; forma parte de la clave de api/assistant_cache.py."""
+        return f'{type(self).__module__}.{type(self).__qualname__}'
+
+
+class GeminiProvider(LLMProvider):
+    """Google Gemini. La librería se configura al crear el proveedor, no al importar el módulo."""
+
+    def __init__(self, model='gemini-2.5-flash', api_key=None):
+        import google.generativeai as genai
+        genai.configure(api_key=api_key or os.environ.get('GEMINI_API_KEY'))
+        self.model_name = model
+        self.model = genai.GenerativeModel(model)
+
+    @property
+    def identifier(self):
+        return f'gemini:{self.model_name}'
+
+    def generate(self, prompt):
+        return self.model.generate_content(prompt).text
+
+    def stream(self, prompt):
+        for chunk in self.model.generate_content(prompt, stream=True):
+            if chunk.text:
+                yield chunk.text
+
+
+_BATCH_DOCUMENT = re.compile(r'### Documento (\d+)\n(\S+)')
+_USER_REQUEST = re.compile(r'El usuario solicita: (.*?)\n\s*\n', re.S)
+_WORD_WITH_SPACE = re.compile(r'\s*\S+\s*')
+
+
+class FakeLLMProvider(LLMProvider):
+    """
+    Modelo local y determinista. Cada llamada tarda `latency` segundos más un
+    extra aleatorio de hasta `jitter` (con semilla `seed`, reproducible). En
+    `stream` ese tiempo se reparte entre fragmentos de `chunk_words` palabras.
+
+    - Etiquetado por lotes: {id: primera palabra de cada documento}.
+    - Prompt del asistente: si la solicitud del usuario es un JSON, lo
+      devuelve tal cual (así un benchmark elige la acción); si no, la acción
+      vacía "none".
+    - Cualquier otro prompt: el primer fragmento de su último párrafo.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, seed=0, chunk_words=8):
+        self.latency = latency
+        self.jitter = jitter
+        self.chunk_words = chunk_words
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def _delay(self):
+        with self._lock:
+            self.calls += 1
+            extra = self._random.uniform(0, self.jitter) if self.jitter else 0.0
+        return self.latency + extra
+
+    def generate(self, prompt):
+        delay = self._delay()
+        if delay:
+            time.sleep(delay)
+        return self._respond(prompt)
+
+    def stream(self, prompt):
+        delay = self._delay()
+        words = _WORD_WITH_SPACE.findall(self._respond(prompt))
+        chunks = [''.join(words[i:i + self.chunk_words]) for i in range(0, len(words), self.chunk_words)]
+        for chunk in chunks:
+            if delay:
+                time.sleep(delay / len(chunks))
+            yield chunk
+
+    def _respond(self, prompt):
+        documents = _BATCH_DOCUMENT.findall(prompt)
+        if documents:
+            return json.dumps({doc_id: word.capitalize() for doc_id, word in documents})
+
+        request = _USER_REQUEST.search(prompt)
+        if request:
+            text = request.group(1).strip()
+            if text.startswith('{'):
+                return text
+            return json.dumps({'action': 'none', 'parameters': {}, 'message': text})
+
+        last_paragraph = prompt.strip().rsplit('\n\n', 1)[-1].strip()
+        if 'etiqueta corta' in prompt or 'nombre de carpeta' in prompt:
+            return (last_paragraph.split() or ['General'])[0].capitalize()
+        return last_paragraph[:200]
+
+
+_provider = None
+_provider_lock = threading.Lock()
+
+
+def get_llm():
+    """Instancia del modelo configurado en LLM_PROVIDER (una por proceso)."""
+    global _provider
+    with _provider_lock:
+        if _provider is None:
+            config = getattr(settings, 'LLM_PROVIDER', {})
+            backend = import_string(config.get('BACKEND', 'api.llm.GeminiProvider'))
+            _provider = backend(**config.get('OPTIONS', {}))
+        return _provider
+
+
+def reset_llm():
+    """Descarta el modelo (se crea de nuevo con los ajustes actuales)."""
+    global _provider
+    with _provider_lock:
+        _provider = None
+
+
+@receiver(setting_changed)
+def _settings_changed(setting, **kwargs):
+    if setting == 'LLM_PROVIDER':
+        reset_llm()
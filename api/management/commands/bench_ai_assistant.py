@@ -0,0 +1,113 @@
+import json
+import statistics
+import threading
+import time
+import uuid
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.llm import FakeLLMProvider, get_llm
+from api.models import AssistantResponseCacheEntry, Document, Folder, Profile, Tag
+from api.views import ai_assistant
+
+
+class TimedFakeLLM(FakeLLMProvider):
+    """FakeLLMProvider que acumula el tiempo de espera al modelo, para restarlo del total."""
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self.waited = 0.0
+        self._waited_lock = threading.Lock()
+
+    def generate(self, prompt):
+        start = time.perf_counter()
+        try:
+            return super().generate(prompt)
+        finally:
+            with self._waited_lock:
+                self.waited += time.perf_counter() - start
+
+
+class Command(BaseCommand):
+    help = ('Mide de extremo a extremo el endpoint ai_assistant con un modelo falso: '
+            'tiempo total, espera al modelo, consultas a la base de datos y el resto '
+            '(contexto, parseo de la respuesta y ejecución de la acción).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50, help='Peticiones por escenario')
+        parser.add_argument('--documents', type=int, default=300)
+        parser.add_argument('--latency', type=float, default=0.0,
+                            help='Segundos que tarda cada llamada al modelo')
+        parser.add_argument('--jitter', type=float, default=0.0)
+
+    def _scenarios(self, document_ids):
+        # El modelo falso devuelve tal cual la solicitud si es un JSON: así se elige la acción
+        return [
+            ('sin acción', lambda i: 'resume el informe de ventas'),
+            ('create_tag', lambda i: json.dumps({'action': 'create_tag', 'parameters': {'tag_name': f'bench {i}'}})),
+            ('tag_document', lambda i: json.dumps({'action': 'tag_document', 'parameters': {
+                'document_id': document_ids[i % len(document_ids)], 'tag_name': 'Bench'}})),
+            ('organize', lambda i: json.dumps({'action': 'organize', 'parameters': {
+                'document_id': document_ids[i % len(document_ids)]}})),
+        ]
+
+    def _request(self, factory, user, prompt):
+        # La cuota no es lo que se mide: se repone fuera del tiempo
+        Profile.objects.filter(user=user).update(daily_ai_requests_count=0)
+        request = factory.post('/api/ai-assistant/', {'prompt': prompt}, format='json')
+        force_authenticate(request, user=user)
+        llm = get_llm()
+        waited = llm.waited
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = ai_assistant(request)
+            response.render()
+            elapsed = time.perf_counter() - start
+        db_time = sum(float(query['time']) for query in queries.captured_queries)
+        return elapsed, llm.waited - waited, len(queries), db_time, response
+
+    def handle(self, *args, **options):
+        topics = ['facturas', 'recetas', 'contratos', 'viajes', 'apuntes']
+        user = User.objects.create_user(f'bench_{uuid.uuid4().hex[:8]}')
+        Profile.objects.filter(user=user).update(subscription_plan='premium')
+        provider = {
+            'BACKEND': 'api.management.commands.bench_ai_assistant.TimedFakeLLM',
+            'OPTIONS': {'latency': options['latency'], 'jitter': options['jitter']},
+        }
+        try:
+            folders = Folder.objects.bulk_create([Folder(owner=user, name=topic) for topic in topics])
+            documents = Document.objects.bulk_create([
+                Document(owner=user, folder=folders[i % len(folders)], file=f'bench/{topics[i % len(topics)]}_{i}.txt',
+                         extracted_content=f'{topics[i % len(topics)]} ' + 'texto de relleno ' * 40)
+                for i in range(options['documents'])])
+            Tag.objects.bulk_create([Tag(owner=user, name=topic.capitalize()) for topic in topics])
+            factory = APIRequestFactory()
+
+            self.stdout.write(f"{options['documents']} documentos, {options['requests']} peticiones por escenario, "
+                              f"modelo {options['latency'] * 1000:.0f} ± {options['jitter'] * 1000:.0f} ms")
+            self.stdout.write(f"{'escenario':>14} {'ms/pet.':>8} {'p95':>7} {'modelo':>7} "
+                              f"{'consultas':>9} {'ms BD':>6} {'resto':>6}")
+            with override_settings(LLM_PROVIDER=provider):
+                for name, prompt in self._scenarios([document.id for document in documents]):
+                    rows = []
+                    for i in range(options['requests']):
+                        elapsed, waited, queries, db_time, response = self._request(factory, user, prompt(i))
+                        if response.status_code != 200:
+                            raise RuntimeError(f'{name}: {response.status_code} {response.data}')
+                        rows.append((elapsed, waited, queries, db_time))
+                    total = [row[0] * 1000 for row in rows]
+                    waited = statistics.mean(row[1] for row in rows) * 1000
+                    db_time = statistics.mean(row[3] for row in rows) * 1000
+                    p95 = statistics.quantiles(total, n=20)[-1] if len(total) > 1 else total[0]
+                    self.stdout.write(
+                        f'{name:>14} {statistics.mean(total):>8.2f} {p95:>7.2f} {waited:>7.2f} '
+                        f'{statistics.mean(row[2] for row in rows):>9.1f} {db_time:>6.2f} '
+                        f'{statistics.mean(total) - waited - db_time:>6.2f}')
+        finally:
+            user.delete()
+            # Las respuestas del modelo falso no son del usuario: se borran aparte
+            AssistantResponseCacheEntry.objects.filter(model=TimedFakeLLM().identifier).delete()
@@ -0,0 +1,48 @@
+import time
+import uuid
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from api.gemini_service import GeminiAssistant
+from api.llm import FakeLLMProvider
+from api.models import Document, Tag
+
+
+class Command(BaseCommand):
+    help = 'Compara el etiquetado automático documento a documento con el etiquetado por lotes en paralelo.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--documents', type=int, default=500)
+        parser.add_argument('--latency', type=float, default=0.2,
+                            help='Segundos que tarda cada llamada al modelo')
+        parser.add_argument('--batch-size', type=int, default=25)
+        parser.add_argument('--workers', type=int, default=4)
+
+    def _run(self, user, latency, batch_size, workers):
+        Tag.objects.filter(owner=user).delete()
+        llm = FakeLLMProvider(latency=latency)
+        assistant = GeminiAssistant(user, llm=llm)
+        start = time.perf_counter()
+        result = assistant._tag_all_documents({}, batch_size=batch_size, workers=workers)
+        return time.perf_counter() - start, llm.calls, result['message']
+
+    def handle(self, *args, **options):
+        topics = ['facturas', 'recetas', 'contratos', 'viajes', 'apuntes']
+        user = User.objects.create_user(f'bench_{uuid.uuid4().hex[:8]}')
+        try:
+            Document.objects.bulk_create([
+                Document(owner=user, file=f'bench/doc_{i}.txt',
+                         extracted_content=f'{topics[i % len(topics)]} ' + 'texto de relleno ' * 40)
+                for i in range(options['documents'])])
+            rows = [
+                ('uno a uno', 1, 1),
+                (f"lotes de {options['batch_size']}, {options['workers']} hilos",
+                 options['batch_size'], options['workers']),
+            ]
+            self.stdout.write(f"{options['documents']} documentos, {options['latency'] * 1000:.0f} ms por llamada")
+            for name, batch_size, workers in rows:
+                elapsed, calls, message = self._run(user, options['latency'], batch_size, workers)
+                self.stdout.write(f'{name:>22}: {elapsed:7.2f} s, {calls:4d} llamadas — {message}')
+        finally:
+            user.delete()
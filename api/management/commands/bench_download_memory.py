@@ -0,0 +1,153 @@
+import asyncio
+import tempfile
+import time
+import tracemalloc
+import uuid
+import warnings
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+from rest_framework.authtoken.models import Token
+
+from api.models import Document
+from api.renderers import render_docx, render_docx_stream, render_pdf, render_pdf_stream
+
+LINE = 'Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor incididunt ut labore.'
+CHUNK_CHARS = 64 * 1024
+
+
+def _build_content(chars):
+    lines = []
+    total = 0
+    while total < chars:
+        line = f'{len(lines)} {LINE}'
+        lines.append(line)
+        total += len(line) + 1
+    return '\n'.join(lines)
+
+
+def _chunks(content):
+    """Simula la lectura por tramos de iter_content_chunks."""
+    for start in range(0, len(content), CHUNK_CHARS):
+        yield content[start:start + CHUNK_CHARS]
+
+
+async def _asgi_download(app, path, token):
+    """
+    Hace la descarga por la aplicación ASGI, como la sirve Daphne, y descarta
+    cada bloque al recibirlo. Devuelve los bytes recibidos.
+    """
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+        'scheme': 'http', 'path': path, 'root_path': '', 'query_string': b'stream=1',
+        'headers': [(b'host', b'localhost'), (b'authorization', f'Token {token}'.encode())],
+        'server': ('localhost', 80), 'client': ('127.0.0.1', 0),
+    }
+    received = 0
+    status = None
+    requested = False
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await asyncio.Event().wait()  # el cliente no se desconecta
+
+    async def send(message):
+        nonlocal received, status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+        elif message['type'] == 'http.response.body':
+            received += len(message.get('body', b''))
+
+    await app(scope, receive, send)
+    if status != 200:
+        raise RuntimeError(f'La descarga respondió {status}')
+    return received
+
+
+class Command(BaseCommand):
+    help = ('Compara la memoria máxima (tracemalloc) de la descarga completa y en streaming: '
+            'los renderizadores solos y la petición completa por ASGI (Daphne), con el '
+            'iterador síncrono que Django acumula con sync_to_async(list) y por bloques.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chars', type=int, nargs='+', default=[100_000, 1_000_000])
+        parser.add_argument('--format', choices=['pdf', 'docx', 'txt', 'all'], default='all')
+
+    def _measure(self, func):
+        tracemalloc.start()
+        start = time.perf_counter()
+        with tempfile.TemporaryFile() as out:
+            func(out)
+            size = out.tell()
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return peak, elapsed, size
+
+    def _measure_asgi(self, app, path, token, sync_iterators):
+        tracemalloc.start()
+        start = time.perf_counter()
+        if sync_iterators:
+            # Como antes: el iterador síncrono tal cual
+            # (Django avisa de que acumula el iterador síncrono: es lo que se mide)
+            with patch('api.views.aiter_blocks', side_effect=lambda iterator: iterator), \
+                    warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                size = asyncio.run(_asgi_download(app, path, token))
+        else:
+            size = asyncio.run(_asgi_download(app, path, token))
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return peak, elapsed, size
+
+    def handle(self, *args, **options):
+        formats = ['pdf', 'docx', 'txt'] if options['format'] == 'all' else [options['format']]
+        renderers = {
+            'pdf': (render_pdf, render_pdf_stream),
+            'docx': (render_docx, render_docx_stream),
+        }
+        mb = 1024 * 1024
+        self.stdout.write('Renderizadores (el texto ya en memoria)')
+        self.stdout.write(
+            f"{'formato':>7} {'caracteres':>11} {'completo (MB)':>14} {'streaming (MB)':>15} "
+            f"{'completo (s)':>13} {'streaming (s)':>14}")
+        for fmt in formats:
+            if fmt not in renderers:
+                continue
+            full, stream = renderers[fmt]
+            for chars in options['chars']:
+                # El texto ya está en memoria antes de medir: solo se compara la generación
+                content = _build_content(chars)
+                full_peak, full_time, _ = self._measure(lambda out: full(content, 'bench', out))
+                stream_peak, stream_time, _ = self._measure(
+                    lambda out: stream(_chunks(content), 'bench', out))
+                self.stdout.write(
+                    f'{fmt:>7} {chars:>11} {full_peak / mb:>14.1f} {stream_peak / mb:>15.1f} '
+                    f'{full_time:>13.2f} {stream_time:>14.2f}')
+
+        self.stdout.write('')
+        self.stdout.write('Petición completa por ASGI (download?stream=1)')
+        self.stdout.write(
+            f"{'formato':>7} {'caracteres':>11} {'síncrono (MB)':>14} {'por bloques (MB)':>17} "
+            f"{'bytes enviados':>15}")
+        user = User.objects.create_user(f'bench_{uuid.uuid4().hex[:8]}')
+        token = Token.objects.create(user=user).key
+        app = get_asgi_application()
+        try:
+            for fmt in formats:
+                for chars in options['chars']:
+                    document = Document.objects.create(
+                        owner=user, file=f'bench/descarga.{fmt}', extracted_content=_build_content(chars))
+                    path = f'/api/documents/{document.pk}/download/'
+                    sync_peak, _, _ = self._measure_asgi(app, path, token, sync_iterators=True)
+                    async_peak, _, size = self._measure_asgi(app, path, token, sync_iterators=False)
+                    self.stdout.write(
+                        f'{fmt:>7} {chars:>11} {sync_peak / mb:>14.1f} {async_peak / mb:>17.1f} {size:>15}')
+        finally:
+            user.delete()
@@ -0,0 +1,63 @@
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfgen import canvas
+
+from api import text_extractor
+
+LINE = 'Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor incididunt ut labore.'
+
+
+def _build_pdf(path, pages, lines_per_page=45):
+    """Genera un PDF de texto con el número de páginas indicado."""
+    pdf = canvas.Canvas(path, pagesize=letter)
+    for page in range(pages):
+        text = pdf.beginText(40, 750)
+        text.setFont('Helvetica', 9)
+        for line in range(lines_per_page):
+            text.textLine(f'{page}-{line} {LINE}')
+        pdf.drawText(text)
+        pdf.showPage()
+    pdf.save()
+
+
+class Command(BaseCommand):
+    help = 'Compara la extracción de PDFs en serie y en paralelo según el número de páginas.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, nargs='+', default=[10, 50, 200, 500])
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def _best_time(self, func, repeat):
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = func()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best, result
+
+    def handle(self, *args, **options):
+        workers = text_extractor._pdf_workers()
+        self.stdout.write(f'Procesos del pool: {workers} (CPUs: {os.cpu_count()})')
+        self.stdout.write(f"{'páginas':>8} {'serie (s)':>10} {'paralelo (s)':>13} {'speedup':>8}")
+
+        with tempfile.TemporaryDirectory() as tmp:
+            for pages in options['pages']:
+                path = os.path.join(tmp, f'bench_{pages}.pdf')
+                _build_pdf(path, pages)
+                # Calentamiento: arranca el pool para no medir el coste de crear procesos
+                text_extractor._extract_text_from_pdf(path, parallel=True)
+
+                serial, serial_text = self._best_time(
+                    lambda: text_extractor._extract_text_from_pdf(path, parallel=False), options['repeat'])
+                parallel, parallel_text = self._best_time(
+                    lambda: text_extractor._extract_text_from_pdf(path, parallel=True), options['repeat'])
+                if serial_text != parallel_text:
+                    self.stderr.write(f'El texto extraído en paralelo difiere para {pages} páginas')
+                self.stdout.write(
+                    f'{pages:>8} {serial:>10.3f} {parallel:>13.3f} {serial / parallel:>7.2f}x')
+        text_extractor._reset_pdf_pool()
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from api.models import Document
+from api.previews import documents_missing_previews, generate_previews
+from api.tasks import GENERATE_PREVIEW, enqueue
+
+
+class Command(BaseCommand):
+    help = 'Genera las vistas previas que faltan (o están desactualizadas) de los documentos existentes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--now', action='store_true',
+                            help='Generarlas en este proceso en lugar de encolarlas para el worker.')
+        parser.add_argument('--force', action='store_true',
+                            help='Regenerar también las que ya están al día.')
+        parser.add_argument('--owner', help='Limitar a los documentos de este usuario.')
+
+    def handle(self, *args, **options):
+        queryset = Document.objects.all()
+        if options['owner']:
+            queryset = queryset.filter(owner__username=options['owner'])
+        documents = list(queryset) if options['force'] else documents_missing_previews(queryset)
+
+        done = failed = 0
+        for document in documents:
+            if not options['now']:
+                enqueue(document, GENERATE_PREVIEW)
+                done += 1
+                continue
+            try:
+                generate_previews(document, force=options['force'])
+                done += 1
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f'Documento {document.id}: {e}')
+
+        action = 'generadas' if options['now'] else 'encoladas'
+        self.stdout.write(self.style.SUCCESS(f'{done} vistas previas {action}, {failed} con error.'))
@@ -0,0 +1,56 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from api.tasks import process_pending, requeue_stale
+
+
+class Command(BaseCommand):
+    help = 'Procesa la cola de trabajos de documentos (extracción de texto, etc.).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2,
+                            help='Número de hilos que procesan trabajos en paralelo.')
+        parser.add_argument('--batch-size', type=int, default=10,
+                            help='Trabajos reclamados en cada ronda.')
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help='Segundos de espera cuando la cola está vacía.')
+        parser.add_argument('--kind', action='append', dest='kinds',
+                            help='Procesar solo este tipo de trabajo (repetible).')
+        parser.add_argument('--stale-check-interval', type=float, default=60.0,
+                            help='Cada cuántos segundos se devuelven a la cola los trabajos '
+                                 'interrumpidos (DOCUMENT_TASKS_STALE_SECONDS).')
+        parser.add_argument('--once', action='store_true',
+                            help='Vaciar la cola y terminar en lugar de quedarse esperando.')
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        batch_size = max(options['batch_size'], workers)
+        self.stdout.write(f'Worker de documentos iniciado con {workers} hilos.')
+
+        total = 0
+        next_stale_check = 0.0
+        try:
+            while True:
+                close_old_connections()
+                # Los trabajos de un worker que murió quedan en ejecución: se
+                # revisan periódicamente, no solo al arrancar
+                if time.monotonic() >= next_stale_check:
+                    requeued, failed = requeue_stale()
+                    if requeued:
+                        self.stdout.write(f'{requeued} trabajos interrumpidos devueltos a la cola.')
+                    if failed:
+                        self.stdout.write(f'{failed} trabajos interrumpidos sin más intentos, marcados como fallidos.')
+                    next_stale_check = time.monotonic() + options['stale_check_interval']
+                processed = process_pending(
+                    batch_size=batch_size, workers=workers, kinds=options['kinds'])
+                total += processed
+                if processed:
+                    continue
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f'{total} trabajos procesados.'))
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:13
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.db import migrations
+
+
+def populate_search_vector(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Document = apps.get_model('api', 'Document')
+    Document.objects.update(
+        search_vector=django.contrib.postgres.search.SearchVector(
+            'extracted_content', config=getattr(settings, 'SEARCH_CONFIG', 'simple')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_profile_daily_ai_requests_count_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='document',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='document_search_vector_idx'),
+        ),
+        migrations.RunPython(populate_search_vector, migrations.RunPython.noop),
+    ]
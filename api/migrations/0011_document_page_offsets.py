@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_document_processing_status_documenttask'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='page_offsets',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+    ]
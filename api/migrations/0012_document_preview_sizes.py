@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_document_page_offsets'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='preview_key',
+            field=models.CharField(blank=True, editable=False, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='preview_sizes',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_translationcacheentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AssistantResponseCacheEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('action', models.CharField(max_length=30)),
+                ('prompt_version', models.PositiveIntegerField()),
+                ('response', models.TextField()),
+                ('size', models.PositiveIntegerField(help_text='Bytes de la respuesta (UTF-8)')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used_at', models.DateTimeField(auto_now_add=True)),
+                ('hits', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['last_used_at'], name='assistantcache_used_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_assistantresponsecacheentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='assistantresponsecacheentry',
+            name='model',
+            field=models.CharField(default='', help_text='LLMProvider.identifier', max_length=255),
+        ),
+    ]
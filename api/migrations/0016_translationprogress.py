@@ -0,0 +1,29 @@
+# Generated by Django 5.2.8 on 2026-10-18 14:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_assistantresponsecacheentry_model'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TranslationProgress',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('target_language', models.CharField(max_length=10)),
+                ('status', models.CharField(choices=[('running', 'En curso'), ('done', 'Completada'), ('failed', 'Fallida')], default='running', max_length=20)),
+                ('done', models.PositiveIntegerField(default=0)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='translation_progress', to='api.document')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('document', 'target_language'), name='translationprogress_unique')],
+            },
+        ),
+    ]
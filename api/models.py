@@ -1,6 +1,8 @@
 from django.db import models
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save, pre_save
 from django.dispatch import receiver
 from django.utils import timezone
 
@@ -70,6 +72,17 @@ class Folder(models.Model):
 
 class Document(models.Model):
     """Modelo para representar un archivo subido."""
+    STATUS_PENDING = 'pending'
+    STATUS_PROCESSING = 'processing'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    PROCESSING_STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pendiente'),
+        (STATUS_PROCESSING, 'Procesando'),
+        (STATUS_DONE, 'Procesado'),
+        (STATUS_FAILED, 'Error'),
+    ]
+
     owner = models.ForeignKey(
         User, on_delete=models.CASCADE, related_name='documents')
     folder = models.ForeignKey(
@@ -78,18 +91,111 @@ class Document(models.Model):
     # UC-12: Campo para la vista previa
     preview = models.ImageField(
         upload_to=user_preview_directory_path, null=True, blank=True)
+    # Vistas previas por ancho en píxeles ({"160": ruta, ...}) y la clave del
+    # archivo con la que se generaron (ver api/previews.py)
+    preview_sizes = models.JSONField(default=dict, blank=True, editable=False)
+    preview_key = models.CharField(max_length=32, blank=True, editable=False)
     # UC-15: Campo para el contenido extraído para búsqueda
     extracted_content = models.TextField(blank=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
     modified_at = models.DateTimeField(auto_now=True)
     tags = models.ManyToManyField(
         'Tag', blank=True, related_name='documents')
+    # UC-15: Índice de texto completo de extracted_content (ver api/search.py)
+    search_vector = SearchVectorField(null=True, editable=False)
+    # Posición de inicio de cada página dentro de extracted_content (ver api/content.py)
+    page_offsets = models.JSONField(default=list, blank=True, editable=False)
+    # Estado de la extracción de texto en segundo plano (ver api/tasks.py)
+    processing_status = models.CharField(
+        max_length=20, choices=PROCESSING_STATUS_CHOICES, default=STATUS_DONE)
 
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector'], name='document_search_vector_idx'),
+        ]
 
     def __str__(self):
         return f"Documento '{self.file.name}' de {self.owner.username}"
 
 
+class DocumentTask(models.Model):
+    """
+    Cola de trabajos en segundo plano sobre documentos, respaldada por la base
+    de datos (no requiere broker). La procesa el comando `run_document_worker`.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pendiente'),
+        (STATUS_RUNNING, 'En ejecución'),
+        (STATUS_DONE, 'Completada'),
+        (STATUS_FAILED, 'Fallida'),
+    ]
+
+    document = models.ForeignKey(
+        Document, on_delete=models.CASCADE, related_name='tasks')
+    kind = models.CharField(max_length=50, help_text="Tipo de trabajo (ej: 'extract_text')")
+    status = models.CharField(
+        max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='documenttask_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"Tarea {self.kind} ({self.status}) de {self.document_id}"
+
+
+@receiver(post_init, sender=Document)
+def remember_extracted_content(sender, instance, **kwargs):
+    """
+    Guarda el contenido con el que se cargó el documento para saber,
+    al guardar, si hay que reindexarlo.
+    """
+    instance._indexed_content = instance.__dict__.get('extracted_content')
+
+
+@receiver(pre_save, sender=Document)
+def reset_page_offsets(sender, instance, **kwargs):
+    """
+    Si el contenido se edita a mano, el mapa de páginas de la extracción
+    deja de ser válido y el documento pasa a tener una sola página.
+    """
+    if instance.pk is None or instance._state.adding:
+        return
+    content = instance.__dict__.get('extracted_content')
+    if content is not None and content != instance._indexed_content:
+        instance.page_offsets = []
+
+
+@receiver(post_save, sender=Document)
+def update_document_search_index(sender, instance, created, **kwargs):
+    """
+    Reindexa el documento solo cuando cambia su contenido extraído.
+    """
+    content = instance.__dict__.get('extracted_content')
+    if content is None or (not created and content == instance._indexed_content):
+        return
+    from .search import index_documents
+    index_documents([instance.pk])
+    instance._indexed_content = content
+
+
+@receiver(post_delete, sender=Document)
+def remove_document_from_search_index(sender, instance, **kwargs):
+    from .search import fallback_index
+    fallback_index.remove(instance.pk)
+
+
 class Tag(models.Model):
     """Modelo para etiquetar documentos."""
     name = models.CharField(max_length=50)
@@ -104,6 +210,19 @@ class Tag(models.Model):
         return self.name
 
 
+@receiver(post_save, sender=Folder)
+@receiver(post_delete, sender=Folder)
+@receiver(post_save, sender=Document)
+@receiver(post_delete, sender=Document)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(m2m_changed, sender=Document.tags.through)
+def invalidate_assistant_context(sender, instance, **kwargs):
+    """La instantánea que usa el asistente de IA deja de valer (ver api/assistant_context.py)."""
+    from .assistant_context import invalidate_context
+    invalidate_context(instance.owner_id)
+
+
 class DocumentPermission(models.Model):
     """Modelo para gestionar los permisos de un documento compartido."""
     PERMISSION_CHOICES = [
@@ -148,3 +267,82 @@ class TranslationHistory(models.Model):
 
     def __str__(self):
         return f"Traducción de {self.original_document.file.name} a {self.target_language} por {self.user.username}"
+
+
+class TranslationProgress(models.Model):
+    """
+    Progreso de la última traducción por fragmentos (translate-document) de un
+    documento a un idioma. Está en la BD para que cualquier proceso pueda
+    responder a translation-progress, no solo el que traduce.
+    """
+    STATUS_CHOICES = [
+        ('running', 'En curso'),
+        ('done', 'Completada'),
+        ('failed', 'Fallida'),
+    ]
+
+    document = models.ForeignKey(
+        Document, on_delete=models.CASCADE, related_name='translation_progress')
+    target_language = models.CharField(max_length=10)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='running')
+    done = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['document', 'target_language'], name='translationprogress_unique'),
+        ]
+
+    def __str__(self):
+        return f"Traducción de {self.document_id} a {self.target_language}: {self.done}/{self.total}"
+
+
+class TranslationCacheEntry(models.Model):
+    """
+    Segundo nivel (persistente) de la caché de traducciones de api/translation.py.
+    `key` es el hash del texto junto con los idiomas de origen y destino.
+    """
+    key = models.CharField(max_length=64, unique=True)
+    source_language = models.CharField(
+        max_length=10, help_text="Idioma de origen pedido ('auto' si se detecta)")
+    target_language = models.CharField(max_length=10)
+    translated_text = models.TextField()
+    detected_source_language = models.CharField(max_length=10, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(auto_now_add=True)
+    hits = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['last_used_at'], name='translationcache_used_idx'),
+        ]
+
+    def __str__(self):
+        return f"Traducción {self.source_language}->{self.target_language} ({self.key[:12]})"
+
+
+class AssistantResponseCacheEntry(models.Model):
+    """
+    Respuestas del modelo para las acciones deterministas del asistente
+    (resumen, mapa conceptual, carpeta sugerida), ver api/assistant_cache.py.
+    `key` es el hash del modelo, la acción, la versión de su prompt y el
+    contenido.
+    """
+    key = models.CharField(max_length=64, unique=True)
+    model = models.CharField(max_length=255, default='', help_text="LLMProvider.identifier")
+    action = models.CharField(max_length=30)
+    prompt_version = models.PositiveIntegerField()
+    response = models.TextField()
+    size = models.PositiveIntegerField(help_text="Bytes de la respuesta (UTF-8)")
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(auto_now_add=True)
+    hits = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['last_used_at'], name='assistantcache_used_idx'),
+        ]
+
+    def __str__(self):
+        return f"Respuesta {self.action} v{self.prompt_version} ({self.key[:12]})"
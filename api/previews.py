@@ -0,0 +1,219 @@
+"""
+UC-12: Generación de vistas previas (miniaturas) de documentos.
+
+Se renderiza la primera página una sola vez al tamaño mayor y se reduce para el
+resto de tamaños. En PDFs escaneados se usa la imagen incrustada de la primera
+página; en el resto de casos se dibuja el texto de la primera página (PDF),
+los primeros párrafos (DOCX) o el inicio del archivo (TXT) sobre una tarjeta.
+
+La generación es idempotente: `preview_key` identifica el archivo y la versión
+del renderizador, y si no cambian no se vuelve a generar nada.
+"""
+import hashlib
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from docx import Document as DocxDocument
+from PIL import Image, ImageDraw, ImageFont, features
+from pypdf import PdfReader
+import reportlab
+
+from .models import Document, user_preview_directory_path
+
+# Cambiar al modificar el renderizado, para que se regeneren las vistas previas
+PREVIEW_VERSION = 1
+# Relación alto/ancho de una hoja carta
+PAGE_RATIO = 11 / 8.5
+# Texto máximo que se lee del archivo para la vista previa
+HEAD_CHARS = 4000
+# Un PDF con menos texto que esto en la primera página se trata como escaneado
+SCANNED_TEXT_CHARS = 20
+
+
+def preview_sizes():
+    """Anchos (px) a generar, de mayor a menor. El primero es Document.preview."""
+    return sorted(getattr(settings, 'PREVIEW_SIZES', (640, 320, 160)), reverse=True)
+
+
+def _preview_format():
+    if getattr(settings, 'PREVIEW_FORMAT', 'WEBP').upper() == 'WEBP' and features.check('webp'):
+        return 'WEBP', 'webp'
+    return 'PNG', 'png'
+
+
+def preview_key(document):
+    """Identifica el archivo y la configuración de renderizado de la vista previa."""
+    try:
+        size = document.file.size
+    except (OSError, ValueError):
+        size = 0
+    raw = f'{document.file.name}:{size}:{PREVIEW_VERSION}:{preview_sizes()}:{_preview_format()[0]}'
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:16]
+
+
+def _first_page_pdf(file_path):
+    """Devuelve (texto, imagen) de la primera página de un PDF."""
+    reader = PdfReader(file_path)
+    if not reader.pages:
+        return '', None
+    page = reader.pages[0]
+    text = page.extract_text() or ''
+    image = None
+    if len(text.strip()) < SCANNED_TEXT_CHARS:
+        try:
+            images = [img.image for img in page.images]
+        except Exception:
+            images = []
+        if images:
+            image = max(images, key=lambda img: img.width * img.height)
+    return text[:HEAD_CHARS], image
+
+
+def _head_docx(file_path):
+    doc = DocxDocument(file_path)
+    lines, total = [], 0
+    for para in doc.paragraphs:
+        lines.append(para.text)
+        total += len(para.text)
+        if total >= HEAD_CHARS:
+            break
+    return '\n'.join(lines)
+
+
+def _head_txt(file_path):
+    with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
+        return f.read(HEAD_CHARS).split('\f')[0]
+
+
+def _load_font(size):
+    """
+    Fuente TrueType con acentos: PREVIEW_FONT o la Bitstream Vera que incluye
+    reportlab. La fuente por defecto de Pillow no tiene caracteres latinos.
+    """
+    path = getattr(settings, 'PREVIEW_FONT', None) or os.path.join(
+        os.path.dirname(reportlab.__file__), 'fonts', 'Vera.ttf')
+    try:
+        return ImageFont.truetype(path, size)
+    except OSError:
+        return ImageFont.load_default(size=size)
+
+
+def _wrap(draw, text, font, max_width):
+    """Parte el texto en líneas que caben en `max_width` píxeles."""
+    for paragraph in text.splitlines() or ['']:
+        line = ''
+        for word in paragraph.split():
+            candidate = f'{line} {word}'.strip()
+            if draw.textlength(candidate, font=font) <= max_width or not line:
+                line = candidate
+            else:
+                yield line
+                line = word
+        yield line
+
+
+def _render_text_card(text, label, width):
+    """Dibuja el texto sobre una hoja blanca con una etiqueta del tipo de archivo."""
+    height = int(width * PAGE_RATIO)
+    image = Image.new('RGB', (width, height), 'white')
+    draw = ImageDraw.Draw(image)
+    margin = width // 12
+    font = _load_font(max(8, width // 45))
+    label_font = _load_font(max(10, width // 25))
+
+    band = width // 8
+    draw.rectangle([0, 0, width, band], fill='#667eea')
+    draw.text((margin, band // 4), label, fill='white', font=label_font)
+
+    line_height = int(font.size * 1.4)
+    y = band + margin // 2
+    for line in _wrap(draw, text, font, width - 2 * margin):
+        if y + line_height > height - margin // 2:
+            break
+        draw.text((margin, y), line, fill='#2c3e50', font=font)
+        y += line_height
+    draw.rectangle([0, 0, width - 1, height - 1], outline='#dddddd')
+    return image
+
+
+def render_preview(document, width):
+    """Renderiza la primera página del documento como imagen de `width` px de ancho."""
+    file_path = document.file.path
+    extension = os.path.splitext(file_path)[1].lower()
+    label = extension.lstrip('.').upper() or 'ARCHIVO'
+
+    text, image = '', None
+    if extension == '.pdf':
+        text, image = _first_page_pdf(file_path)
+    elif extension == '.docx':
+        text = _head_docx(file_path)
+    elif extension in ('.txt', '.md', '.csv'):
+        text = _head_txt(file_path)
+    else:
+        text = os.path.basename(document.file.name)
+
+    if image is not None:
+        image = image.convert('RGB')
+        image.thumbnail((width, int(width * PAGE_RATIO)))
+        return image
+    return _render_text_card(text, label, width)
+
+
+def _encode(image, image_format):
+    buffer = BytesIO()
+    image.save(buffer, format=image_format, quality=80)
+    return buffer.getvalue()
+
+
+def _delete_previews(document):
+    names = set(document.preview_sizes.values())
+    if document.preview:
+        names.add(document.preview.name)
+    for name in names:
+        if name and default_storage.exists(name):
+            default_storage.delete(name)
+
+
+def generate_previews(document, force=False):
+    """
+    Genera y guarda las vistas previas del documento en todos los tamaños.
+    Devuelve False si ya estaban al día (no hace nada).
+    """
+    key = preview_key(document)
+    if not force and document.preview_key == key and document.preview:
+        return False
+
+    sizes = preview_sizes()
+    image_format, extension = _preview_format()
+    base = render_preview(document, sizes[0])
+
+    _delete_previews(document)
+    stored = {}
+    for width in sizes:
+        image = base if width == sizes[0] else base.copy()
+        if width != sizes[0]:
+            image.thumbnail((width, int(width * PAGE_RATIO)), Image.LANCZOS)
+        filename = f'{document.pk}_{key}_{width}.{extension}'
+        content = ContentFile(_encode(image, image_format))
+        if width == sizes[0]:
+            document.preview.save(filename, content, save=False)
+            stored[str(width)] = document.preview.name
+        else:
+            stored[str(width)] = default_storage.save(
+                user_preview_directory_path(document, filename), content)
+
+    document.preview_sizes = stored
+    document.preview_key = key
+    Document.objects.filter(pk=document.pk).update(
+        preview=document.preview.name, preview_sizes=stored, preview_key=key)
+    return True
+
+
+def documents_missing_previews(queryset=None):
+    """Documentos cuya vista previa falta o está desactualizada."""
+    queryset = queryset if queryset is not None else Document.objects.all()
+    return [doc for doc in queryset.only('id', 'owner', 'file', 'preview', 'preview_sizes', 'preview_key')
+            if not doc.preview or doc.preview_key != preview_key(doc)]
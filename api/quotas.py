@@ -0,0 +1,122 @@
+"""
+Cupos diarios (peticiones de IA y mensajes de chat) sobre las columnas del
+perfil, sin leer-modificar-guardar en Python.
+
+`consume` comprueba el límite, reinicia el contador si cambió el día y lo
+incrementa en un único UPDATE ... RETURNING condicional: si dos peticiones
+llegan a la vez, la base de datos serializa la actualización de la fila y
+nunca se supera el límite. Solo se escriben las dos columnas del cupo.
+"""
+from collections import namedtuple
+
+from django.db import connection
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import Profile
+
+AI_REQUESTS = 'ai'
+CHAT_MESSAGES = 'chat'
+
+# Límite por plan (None = sin límite)
+QUOTAS = {
+    AI_REQUESTS: {
+        'count': 'daily_ai_requests_count',
+        'date': 'last_ai_request_date',
+        'limits': {'free': 5, 'premium': 30},
+    },
+    CHAT_MESSAGES: {
+        'count': 'daily_messages_count',
+        'date': 'last_message_date',
+        'limits': {'free': 10, 'premium': None},
+    },
+}
+
+QuotaResult = namedtuple('QuotaResult', ['allowed', 'used', 'limit'])
+
+
+def quota_limit(kind, plan):
+    limits = QUOTAS[kind]['limits']
+    return limits['premium'] if plan == 'premium' else limits['free']
+
+
+def _columns(kind):
+    quota = QUOTAS[kind]
+    quote = connection.ops.quote_name
+    fields = {field.name: field.column for field in Profile._meta.concrete_fields}
+    return (quote(Profile._meta.db_table), quote(fields[quota['count']]), quote(fields[quota['date']]),
+            quote(fields['subscription_plan']), quote(Profile._meta.get_field('user').column))
+
+
+def _increment(user_id, kind, amount, unlimited_only=False):
+    """
+    UPDATE condicional del contador. Devuelve (usado_hoy, plan) o None si no
+    cabe (o, con `unlimited_only`, si el plan tiene límite).
+    """
+    table, count, date, plan, user = _columns(kind)
+    limits = QUOTAS[kind]['limits']
+    today = timezone.now().date()
+    limit_sql = f"(CASE WHEN {plan} = 'premium' THEN %s ELSE %s END)"
+    used_sql = f"(CASE WHEN {date} = %s THEN {count} ELSE 0 END)"
+    if unlimited_only:
+        condition = f"{limit_sql} IS NULL"
+        condition_params = [limits['premium'], limits['free']]
+    else:
+        condition = f"({limit_sql} IS NULL OR {used_sql} + %s <= {limit_sql})"
+        condition_params = [limits['premium'], limits['free'], today, amount, limits['premium'], limits['free']]
+    sql = (
+        f"UPDATE {table} SET {count} = {used_sql} + %s, {date} = %s "
+        f"WHERE {user} = %s AND {condition} "
+        f"RETURNING {count}, {plan}"
+    )
+    params = [today, amount, today, user_id, *condition_params]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchone()
+
+
+def consume(user_id, kind, amount=1):
+    """
+    Descuenta `amount` unidades del cupo de hoy si caben enteras.
+    Devuelve QuotaResult(permitido, usado_hoy, límite).
+    """
+    row = _increment(user_id, kind, amount)
+    if row is not None:
+        return QuotaResult(True, row[0], quota_limit(kind, row[1]))
+
+    # Sin cupo (o sin perfil): se informa del uso actual
+    return QuotaResult(False, *usage(user_id, kind))
+
+
+def usage(user_id, kind):
+    """Devuelve (usado_hoy, límite) sin modificar nada."""
+    quota = QUOTAS[kind]
+    row = Profile.objects.filter(user_id=user_id).values_list(
+        quota['count'], quota['date'], 'subscription_plan').first()
+    if row is None:
+        return 0, quota_limit(kind, 'free')
+    used, last_date, plan = row
+    return (used if last_date == timezone.now().date() else 0), quota_limit(kind, plan)
+
+
+def release(user_id, kind, amount):
+    """Devuelve al cupo de hoy unidades reservadas y no usadas (ver ChatConsumer)."""
+    if amount <= 0:
+        return
+    quota = QUOTAS[kind]
+    Profile.objects.filter(user_id=user_id, **{quota['date']: timezone.now().date()}).update(
+        **{quota['count']: Greatest(F(quota['count']) - amount, Value(0))})
+
+
+def lease(user_id, kind, block):
+    """
+    Reserva hasta `block` unidades de golpe para gastarlas en memoria.
+    Solo se reservan bloques si el plan no tiene límite: con límite, lo
+    reservado por una conexión dejaría sin cupo a las demás del mismo usuario
+    (y se perdería si el proceso cae), así que se descuenta de una en una.
+    Devuelve las unidades reservadas.
+    """
+    if block > 1 and _increment(user_id, kind, block, unlimited_only=True) is not None:
+        return block
+    return 1 if _increment(user_id, kind, 1) is not None else 0
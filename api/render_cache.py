@@ -0,0 +1,115 @@
+"""
+Caché en disco de los archivos generados por DocumentViewSet.download.
+
+Cada archivo se guarda con el hash de su contenido de origen (texto, formato y
+versión del renderizador), así que un mismo texto nunca se genera dos veces.
+La caché tiene un tamaño máximo (RENDER_CACHE_MAX_BYTES); al superarlo se
+eliminan los archivos usados hace más tiempo (LRU por fecha de modificación,
+que se actualiza en cada acierto).
+"""
+import hashlib
+import os
+import tempfile
+import threading
+
+from django.conf import settings
+
+from .renderers import RENDER_VERSION
+
+_evict_lock = threading.Lock()
+
+
+def cache_dir():
+    path = str(getattr(settings, 'RENDER_CACHE_DIR', os.path.join(settings.BASE_DIR, 'render_cache')))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def max_bytes():
+    return getattr(settings, 'RENDER_CACHE_MAX_BYTES', 512 * 1024 * 1024)
+
+
+def document_etag(document, extension):
+    """
+    ETag de la descarga. Se calcula sin leer extracted_content: cualquier cambio
+    del contenido actualiza modified_at y, con él, el ETag.
+    """
+    raw = f'{document.pk}:{document.file.name}:{document.modified_at.isoformat()}:{extension}:{RENDER_VERSION}'
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:32]
+
+
+def content_key(content, base_filename, extension):
+    digest = hashlib.sha256()
+    digest.update(f'{RENDER_VERSION}:{extension}:{base_filename}\0'.encode('utf-8'))
+    digest.update(content.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _path_for(key, extension):
+    return os.path.join(cache_dir(), f'{key}{extension}')
+
+
+def get_or_render(content, base_filename, extension, renderer):
+    """
+    Devuelve la ruta del archivo generado para `content`, generándolo con
+    `renderer(content, base_filename, out)` solo si no está en la caché.
+    """
+    key = content_key(content, base_filename, extension)
+    path = _path_for(key, extension)
+    if os.path.exists(path):
+        try:
+            os.utime(path)  # marca de uso reciente para la expulsión LRU
+            return path
+        except FileNotFoundError:
+            pass  # expulsado entre la comprobación y el uso
+
+    # Se escribe en un temporal y se renombra: otros procesos nunca ven un archivo a medias
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir(), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            renderer(content, base_filename, out)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    evict()
+    return path
+
+
+def cache_size():
+    total = 0
+    for entry in os.scandir(cache_dir()):
+        if entry.is_file() and not entry.name.endswith('.tmp'):
+            total += entry.stat().st_size
+    return total
+
+
+def evict(limit=None):
+    """
+    Elimina los archivos menos usados hasta dejar la caché por debajo del 90%
+    del límite. Devuelve el número de archivos eliminados.
+    """
+    limit = limit if limit is not None else max_bytes()
+    with _evict_lock:
+        entries = []
+        total = 0
+        for entry in os.scandir(cache_dir()):
+            if entry.is_file() and not entry.name.endswith('.tmp'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        if total <= limit:
+            return 0
+        removed = 0
+        target = limit * 0.9
+        for _, size, path in sorted(entries):
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        return removed
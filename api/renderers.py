@@ -0,0 +1,219 @@
+"""
+Generación de los archivos que devuelve DocumentViewSet.download a partir de
+extracted_content. Cada función escribe el resultado en `out` (un archivo
+abierto en modo binario), lo que permite guardarlo directamente en la caché
+de renderizado (ver api/render_cache.py).
+
+Las variantes *_stream reciben el contenido como un iterable de fragmentos y
+lo escriben a medida que llega, con memoria acotada (ver download?stream=1).
+"""
+import re
+import zipfile
+from xml.sax.saxutils import escape as xml_escape
+
+from asgiref.sync import sync_to_async
+
+from docx import Document as DocxDocument
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.utils import simpleSplit
+from reportlab.pdfgen import canvas
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+from reportlab.lib.units import inch
+
+# Cambiar al modificar cualquier renderizador, para invalidar la caché
+RENDER_VERSION = 1
+
+PDF_CONTENT_TYPE = 'application/pdf'
+DOCX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+TXT_CONTENT_TYPE = 'text/plain; charset=utf-8'
+
+# Bytes que se leen de un archivo generado en cada envío
+DOWNLOAD_BLOCK_SIZE = 64 * 1024
+
+
+def _escape(line):
+    """Escapa los caracteres especiales de XML para los Paragraph de reportlab."""
+    return line.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+def render_pdf(content, base_filename, out):
+    """Genera un PDF con el contenido."""
+    pdf = SimpleDocTemplate(out, pagesize=letter)
+
+    # Estilos
+    styles = getSampleStyleSheet()
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=16,
+        spaceAfter=12,
+    )
+    body_style = ParagraphStyle(
+        'CustomBody',
+        parent=styles['BodyText'],
+        fontSize=11,
+        leading=14,
+    )
+
+    # Contenido del PDF
+    story = []
+    title = Paragraph(f"Documento: {base_filename}", title_style)
+    story.append(title)
+    story.append(Spacer(1, 0.2 * inch))
+
+    # Dividir en párrafos
+    for line in content.split('\n'):
+        if line.strip():
+            story.append(Paragraph(_escape(line), body_style))
+            story.append(Spacer(1, 0.1 * inch))
+
+    pdf.build(story)
+
+
+def render_docx(content, base_filename, out):
+    """Genera un DOCX con el contenido."""
+    new_doc = DocxDocument()
+    new_doc.add_paragraph(content)
+    new_doc.save(out)
+
+
+def render_txt(content, base_filename, out):
+    """Genera un TXT con el contenido."""
+    out.write(content.encode('utf-8'))
+
+
+# --- Variantes en streaming ---
+
+# Caracteres de control que no se pueden escribir en XML (DOCX)
+_INVALID_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+STREAM_FONT = 'Helvetica'
+STREAM_FONT_SIZE = 11
+STREAM_LEADING = 14
+
+
+def iter_lines(chunks):
+    """Convierte un iterable de fragmentos de texto en un iterable de líneas."""
+    pending = ''
+    for chunk in chunks:
+        pending += chunk
+        lines = pending.split('\n')
+        pending = lines.pop()
+        yield from lines
+    if pending:
+        yield pending
+
+
+def render_pdf_stream(chunks, base_filename, out):
+    """
+    Genera el PDF línea a línea sobre un canvas de reportlab. A diferencia de
+    render_pdf no construye una lista de flowables con todo el documento:
+    cada página se comprime al cerrarse.
+    """
+    width, height = letter
+    margin = inch
+    pdf = canvas.Canvas(out, pagesize=letter, pageCompression=1)
+    pdf.setTitle(f"Documento: {base_filename}")
+
+    pdf.setFont('Helvetica-Bold', 16)
+    pdf.drawString(margin, height - margin, f"Documento: {base_filename}")
+    y = height - margin - 0.4 * inch
+
+    text = pdf.beginText(margin, y)
+    text.setFont(STREAM_FONT, STREAM_FONT_SIZE, STREAM_LEADING)
+    for line in iter_lines(chunks):
+        line = line.replace('\f', '')
+        if not line.strip():
+            continue
+        for wrapped in simpleSplit(line, STREAM_FONT, STREAM_FONT_SIZE, width - 2 * margin):
+            if text.getY() < margin:
+                pdf.drawText(text)
+                pdf.showPage()
+                text = pdf.beginText(margin, height - margin)
+                text.setFont(STREAM_FONT, STREAM_FONT_SIZE, STREAM_LEADING)
+            text.textLine(wrapped)
+        text.moveCursor(0, 0.1 * inch)
+    pdf.drawText(text)
+    pdf.showPage()
+    pdf.save()
+
+
+_DOCX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/word/document.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    '</Types>'
+)
+_DOCX_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="word/document.xml"/>'
+    '</Relationships>'
+)
+_DOCX_BODY_START = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"><w:body>'
+)
+_DOCX_BODY_END = '<w:sectPr/></w:body></w:document>'
+
+
+def render_docx_stream(chunks, base_filename, out):
+    """
+    Genera un DOCX mínimo escribiendo word/document.xml directamente en el ZIP,
+    un párrafo por línea. python-docx mantiene todo el árbol XML en memoria.
+    """
+    with zipfile.ZipFile(out, 'w', zipfile.ZIP_DEFLATED) as docx:
+        docx.writestr('[Content_Types].xml', _DOCX_CONTENT_TYPES)
+        docx.writestr('_rels/.rels', _DOCX_RELS)
+        with docx.open('word/document.xml', 'w') as xml:
+            xml.write(_DOCX_BODY_START.encode('utf-8'))
+            for line in iter_lines(chunks):
+                safe_line = xml_escape(_INVALID_XML_CHARS.sub('', line))
+                xml.write(
+                    f'<w:p><w:r><w:t xml:space="preserve">{safe_line}</w:t></w:r></w:p>'.encode('utf-8'))
+            xml.write(_DOCX_BODY_END.encode('utf-8'))
+
+
+def render_txt_stream(chunks):
+    """Codifica los fragmentos de texto a medida que se envían."""
+    for chunk in chunks:
+        yield chunk.encode('utf-8')
+
+
+def iter_file_blocks(file, block_size=DOWNLOAD_BLOCK_SIZE):
+    """Lee un archivo por bloques y lo cierra al terminar."""
+    try:
+        while True:
+            block = file.read(block_size)
+            if not block:
+                return
+            yield block
+    finally:
+        file.close()
+
+
+async def aiter_blocks(iterator):
+    """
+    Versión asíncrona de un iterador síncrono, un fragmento por llamada a
+    sync_to_async. Con Daphne (ASGI), StreamingHttpResponse consume los
+    iteradores síncronos con sync_to_async(list): la descarga entera quedaría
+    en memoria antes de enviar el primer byte.
+    """
+    iterator = iter(iterator)
+    done = object()
+    try:
+        while True:
+            block = await sync_to_async(next)(iterator, done)
+            if block is done:
+                return
+            yield block
+    finally:
+        close = getattr(iterator, 'close', None)
+        if close is not None:
+            await sync_to_async(close)()
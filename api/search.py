@@ -0,0 +1,301 @@
+"""
+UC-15: Búsqueda de texto completo sobre Document.extracted_content.
+
+En PostgreSQL se usa la columna indexada `search_vector` (tsvector + índice GIN),
+que se recalcula solo cuando cambia el contenido extraído. Para ejecuciones con
+otros motores (p. ej. SQLite en pruebas) se mantiene un índice invertido en
+memoria con la misma interfaz: ranking, prefijos y fragmentos resaltados.
+"""
+import math
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import Case, F, FloatField, Q, Value, When
+from django.db.models.functions import Lower, StrIndex
+from rest_framework.filters import BaseFilterBackend
+
+from .models import Document, Tag
+
+HIGHLIGHT_START = '<mark>'
+HIGHLIGHT_STOP = '</mark>'
+SNIPPET_WORDS = 30
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def _search_config():
+    return getattr(settings, 'SEARCH_CONFIG', 'simple')
+
+
+def _normalize(word, strip_accents=True):
+    """Pasa a minúsculas y (si `strip_accents`) elimina acentos para comparar términos."""
+    word = word.lower()
+    if not strip_accents:
+        return word
+    word = unicodedata.normalize('NFKD', word)
+    return ''.join(c for c in word if not unicodedata.combining(c))
+
+
+def tokenize(text, strip_accents=True):
+    """Devuelve los términos normalizados de un texto."""
+    return [_normalize(t, strip_accents) for t in _TOKEN_RE.findall(text or '')]
+
+
+def parse_query(raw_query, strip_accents=True):
+    """
+    Convierte la búsqueda del usuario en una lista de términos (sin operadores).
+    En PostgreSQL se conservan los acentos: la configuración 'simple' del
+    tsvector no los elimina, así que 'canción' solo coincide con 'canción'.
+    """
+    return tokenize(raw_query, strip_accents)[:10]
+
+
+def uses_postgres():
+    return connection.vendor == 'postgresql'
+
+
+class InvertedIndex:
+    """
+    Índice invertido en memoria (término -> {documento: frecuencia}).
+    Se usa como alternativa cuando la base de datos no es PostgreSQL.
+    """
+
+    def __init__(self):
+        self._postings = defaultdict(dict)
+        self._doc_terms = {}
+        self._doc_lengths = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._doc_terms)
+
+    def missing(self, doc_ids):
+        """Documentos de `doc_ids` que no están en el índice."""
+        with self._lock:
+            return {doc_id for doc_id in doc_ids if doc_id not in self._doc_terms}
+
+    def add(self, doc_id, text):
+        counts = defaultdict(int)
+        for term in tokenize(text):
+            counts[term] += 1
+        with self._lock:
+            self._remove(doc_id)
+            for term, tf in counts.items():
+                self._postings[term][doc_id] = tf
+            self._doc_terms[doc_id] = set(counts)
+            self._doc_lengths[doc_id] = sum(counts.values())
+
+    def remove(self, doc_id):
+        with self._lock:
+            self._remove(doc_id)
+
+    def _remove(self, doc_id):
+        for term in self._doc_terms.pop(doc_id, ()):
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self._postings[term]
+        self._doc_lengths.pop(doc_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._postings.clear()
+            self._doc_terms.clear()
+            self._doc_lengths.clear()
+
+    def _expand(self, term):
+        """Términos del índice que empiezan por `term` (búsqueda por prefijo)."""
+        return [t for t in self._postings if t.startswith(term)]
+
+    def search(self, terms, candidate_ids=None):
+        """
+        Devuelve {doc_id: puntuación} para los documentos que contienen todos los
+        términos (cada uno como prefijo). La puntuación es un TF-IDF simple.
+        """
+        if not terms:
+            return {}
+        with self._lock:
+            total_docs = len(self._doc_terms) or 1
+            scores = None
+            for term in terms:
+                term_scores = defaultdict(float)
+                for expanded in self._expand(term):
+                    postings = self._postings[expanded]
+                    idf = math.log(1 + total_docs / len(postings))
+                    for doc_id, tf in postings.items():
+                        if candidate_ids is not None and doc_id not in candidate_ids:
+                            continue
+                        length = self._doc_lengths.get(doc_id) or 1
+                        term_scores[doc_id] += (tf / length) * idf
+                if scores is None:
+                    scores = dict(term_scores)
+                else:
+                    scores = {d: s + term_scores[d] for d, s in scores.items() if d in term_scores}
+                if not scores:
+                    return {}
+            return scores
+
+
+# Índice del proceso para motores distintos de PostgreSQL
+fallback_index = InvertedIndex()
+
+
+def make_snippet(text, terms, max_words=SNIPPET_WORDS):
+    """
+    Genera un fragmento del texto alrededor de la primera coincidencia, con los
+    términos resaltados igual que ts_headline.
+    """
+    words = (text or '').split()
+    if not words:
+        return ''
+    normalized = [tokenize(w) for w in words]
+    first = 0
+    for i, tokens in enumerate(normalized):
+        if any(tok.startswith(term) for tok in tokens for term in terms):
+            first = i
+            break
+    start = max(0, first - max_words // 3)
+    out = []
+    for word, tokens in zip(words[start:start + max_words], normalized[start:start + max_words]):
+        if any(tok.startswith(term) for tok in tokens for term in terms):
+            out.append(f'{HIGHLIGHT_START}{word}{HIGHLIGHT_STOP}')
+        else:
+            out.append(word)
+    return ' '.join(out)
+
+
+def index_documents(document_ids):
+    """
+    Recalcula el índice de búsqueda de los documentos indicados.
+    En PostgreSQL actualiza la columna tsvector con un único UPDATE.
+    """
+    document_ids = list(document_ids)
+    if not document_ids:
+        return
+    if uses_postgres():
+        Document.objects.filter(pk__in=document_ids).update(
+            search_vector=SearchVector('extracted_content', config=_search_config()))
+        return
+    for doc_id, content in Document.objects.filter(
+            pk__in=document_ids).values_list('pk', 'extracted_content').iterator():
+        fallback_index.add(doc_id, content)
+
+
+def rebuild_index(batch_size=500):
+    """Reindexa todos los documentos (usado tras migraciones o restauraciones)."""
+    if uses_postgres():
+        return Document.objects.update(
+            search_vector=SearchVector('extracted_content', config=_search_config()))
+    fallback_index.clear()
+    ids = list(Document.objects.values_list('pk', flat=True))
+    for i in range(0, len(ids), batch_size):
+        index_documents(ids[i:i + batch_size])
+    return len(ids)
+
+
+def _name_match(raw_query):
+    """Todas las palabras en el nombre del archivo o en una etiqueta (coincidencia parcial)."""
+    name_match = Q()
+    for term in raw_query.split():
+        name_match &= (
+            Q(file__icontains=term) |
+            Q(pk__in=Tag.documents.through.objects.filter(
+                tag__name__icontains=term).values('document_id'))
+        )
+    return name_match
+
+
+def _postgres_query(raw_query):
+    terms = parse_query(raw_query, strip_accents=False)
+    return SearchQuery(' & '.join(f'{t}:*' for t in terms),
+                       search_type='raw', config=_search_config())
+
+
+def search_documents(queryset, raw_query):
+    """
+    Filtra y ordena `queryset` por relevancia. Busca en el contenido extraído
+    (índice de texto completo) y, por nombre de archivo y etiqueta, con
+    coincidencia parcial. Anota `search_rank`; el fragmento y la posición de
+    la coincidencia se calculan con `add_search_snippets`, solo para las
+    filas que se devuelven.
+    """
+    terms = parse_query(raw_query)
+    if not terms:
+        return queryset
+
+    if uses_postgres():
+        query = _postgres_query(raw_query)
+        # Contenido y nombre/etiquetas en consultas separadas unidas con UNION:
+        # un OR entre ambas condiciones impediría usar el índice GIN
+        content_ids = queryset.filter(search_vector=query).values('pk')
+        name_ids = queryset.filter(_name_match(raw_query)).values('pk')
+        return queryset.filter(pk__in=content_ids.union(name_ids)).annotate(
+            search_rank=SearchRank(F('search_vector'), query),
+        ).order_by('-search_rank', '-uploaded_at')
+
+    candidate_ids = set(queryset.values_list('pk', flat=True))
+    # Se indexan los candidatos que el índice del proceso aún no tiene
+    missing = fallback_index.missing(candidate_ids)
+    if missing:
+        index_documents(missing)
+    scores = fallback_index.search(terms, candidate_ids)
+    matched = queryset.filter(Q(pk__in=list(scores)) | _name_match(raw_query))
+    return matched.annotate(
+        search_rank=Case(
+            *[When(pk=doc_id, then=Value(score)) for doc_id, score in scores.items()],
+            default=Value(0.0), output_field=FloatField()),
+    ).order_by('-search_rank', '-uploaded_at')
+
+
+def add_search_snippets(documents, raw_query):
+    """
+    Asigna `search_snippet` (fragmento con los términos resaltados) y
+    `search_position` (1..n del primer término en el contenido, 0 si no
+    aparece; ver api/content.py) a los documentos de una página de
+    resultados, con una sola consulta.
+    """
+    terms = parse_query(raw_query)
+    if not terms or not documents:
+        return documents
+    first_word = raw_query.split()[0].lower()
+    ids = [document.pk for document in documents]
+    if uses_postgres():
+        rows = Document.objects.filter(pk__in=ids).annotate(
+            snippet=SearchHeadline(
+                'extracted_content', _postgres_query(raw_query), config=_search_config(),
+                start_sel=HIGHLIGHT_START, stop_sel=HIGHLIGHT_STOP,
+                max_words=SNIPPET_WORDS, min_words=SNIPPET_WORDS // 2),
+            position=StrIndex(Lower('extracted_content'), Value(first_word)),
+        ).values_list('pk', 'snippet', 'position')
+        found = {doc_id: (snippet, position) for doc_id, snippet, position in rows}
+    else:
+        matched = fallback_index.search(terms, set(ids))
+        found = {
+            doc_id: (make_snippet(content, terms), content.lower().find(first_word) + 1)
+            for doc_id, content in Document.objects.filter(
+                pk__in=list(matched)).values_list('pk', 'extracted_content')
+        }
+    for document in documents:
+        document.search_snippet, document.search_position = found.get(document.pk, ('', 0))
+    return documents
+
+
+class DocumentSearchFilter(BaseFilterBackend):
+    """
+    Reemplaza al SearchFilter de DRF (ILIKE sobre todo el contenido) por la
+    búsqueda indexada. Usa el mismo parámetro `?search=`. Los fragmentos se
+    añaden después de paginar (ver DocumentViewSet.list).
+    """
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        raw_query = request.query_params.get(self.search_param, '').strip()
+        if not raw_query:
+            return queryset
+        return search_documents(queryset, raw_query)
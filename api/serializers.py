@@ -1,5 +1,7 @@
+from django.core.files.storage import default_storage
 from rest_framework import serializers
 from .models import Profile, Folder, Document, Tag, DocumentPermission, TranslationHistory
+from .content import page_count, page_for_offset
 
 
 class ProfileSerializer(serializers.ModelSerializer):
@@ -10,6 +12,14 @@ class ProfileSerializer(serializers.ModelSerializer):
         model = Profile
         fields = ['language_preference', 'subscription_plan', 'preferred_translation_api']
 
+    def update(self, instance, validated_data):
+        # Guardar solo los campos editados: los contadores de cupo se
+        # actualizan aparte (api/quotas.py) y no deben sobrescribirse
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save(update_fields=list(validated_data))
+        return instance
+
 class RecursiveFolderSerializer(serializers.Serializer):
     """Un serializer simple para mostrar hijos de forma recursiva."""
     def to_representation(self, value):
@@ -35,19 +45,27 @@ class DocumentSerializer(serializers.ModelSerializer):
     owner = serializers.ReadOnlyField(source='owner.username')
     file_url = serializers.SerializerMethodField(read_only=True)
     preview_url = serializers.SerializerMethodField(read_only=True)
+    preview_urls = serializers.SerializerMethodField(read_only=True)
     permission_level = serializers.SerializerMethodField()
     is_shared = serializers.SerializerMethodField()
+    # UC-15: Solo presentes cuando el listado se filtra con ?search=
+    search_rank = serializers.SerializerMethodField()
+    search_snippet = serializers.SerializerMethodField()
+    search_page = serializers.SerializerMethodField()
+    page_count = serializers.SerializerMethodField()
 
     class Meta:
         model = Document
         fields = ['id', 'owner', 'folder', 'file', 'file_url',
-                  'preview_url', 'uploaded_at', 'tags',
+                  'preview_url', 'preview_urls', 'uploaded_at', 'tags',
                   'extracted_content', 
                   'permission_level', 
-                  'is_shared','modified_at']
+                  'is_shared','modified_at', 'processing_status', 'page_count',
+                  'search_rank', 'search_snippet', 'search_page']
         read_only_fields = [
             'uploaded_at', 'owner', 'file_url', 
-            'preview_url', 'permission_level', 'is_shared','modified_at'
+            'preview_url', 'preview_urls', 'permission_level', 'is_shared','modified_at',
+            'processing_status'
         ]
 
     # --- INICIO DE LAS FUNCIONES QUE FALTABAN ---
@@ -62,22 +80,50 @@ class DocumentSerializer(serializers.ModelSerializer):
         if request and obj.preview:
             return request.build_absolute_uri(obj.preview.url)
         return None
+
+    def get_preview_urls(self, obj):
+        """URLs de la vista previa por ancho en píxeles ({"160": url, ...})."""
+        request = self.context.get('request', None)
+        if not request:
+            return {}
+        return {
+            width: request.build_absolute_uri(default_storage.url(name))
+            for width, name in obj.preview_sizes.items()
+        }
     # --- FIN DE LAS FUNCIONES QUE FALTABAN ---
 
+    def get_search_rank(self, obj):
+        return getattr(obj, 'search_rank', None)
+
+    def get_search_snippet(self, obj):
+        return getattr(obj, 'search_snippet', None)
+
+    def get_search_page(self, obj):
+        """Página (empezando en 1) de la primera coincidencia en el contenido."""
+        position = getattr(obj, 'search_position', None)
+        if not position:
+            return None
+        return page_for_offset(obj.page_offsets, position - 1) + 1
+
+    def get_page_count(self, obj):
+        return page_count(obj)
+
     def get_permission_level(self, obj):
         request = self.context.get('request', None)
         if not request or not request.user.is_authenticated:
             return None
-        if obj.owner == request.user:
+        if obj.owner_id == request.user.id:
             return "PROPIETARIO"
-        try:
-            permission = DocumentPermission.objects.get(document=obj, user=request.user)
-            if permission.permission_level == 'edit':
-                return "EDITOR"
-            else:
-                return "LECTOR"
-        except DocumentPermission.DoesNotExist:
+        # DocumentViewSet.get_queryset ya anota el nivel de permiso del usuario
+        if hasattr(obj, 'user_permission_level'):
+            level = obj.user_permission_level
+        else:
+            level = DocumentPermission.objects.filter(
+                document=obj, user=request.user
+            ).values_list('permission_level', flat=True).first()
+        if level is None:
             return None
+        return "EDITOR" if level == 'edit' else "LECTOR"
 
     def get_is_shared(self, obj):
         """
@@ -87,7 +133,9 @@ class DocumentSerializer(serializers.ModelSerializer):
         if not request or not request.user.is_authenticated:
             return False
         
-        if obj.owner == request.user:
+        if obj.owner_id == request.user.id:
+            if hasattr(obj, 'has_permissions'):
+                return obj.has_permissions
             return DocumentPermission.objects.filter(document=obj).exists()
         
         return False
@@ -0,0 +1,225 @@
+"""
+Cola de trabajos en segundo plano sobre documentos.
+
+Los trabajos se guardan en la tabla DocumentTask y los reclama un pool de
+workers (`python manage.py run_document_worker`) con SELECT ... FOR UPDATE
+SKIP LOCKED, de modo que varios procesos pueden consumir la misma cola sin
+broker externo. Cada tipo de trabajo registra su función con @task_handler.
+
+Mientras un trabajo se ejecuta, su `locked_at` se renueva cada
+DOCUMENT_TASKS_HEARTBEAT_SECONDS; si deja de renovarse durante
+DOCUMENT_TASKS_STALE_SECONDS, el worker murió y el trabajo vuelve a la cola
+(o falla, si ya agotó sus intentos).
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Document, DocumentTask
+from .content import write_extracted_content
+from .previews import generate_previews
+from .text_extractor import iter_text_chunks
+
+EXTRACT_TEXT = 'extract_text'
+GENERATE_PREVIEW = 'generate_preview'
+
+_handlers = {}
+_failure_handlers = {}
+
+
+def task_handler(kind, on_failure=None):
+    """
+    Registra la función que procesa los trabajos de tipo `kind`. `on_failure`
+    recibe el documento cuando el trabajo agota sus intentos.
+    """
+    def decorator(func):
+        _handlers[kind] = func
+        if on_failure is not None:
+            _failure_handlers[kind] = on_failure
+        return func
+    return decorator
+
+
+def _max_attempts():
+    return getattr(settings, 'DOCUMENT_TASKS_MAX_ATTEMPTS', 3)
+
+
+def enqueue(document, kind):
+    """
+    Encola un trabajo para el documento. Con DOCUMENT_TASKS_EAGER se ejecuta
+    en el momento (útil en desarrollo sin worker).
+    """
+    task = DocumentTask.objects.create(document=document, kind=kind)
+    if getattr(settings, 'DOCUMENT_TASKS_EAGER', False):
+        task.status = DocumentTask.STATUS_RUNNING
+        task.attempts = 1
+        run_task(task)
+    return task
+
+
+def claim_tasks(limit, kinds=None):
+    """
+    Reclama hasta `limit` trabajos pendientes marcándolos como en ejecución.
+    Los trabajos bloqueados por otro worker se saltan (SKIP LOCKED).
+    """
+    with transaction.atomic():
+        queryset = DocumentTask.objects.filter(status=DocumentTask.STATUS_PENDING)
+        if kinds:
+            queryset = queryset.filter(kind__in=kinds)
+        if connection.features.has_select_for_update_skip_locked:
+            queryset = queryset.select_for_update(skip_locked=True)
+        tasks = list(queryset.order_by('created_at')[:limit])
+        if not tasks:
+            return []
+        now = timezone.now()
+        DocumentTask.objects.filter(pk__in=[t.pk for t in tasks]).update(
+            status=DocumentTask.STATUS_RUNNING, locked_at=now, attempts=F('attempts') + 1)
+        for task in tasks:
+            task.status = DocumentTask.STATUS_RUNNING
+            task.locked_at = now
+            task.attempts += 1
+        return tasks
+
+
+class _Heartbeat:
+    """Renueva `locked_at` del trabajo cada `interval` segundos mientras se ejecuta."""
+
+    def __init__(self, task_id, interval):
+        self.task_id = task_id
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        try:
+            while not self._stop.wait(self.interval):
+                DocumentTask.objects.filter(pk=self.task_id, status=DocumentTask.STATUS_RUNNING).update(
+                    locked_at=timezone.now())
+        finally:
+            # El hilo abre su propia conexión (si llegó a latir)
+            connection.close()
+
+
+def _fail(task):
+    """Marca el trabajo como fallido y avisa a su manejador de fallos."""
+    task.status = DocumentTask.STATUS_FAILED
+    task.finished_at = timezone.now()
+    task.save(update_fields=['status', 'attempts', 'last_error', 'finished_at'])
+    if task.kind in _failure_handlers:
+        _failure_handlers[task.kind](task.document)
+
+
+def run_task(task):
+    """Ejecuta un trabajo ya reclamado y registra su resultado."""
+    handler = _handlers.get(task.kind)
+    try:
+        if handler is None:
+            raise ValueError(f"No hay un manejador registrado para '{task.kind}'")
+        with _Heartbeat(task.pk, getattr(settings, 'DOCUMENT_TASKS_HEARTBEAT_SECONDS', 60)):
+            handler(task.document)
+    except Exception as e:
+        print(f"Error en la tarea {task.kind} del documento {task.document_id}: {e}")
+        task.last_error = str(e)
+        if task.attempts >= _max_attempts():
+            _fail(task)
+        else:
+            task.status = DocumentTask.STATUS_PENDING
+            task.finished_at = None
+            task.save(update_fields=['status', 'attempts', 'last_error', 'finished_at'])
+        return False
+
+    task.status = DocumentTask.STATUS_DONE
+    task.last_error = ''
+    task.finished_at = timezone.now()
+    task.save(update_fields=['status', 'attempts', 'last_error', 'finished_at'])
+    return True
+
+
+def _run_in_thread(task):
+    try:
+        return run_task(task)
+    finally:
+        # Cada hilo del pool abre su propia conexión; se cierra al terminar.
+        connection.close()
+
+
+def requeue_stale(timeout=None):
+    """
+    Devuelve a la cola los trabajos de workers que murieron a mitad de
+    ejecución (sin latido en `timeout` segundos). Los que ya agotaron sus
+    intentos fallan: un documento que tumba al worker no se reintenta para
+    siempre. Devuelve (devueltos a la cola, fallidos).
+    """
+    timeout = timeout or getattr(settings, 'DOCUMENT_TASKS_STALE_SECONDS', 600)
+    stale = DocumentTask.objects.filter(
+        status=DocumentTask.STATUS_RUNNING,
+        locked_at__lt=timezone.now() - timedelta(seconds=timeout),
+    )
+    failed = 0
+    for task in stale.filter(attempts__gte=_max_attempts()).select_related('document'):
+        # Solo quien lo cambia de estado lo da por fallido (varios workers revisan a la vez)
+        if DocumentTask.objects.filter(pk=task.pk, status=DocumentTask.STATUS_RUNNING).update(
+                status=DocumentTask.STATUS_FAILED):
+            task.last_error = 'El worker dejó de responder durante la ejecución'
+            _fail(task)
+            failed += 1
+    requeued = stale.filter(attempts__lt=_max_attempts()).update(
+        status=DocumentTask.STATUS_PENDING, locked_at=None)
+    return requeued, failed
+
+
+def process_pending(batch_size=10, workers=1, kinds=None):
+    """
+    Reclama un lote de trabajos y lo ejecuta con un pool de `workers` hilos.
+    Devuelve el número de trabajos procesados.
+    """
+    tasks = claim_tasks(batch_size, kinds=kinds)
+    if not tasks:
+        return 0
+    if workers <= 1:
+        for task in tasks:
+            run_task(task)
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(_run_in_thread, tasks))
+    return len(tasks)
+
+
+def _extraction_failed(document):
+    Document.objects.filter(pk=document.pk).update(processing_status=Document.STATUS_FAILED)
+
+
+@task_handler(EXTRACT_TEXT, on_failure=_extraction_failed)
+def extract_document_text(document):
+    """
+    Extrae el texto de un documento subido y lo escribe por bloques en
+    extracted_content, junto con el mapa de páginas. Si falla vuelve a
+    'pendiente' mientras queden reintentos (ver run_task).
+    """
+    queryset = Document.objects.filter(pk=document.pk)
+    queryset.update(processing_status=Document.STATUS_PROCESSING)
+    try:
+        write_extracted_content(document, iter_text_chunks(document))
+    except Exception:
+        queryset.update(processing_status=Document.STATUS_PENDING)
+        raise
+    queryset.update(processing_status=Document.STATUS_DONE)
+
+
+@task_handler(GENERATE_PREVIEW)
+def generate_document_preview(document):
+    """Genera las miniaturas de la primera página del documento."""
+    generate_previews(document)
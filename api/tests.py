@@ -1,10 +1,60 @@
-from django.test import TestCase, Client
+from django.test import TestCase, TransactionTestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from rest_framework.test import APIClient
+import asyncio
 import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO, StringIO
+from datetime import timedelta
+from unittest.mock import patch
+from django.utils import timezone
+from django.db import connection, connections
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.cache import cache
+from PIL import Image
+import httpx
+from asgiref.sync import async_to_sync, sync_to_async
+from django.db.models.functions import Concat
+from docx import Document as DocxDocument
+from docx.enum.text import WD_BREAK
+from reportlab.pdfgen import canvas
+from pypdf import PdfReader
+
+from . import assistant_cache, assistant_context, async_translation, quotas, render_cache, text_extractor
+from .content import get_page_text, iter_content_chunks
+from .gemini_service import PROMPT_VERSIONS, GeminiAssistant
+from .llm import FakeLLMProvider, LLMProvider, get_llm, reset_llm
+from .previews import documents_missing_previews, generate_previews
+from .renderers import render_pdf, render_pdf_stream, render_txt
+from .text_extractor import extract_text
+
+from .models import (AssistantResponseCacheEntry, Document, DocumentPermission, DocumentTask, Folder, Profile, Tag,
+                     TranslationCacheEntry)
+from .search import InvertedIndex, fallback_index, parse_query, search_documents
+from .tasks import EXTRACT_TEXT, claim_tasks, process_pending, requeue_stale, run_task
+from . import tasks
+from . import translation
 
 # Create your tests here.
 
 
+def read_stream(response):
+    """Cuerpo de una respuesta en streaming (las descargas y el SSE usan iteradores asíncronos)."""
+    async def collect():
+        return [chunk async for chunk in response.streaming_content]
+
+    return b''.join(async_to_sync(collect)())
+
+
 class ApiEndpointTests(TestCase):
 
     def setUp(self):
@@ -24,3 +74,1066 @@ class ApiEndpointTests(TestCase):
             'message': '¡Hola desde el backend de Django!', 'status': 'ok'}
         self.assertJSONEqual(
             str(response.content, encoding='utf8'), expected_data)
+
+
+class DocumentListQueryTests(TestCase):
+    """
+    El listado de documentos debe costar un número fijo de consultas,
+    sin importar cuántos documentos (propios o compartidos) tenga el usuario.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('lector', 'lector@test.com', 'pass1234')
+        self.other = User.objects.create_user('autor', 'autor@test.com', 'pass1234')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('document-list')
+
+    def _create_documents(self, count):
+        tag = Tag.objects.create(name=f'tag{Tag.objects.count()}', owner=self.user)
+        for i in range(count):
+            own = Document.objects.create(owner=self.user, file=f'user_{self.user.id}/own_{i}.txt')
+            own.tags.add(tag)
+            shared = Document.objects.create(owner=self.other, file=f'user_{self.other.id}/shared_{i}.txt')
+            DocumentPermission.objects.create(
+                document=shared, user=self.user, permission_level='edit' if i % 2 else 'view')
+            if i % 3 == 0:
+                DocumentPermission.objects.create(document=own, user=self.other)
+
+    def test_list_query_count_is_constant(self):
+        self._create_documents(2)
+        # 1 consulta para documentos (con permisos anotados) + 1 prefetch de etiquetas
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.data), 4)
+
+        self._create_documents(20)
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.data), 44)
+
+    def test_list_permission_fields(self):
+        self._create_documents(3)
+        response = self.client.get(self.url)
+        by_name = {os.path.basename(d['file']): d for d in response.data}
+
+        self.assertEqual(by_name['own_0.txt']['permission_level'], 'PROPIETARIO')
+        self.assertTrue(by_name['own_0.txt']['is_shared'])
+        self.assertFalse(by_name['own_1.txt']['is_shared'])
+        self.assertEqual(by_name['shared_0.txt']['permission_level'], 'LECTOR')
+        self.assertEqual(by_name['shared_1.txt']['permission_level'], 'EDITOR')
+        self.assertFalse(by_name['shared_1.txt']['is_shared'])
+
+
+class DocumentSearchTests(TestCase):
+    """UC-15: Búsqueda de texto completo con ranking, prefijos y fragmentos."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('buscador', 'buscador@test.com', 'pass1234')
+        self.other = User.objects.create_user('ajeno', 'ajeno@test.com', 'pass1234')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('document-list')
+        self.contract = Document.objects.create(
+            owner=self.user, file='user_1/contrato.txt',
+            extracted_content='El contrato de arrendamiento vence en marzo. Contrato firmado por ambas partes.')
+        self.invoice = Document.objects.create(
+            owner=self.user, file='user_1/factura.txt',
+            extracted_content='Factura mensual. Se adjunta copia del contrato original.')
+        Document.objects.create(
+            owner=self.other, file='user_2/privado.txt',
+            extracted_content='Contrato privado de otro usuario.')
+
+    def _search(self, query):
+        return self.client.get(self.url, {'search': query}).data
+
+    def test_ranked_prefix_search_with_snippet(self):
+        results = self._search('contra')
+        self.assertEqual([d['id'] for d in results], [self.contract.id, self.invoice.id])
+        self.assertGreater(results[0]['search_rank'], results[1]['search_rank'])
+        self.assertIn('<mark>contrato</mark>', results[0]['search_snippet'])
+
+    def test_search_is_updated_when_content_changes(self):
+        self.assertEqual(self._search('presupuesto'), [])
+        self.invoice.extracted_content = 'Presupuesto anual aprobado.'
+        self.invoice.save()
+        self.assertEqual([d['id'] for d in self._search('presupuesto')], [self.invoice.id])
+        self.assertEqual([d['id'] for d in self._search('contrato')], [self.contract.id])
+
+    def test_search_matches_file_name_and_tags(self):
+        tag = Tag.objects.create(name='Urgente', owner=self.user)
+        self.invoice.tags.add(tag)
+        self.assertEqual([d['id'] for d in self._search('urgente')], [self.invoice.id])
+        self.assertEqual([d['id'] for d in self._search('factura')], [self.invoice.id])
+
+    def test_fallback_index_matches_postgres_behaviour(self):
+        fallback_index.clear()
+        with patch('api.search.uses_postgres', return_value=False):
+            results = self._search('contra')
+        self.assertEqual([d['id'] for d in results], [self.contract.id, self.invoice.id])
+        self.assertIn('<mark>contrato</mark>', results[0]['search_snippet'].lower())
+
+    def test_fallback_indexes_documents_missing_from_the_index(self):
+        fallback_index.clear()
+        with patch('api.search.uses_postgres', return_value=False):
+            self.assertEqual([d['id'] for d in self._search('arrendamiento')], [self.contract.id])
+            late = Document.objects.create(owner=self.user, file='user_1/anexo.txt',
+                                           extracted_content='Anexo al arrendamiento.')
+            fallback_index.remove(late.id)  # p. ej. creado por otro proceso
+            self.assertEqual({d['id'] for d in self._search('arrendamiento')}, {self.contract.id, late.id})
+
+    def test_content_and_name_matches_are_separate_queries(self):
+        sql = str(search_documents(Document.objects.all(), 'contra').query)
+        self.assertIn('UNION', sql)
+        self.assertNotIn('ts_headline', sql)
+
+    def test_snippets_only_for_the_returned_page(self):
+        with CaptureQueriesContext(connection) as queries:
+            data = self.client.get(self.url, {'search': 'contra', 'limit': 1}).data
+        self.assertEqual(data['count'], 2)
+        self.assertEqual([d['id'] for d in data['results']], [self.contract.id])
+        self.assertIn('<mark>contrato</mark>', data['results'][0]['search_snippet'])
+        self.assertEqual(data['results'][0]['search_page'], 1)
+        headlines = [q['sql'] for q in queries.captured_queries if 'ts_headline' in q['sql']]
+        self.assertEqual(len(headlines), 1)
+        self.assertIn(f'IN ({self.contract.id})', headlines[0])
+
+    def test_accented_search(self):
+        song = Document.objects.create(owner=self.user, file='user_1/letra.txt',
+                                       extracted_content='La canción del verano')
+        self.assertEqual([d['id'] for d in self._search('canción')], [song.id])
+        self.assertEqual([d['id'] for d in self._search('CANCIÓN verano')], [song.id])
+
+
+class InvertedIndexTests(TestCase):
+
+    def test_prefix_and_accent_insensitive_search(self):
+        index = InvertedIndex()
+        index.add(1, 'Canción de invierno')
+        index.add(2, 'Cancionero popular, canciones y más canciones')
+        scores = index.search(parse_query('CANCION'))
+        self.assertEqual(set(scores), {1, 2})
+        self.assertEqual(index.search(parse_query('cancion invierno')).keys(), {1})
+        index.remove(1)
+        self.assertEqual(set(index.search(parse_query('cancion'))), {2})
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), DOCUMENT_TASKS_EAGER=False)
+class DocumentTaskQueueTests(TestCase):
+    """La extracción de texto se hace fuera de la petición de subida."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('subidor', 'subidor@test.com', 'pass1234')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def _upload(self, name='notas.txt', content=b'Acta de la reunion semanal'):
+        upload = SimpleUploadedFile(name, content, content_type='text/plain')
+        return self.client.post(reverse('document-list'), {'file': upload}, format='multipart')
+
+    def test_upload_returns_pending_and_worker_extracts(self):
+        with patch('api.tasks.iter_text_chunks') as extractor:
+            response = self._upload()
+            extractor.assert_not_called()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['processing_status'], 'pending')
+        self.assertEqual(response.data['extracted_content'], '')
+
+        # Extracción de texto + vista previa
+        self.assertEqual(process_pending(), 2)
+        document = Document.objects.get(pk=response.data['id'])
+        self.assertEqual(document.processing_status, Document.STATUS_DONE)
+        self.assertEqual(document.extracted_content, 'Acta de la reunion semanal')
+        self.assertEqual(document.tasks.get(kind=EXTRACT_TEXT).status, DocumentTask.STATUS_DONE)
+        self.assertEqual(process_pending(), 0)
+
+    def test_failed_task_is_retried_until_max_attempts(self):
+        response = self._upload()
+        with patch('api.tasks.iter_text_chunks', side_effect=RuntimeError('pdf roto')):
+            for attempt in range(3):
+                self.assertEqual(process_pending(kinds=[EXTRACT_TEXT]), 1)
+                if attempt < 2:
+                    # Quedan reintentos: el documento sigue pendiente, no fallido
+                    self.assertEqual(Document.objects.get(pk=response.data['id']).processing_status,
+                                     Document.STATUS_PENDING)
+        task = DocumentTask.objects.get(document_id=response.data['id'], kind=EXTRACT_TEXT)
+        self.assertEqual(task.status, DocumentTask.STATUS_FAILED)
+        self.assertEqual(task.attempts, 3)
+        self.assertEqual(task.last_error, 'pdf roto')
+        self.assertEqual(task.document.processing_status, Document.STATUS_FAILED)
+        self.assertEqual(process_pending(kinds=[EXTRACT_TEXT]), 0)
+
+    def test_worker_requeues_stale_tasks_while_polling(self):
+        response = self._upload()
+        task = DocumentTask.objects.get(document_id=response.data['id'], kind=EXTRACT_TEXT)
+        calls = []
+
+        def fake_process_pending(**kwargs):
+            calls.append(kwargs)
+            if len(calls) == 1:
+                # Un worker muere con el trabajo en ejecución mientras este ya está en marcha
+                DocumentTask.objects.filter(pk=task.pk).update(
+                    status=DocumentTask.STATUS_RUNNING, locked_at=timezone.now() - timedelta(hours=1))
+                return 0
+            if len(calls) == 3:
+                raise KeyboardInterrupt
+            return 0
+
+        with patch('api.management.commands.run_document_worker.process_pending', side_effect=fake_process_pending), \
+                patch('api.management.commands.run_document_worker.time.sleep'), \
+                patch('api.management.commands.run_document_worker.close_old_connections'):
+            call_command('run_document_worker', stale_check_interval=0, stdout=StringIO())
+        task.refresh_from_db()
+        self.assertEqual(task.status, DocumentTask.STATUS_PENDING)
+
+    def test_stale_task_without_attempts_left_fails(self):
+        response = self._upload()
+        stale = timezone.now() - timedelta(hours=1)
+        task = DocumentTask.objects.get(document_id=response.data['id'], kind=EXTRACT_TEXT)
+        DocumentTask.objects.filter(pk=task.pk).update(status=DocumentTask.STATUS_RUNNING, attempts=3, locked_at=stale)
+        preview = DocumentTask.objects.exclude(pk=task.pk).get(document_id=response.data['id'])
+        DocumentTask.objects.filter(pk=preview.pk).update(status=DocumentTask.STATUS_RUNNING, attempts=1, locked_at=stale)
+
+        self.assertEqual(requeue_stale(), (1, 1))
+        task.refresh_from_db()
+        self.assertEqual(task.status, DocumentTask.STATUS_FAILED)
+        self.assertIsNotNone(task.finished_at)
+        self.assertEqual(task.document.processing_status, Document.STATUS_FAILED)
+        preview.refresh_from_db()
+        self.assertEqual(preview.status, DocumentTask.STATUS_PENDING)
+        self.assertEqual(requeue_stale(), (0, 0))
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), DOCUMENT_TASKS_EAGER=False, DOCUMENT_TASKS_HEARTBEAT_SECONDS=0.05)
+class DocumentTaskHeartbeatTests(TransactionTestCase):
+    """Un trabajo largo renueva su marca y no se da por interrumpido."""
+
+    def test_running_task_is_not_requeued(self):
+        user = User.objects.create_user('latido', 'latido@test.com', 'pass1234')
+        document = Document.objects.create(owner=user, file='user_1/largo.txt')
+        DocumentTask.objects.create(document=document, kind='lento')
+        [task] = claim_tasks(1)
+        seen = []
+
+        def slow_handler(document):
+            time.sleep(0.3)
+            seen.append(requeue_stale(timeout=0.2))
+
+        with patch.dict(tasks._handlers, {'lento': slow_handler}):
+            self.assertTrue(run_task(task))
+        self.assertEqual(seen, [(0, 0)])
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.attempts), (DocumentTask.STATUS_DONE, 1))
+
+
+class ParallelPdfExtractionTests(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'largo.pdf')
+        pdf = canvas.Canvas(self.path)
+        for page in range(7):
+            pdf.drawString(72, 720, f'Pagina numero {page}')
+            pdf.showPage()
+        pdf.save()
+
+    def tearDown(self):
+        text_extractor._reset_pdf_pool()
+
+    def test_page_ranges_cover_all_pages_in_order(self):
+        self.assertEqual(text_extractor._page_ranges(7, 3), [(0, 3), (3, 5), (5, 7)])
+        self.assertEqual(text_extractor._page_ranges(2, 8), [(0, 1), (1, 2)])
+
+    @override_settings(PDF_PARALLEL_MIN_PAGES=5, PDF_EXTRACTION_WORKERS=2)
+    def test_parallel_extraction_matches_serial(self):
+        serial = text_extractor._extract_text_from_pdf(self.path, parallel=False)
+        self.assertEqual(text_extractor._extract_text_from_pdf(self.path), serial)
+        self.assertIsNotNone(text_extractor._pdf_pool)
+        self.assertEqual(
+            [line for line in serial.split('\n') if line],
+            [f'Pagina numero {page}' for page in range(7)])
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class StreamingExtractionTests(TestCase):
+    """El texto se escribe por bloques y se guarda el mapa de páginas."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('paginas', 'paginas@test.com', 'pass1234')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def _upload_and_process(self, name, content):
+        upload = SimpleUploadedFile(name, content)
+        response = self.client.post(reverse('document-list'), {'file': upload}, format='multipart')
+        process_pending()
+        return Document.objects.get(pk=response.data['id'])
+
+    def test_txt_pages_are_written_incrementally(self):
+        pages = ['Introduccion general', 'Capitulo con la clausula penal', 'Anexo final']
+        with patch('api.content.FLUSH_CHARS', 8), \
+                patch('api.content.Concat', wraps=Concat) as concat:
+            document = self._upload_and_process('libro.txt', '\f'.join(pages).encode())
+        # Un UPDATE por página: nunca se concatena todo el texto en memoria
+        self.assertEqual(concat.call_count, 3)
+        self.assertEqual(document.extracted_content, '\f'.join(pages))
+        self.assertEqual(len(document.page_offsets), 3)
+
+        url = reverse('document-page', args=[document.id])
+        response = self.client.get(url, {'number': 2})
+        self.assertEqual(response.data, {'number': 2, 'page_count': 3, 'text': pages[1]})
+        self.assertEqual(self.client.get(url, {'number': 3}).data['text'], pages[2])
+        self.assertEqual(self.client.get(url, {'number': 4}).status_code, 404)
+
+        results = self.client.get(reverse('document-list'), {'search': 'clausula'}).data
+        self.assertEqual(results[0]['search_page'], 2)
+
+    def test_docx_page_breaks_and_streamed_text_match_extract_text(self):
+        docx = DocxDocument()
+        docx.add_paragraph('Primera pagina')
+        docx.add_paragraph('Sigue la primera')
+        docx.add_paragraph().add_run().add_break(WD_BREAK.PAGE)
+        docx.add_paragraph('Segunda pagina')
+        buffer = BytesIO()
+        docx.save(buffer)
+
+        document = self._upload_and_process('informe.docx', buffer.getvalue())
+        self.assertEqual(document.extracted_content, extract_text(document))
+        self.assertEqual(len(document.page_offsets), 2)
+        self.assertEqual(get_page_text(document, 0), 'Primera pagina\nSigue la primera')
+        self.assertEqual(get_page_text(document, 1).strip(), 'Segunda pagina')
+
+    def test_manual_edit_resets_page_map(self):
+        document = self._upload_and_process('corto.txt', b'uno\fdos')
+        self.assertEqual(len(document.page_offsets), 2)
+        document.extracted_content = 'texto editado'
+        document.save()
+        document.refresh_from_db()
+        self.assertEqual(document.page_offsets, [])
+        self.assertEqual(get_page_text(document, 0), 'texto editado')
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), PREVIEW_SIZES=(320, 160), PREVIEW_FORMAT='WEBP')
+class PreviewGenerationTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('miniaturas', 'miniaturas@test.com', 'pass1234')
+
+    def _document(self, name, content):
+        return Document.objects.create(owner=self.user, file=ContentFile(content, name=name))
+
+    def test_text_preview_in_all_sizes_and_idempotent(self):
+        document = self._document('nota.txt', b'Lista de tareas pendientes para el lunes')
+        self.assertTrue(generate_previews(document))
+
+        document.refresh_from_db()
+        self.assertEqual(set(document.preview_sizes), {'320', '160'})
+        self.assertEqual(document.preview.name, document.preview_sizes['320'])
+        for width, name in document.preview_sizes.items():
+            with default_storage.open(name) as f, Image.open(f) as image:
+                self.assertEqual(image.format, 'WEBP')
+                self.assertEqual(image.width, int(width))
+
+        self.assertFalse(generate_previews(document))
+        self.assertEqual(documents_missing_previews(Document.objects.filter(pk=document.pk)), [])
+
+    def test_pdf_preview_and_backfill_command(self):
+        buffer = BytesIO()
+        pdf = canvas.Canvas(buffer)
+        pdf.drawString(72, 720, 'Informe trimestral de ventas')
+        pdf.save()
+        document = self._document('informe.pdf', buffer.getvalue())
+        self.assertEqual(len(documents_missing_previews()), 1)
+
+        call_command('generate_previews', '--now', stdout=StringIO())
+        document.refresh_from_db()
+        self.assertTrue(document.preview)
+        self.assertEqual(documents_missing_previews(), [])
+
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        data = client.get(reverse('document-detail', args=[document.id])).data
+        self.assertEqual(set(data['preview_urls']), {'320', '160'})
+        self.assertTrue(data['preview_url'].endswith('.webp'))
+
+
+@override_settings(RENDER_CACHE_DIR=tempfile.mkdtemp())
+class DownloadRenderCacheTests(TestCase):
+    """Las descargas se generan una vez por contenido y admiten If-None-Match."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('descargas', 'descargas@test.com', 'pass1234')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.document = Document.objects.create(
+            owner=self.user, file='user_1/reporte.pdf', extracted_content='Primera linea\nSegunda linea')
+        self.url = reverse('document-download', args=[self.document.id])
+
+    def test_repeated_download_uses_cache_and_etag(self):
+        with patch('api.views.render_pdf', wraps=render_pdf) as renderer:
+            first = self.client.get(self.url)
+            body = read_stream(first)
+            second = self.client.get(self.url)
+            self.assertEqual(read_stream(second), body)
+            self.assertEqual(renderer.call_count, 1)
+
+        self.assertTrue(body.startswith(b'%PDF'))
+        self.assertEqual(first['ETag'], second['ETag'])
+        not_modified = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+
+        self.document.extracted_content = 'Contenido editado'
+        self.document.save()
+        changed = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], first['ETag'])
+        read_stream(changed)
+
+    @override_settings(RENDER_CACHE_DIR=tempfile.mkdtemp())
+    def test_eviction_removes_least_recently_used(self):
+        paths = [render_cache.get_or_render(f'texto {i}', 'doc', '.txt', render_txt) for i in range(3)]
+        os.utime(paths[0], (1, 1))
+        os.utime(paths[1], (2, 2))
+        # Límite para un solo archivo (la expulsión deja la caché al 90%)
+        limit = int(os.path.getsize(paths[2]) / 0.9) + 1
+        self.assertEqual(render_cache.evict(limit=limit), 2)
+        self.assertEqual([os.path.exists(p) for p in paths], [False, False, True])
+
+
+class StreamingDownloadTests(TestCase):
+    """Con ?stream=1 la descarga se genera a partir del contenido leído por tramos."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('streaming', 'streaming@test.com', 'pass1234')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.content = '\n'.join(f'Línea {i} con <etiquetas> & símbolos' for i in range(300))
+
+    def _download(self, filename, **params):
+        document = Document.objects.create(
+            owner=self.user, file=f'user_1/{filename}', extracted_content=self.content)
+        response = self.client.get(reverse('document-download', args=[document.id]), params)
+        self.assertEqual(response.status_code, 200)
+        # Iterador asíncrono: bajo ASGI se envía bloque a bloque, sin sync_to_async(list)
+        self.assertTrue(response.is_async)
+        return response, read_stream(response)
+
+    def test_content_is_read_in_chunks(self):
+        document = Document.objects.create(owner=self.user, file='user_1/a.txt', extracted_content=self.content)
+        chunks = list(iter_content_chunks(document.pk, chunk_chars=1000))
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(''.join(chunks), self.content)
+
+    def test_streaming_txt(self):
+        response, body = self._download('notas.txt', stream='1')
+        self.assertEqual(body.decode('utf-8'), self.content)
+        self.assertIn('notas_contenido.txt', response['Content-Disposition'])
+
+    def test_streaming_pdf(self):
+        with patch('api.views.render_pdf') as full_renderer:
+            _, body = self._download('reporte.pdf', stream='1')
+        full_renderer.assert_not_called()
+        text = ''.join(page.extract_text() for page in PdfReader(BytesIO(body)).pages)
+        self.assertIn('Línea 299 con <etiquetas> & símbolos', text)
+
+    def test_streaming_docx(self):
+        _, body = self._download('informe.docx', stream='1')
+        paragraphs = [p.text for p in DocxDocument(BytesIO(body)).paragraphs]
+        self.assertEqual(paragraphs, self.content.split('\n'))
+
+    @override_settings(STREAMING_DOWNLOAD_MIN_CHARS=100)
+    def test_large_content_streams_automatically(self):
+        with patch('api.views.render_pdf_stream', wraps=render_pdf_stream) as renderer:
+            _, body = self._download('grande.pdf')
+        self.assertEqual(renderer.call_count, 1)
+        self.assertTrue(body.startswith(b'%PDF'))
+
+
+def fake_translation(text, target_language, source_language=None):
+    return {'translated_text': f'[{target_language}] {text}', 'detected_source_language': source_language or 'es'}
+
+
+class TranslationCacheTests(TestCase):
+    """translate_text solo llama al traductor una vez por (texto, origen, destino)."""
+
+    def setUp(self):
+        translation.clear_translation_cache()
+        self.user = User.objects.create_user('traductor', 'traductor@test.com', 'pass1234')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def tearDown(self):
+        translation.clear_translation_cache()
+
+    @patch('api.translation._translate_uncached', side_effect=fake_translation)
+    def test_memory_then_persistent_hits(self, translator):
+        first = translation.translate_text('Hola a todos', 'en')
+        second = translation.translate_text('Hola a todos', 'en')
+        self.assertEqual(first, second)
+        self.assertEqual(translator.call_count, 1)
+
+        # Otro proceso (memoria vacía) encuentra la traducción en la tabla
+        translation._memory_cache.clear()
+        self.assertEqual(translation.translate_text('Hola a todos', 'en'), first)
+        self.assertEqual(translator.call_count, 1)
+
+        translation.translate_text('Hola a todos', 'fr')
+        self.assertEqual(translator.call_count, 2)
+        stats = translation.translation_cache_stats()
+        self.assertEqual((stats['memory_hits'], stats['db_hits'], stats['misses']), (1, 1, 2))
+        self.assertEqual(stats['db_entries'], 2)
+
+    @patch('api.translation._translate_uncached', side_effect=RuntimeError('sin conexión'))
+    def test_errors_are_not_cached(self, translator):
+        self.assertIn('error', translation.translate_text('Hola', 'en'))
+        self.assertIn('error', translation.translate_text('Hola', 'en'))
+        self.assertEqual(translator.call_count, 2)
+        self.assertFalse(TranslationCacheEntry.objects.exists())
+
+    @override_settings(TRANSLATION_CACHE_TTL=60)
+    @patch('api.translation._translate_uncached', side_effect=fake_translation)
+    def test_expired_entries_are_translated_again(self, translator):
+        translation.translate_text('Hola', 'en')
+        translation._memory_cache.clear()
+        TranslationCacheEntry.objects.update(created_at=timezone.now() - timedelta(seconds=120))
+        translation.translate_text('Hola', 'en')
+        self.assertEqual(translator.call_count, 2)
+        self.assertEqual(TranslationCacheEntry.objects.count(), 1)
+
+    def test_write_keeps_a_fresh_entry_from_another_process(self):
+        key = translation.cache_key('Hola', 'en')
+        TranslationCacheEntry.objects.create(key=key, source_language='auto', target_language='en',
+                                             translated_text='Hello', detected_source_language='es')
+        translation._write_db(key, 'en', None, {'translated_text': 'Hi', 'detected_source_language': 'es'})
+        entry = TranslationCacheEntry.objects.get(key=key)
+        self.assertEqual(entry.translated_text, 'Hello')
+
+    def test_lru_and_table_limits(self):
+        lru = translation.TranslationLRUCache(max_entries=2, ttl=60)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+        self.assertEqual((lru.get('a'), lru.get('b'), lru.get('c')), (1, None, 3))
+
+        for i in range(5):
+            TranslationCacheEntry.objects.create(
+                key=f'k{i}', source_language='es', target_language='en', translated_text=str(i))
+        TranslationCacheEntry.objects.filter(key='k0').update(last_used_at=timezone.now() + timedelta(days=1))
+        self.assertEqual(translation.prune_translation_cache(max_entries=2), 3)
+        self.assertIn('k0', TranslationCacheEntry.objects.values_list('key', flat=True))
+
+    @patch('api.translation._translate_uncached', side_effect=fake_translation)
+    def test_snippet_endpoint_uses_cache_and_stats_are_admin_only(self, translator):
+        document = Document.objects.create(owner=self.user, file='user_1/a.txt', extracted_content='Hola')
+        url = reverse('document-translate-text-snippet', args=[document.id])
+        for _ in range(3):
+            response = self.client.post(url, {'text': 'Buenos días', 'target_language': 'en'}, format='json')
+            self.assertEqual(response.data['translated_text'], '[en] Buenos días')
+        self.assertEqual(translator.call_count, 1)
+
+        stats_url = reverse('translation-cache-stats')
+        self.assertEqual(self.client.get(stats_url).status_code, 403)
+        self.user.is_staff = True
+        self.user.save()
+        self.assertEqual(self.client.get(stats_url).data['memory_hits'], 2)
+
+
+@override_settings(TRANSLATION_CHUNK_CHARS=200, TRANSLATION_MAX_WORKERS=3, TRANSLATION_RETRY_DELAY=0)
+class ChunkedTranslationTests(TransactionTestCase):
+    """
+    translate-document traduce por fragmentos en hilos (cada uno con su propia
+    conexión), por eso se usa TransactionTestCase.
+    """
+
+    def setUp(self):
+        translation.clear_translation_cache()
+        self.paragraphs = [f'Párrafo {i}. Tiene dos frases con algo de texto de relleno.' for i in range(40)]
+        self.text = '\n\n'.join(self.paragraphs)
+
+    def test_split_preserves_text_and_limits(self):
+        chunks = translation.split_text(self.text)
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(''.join(chunks), self.text)
+        self.assertTrue(all(len(c) <= 200 for c in chunks))
+
+        long_paragraph = ' '.join(['Una frase corta.'] * 50) + ' ' + 'x' * 450
+        chunks = translation.split_text(long_paragraph)
+        self.assertEqual(''.join(chunks), long_paragraph)
+        self.assertTrue(all(len(c) <= 200 for c in chunks))
+
+    @patch('api.translation._translate_uncached', side_effect=fake_translation)
+    def test_chunks_are_reassembled_in_order_with_progress(self, translator):
+        progress = []
+        result = translation.translate_long_text(self.text, 'en', on_progress=lambda d, t: progress.append((d, t)))
+        chunks = translation.split_text(self.text)
+        expected = ''.join(f'[en] {c.rstrip()}' + c[len(c.rstrip()):] for c in chunks)
+        self.assertEqual(result['translated_text'], expected)
+        self.assertEqual(result['detected_source_language'], 'es')
+        total = result['chunks']
+        self.assertEqual(progress[0], (0, total))
+        self.assertEqual(progress[-1], (total, total))
+
+    @patch('api.translation._translate_uncached', side_effect=fake_translation)
+    def test_edited_document_only_sends_changed_chunks(self, translator):
+        translation.translate_long_text(self.text, 'en')
+        first_calls = translator.call_count
+        self.assertEqual(first_calls, len(translation.split_text(self.text)))
+
+        edited = self.text.replace('Párrafo 20.', 'Párrafo veinte.')
+        translation.translate_long_text(edited, 'en')
+        self.assertLessEqual(translator.call_count - first_calls, 2)
+
+    def test_failed_chunks_are_retried(self):
+        calls = []
+
+        def flaky(text, target_language, source_language=None):
+            calls.append(text)
+            if calls.count(text) == 1:
+                raise RuntimeError('timeout')
+            return fake_translation(text, target_language, source_language)
+
+        with patch('api.translation._translate_uncached', side_effect=flaky):
+            result = translation.translate_long_text(self.text, 'en')
+        self.assertNotIn('error', result)
+        self.assertEqual(len(calls), 2 * result['chunks'])
+
+        with patch('api.translation._translate_uncached', side_effect=RuntimeError('caído')):
+            result = translation.translate_long_text('Otro texto.\n\n' * 30, 'en')
+        self.assertIn('error', result)
+
+    @patch('api.translation._translate_uncached', side_effect=fake_translation)
+    def test_translate_document_endpoint_reports_progress(self, translator):
+        user = User.objects.create_user('largo', 'largo@test.com', 'pass1234')
+        client = APIClient()
+        client.force_authenticate(user=user)
+        document = Document.objects.create(owner=user, file='user_1/largo.txt', extracted_content=self.text)
+        progress_url = reverse('document-translation-progress', args=[document.id])
+        self.assertEqual(client.get(progress_url, {'target_language': 'en'}).status_code, 404)
+
+        response = client.post(reverse('document-translate-document', args=[document.id]),
+                               {'target_language': 'en'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['translated_text'].startswith('[en] Párrafo 0.'))
+        # El progreso está en la BD: lo responde cualquier proceso, no solo el que tradujo
+        cache.clear()
+        progress = client.get(progress_url, {'target_language': 'en'}).data
+        self.assertEqual(progress['status'], 'done')
+        self.assertEqual(progress['done'], progress['total'])
+        self.assertEqual(document.translation_progress.get().total, progress['total'])
+
+        # El de traducciones de hace más de una hora ya no se muestra
+        document.translation_progress.update(updated_at=timezone.now() - timedelta(hours=2))
+        self.assertEqual(client.get(progress_url, {'target_language': 'en'}).status_code, 404)
+
+
+
+class QuotaTests(TransactionTestCase):
+    """
+    Los cupos se descuentan con un UPDATE condicional: con peticiones
+    simultáneas (un hilo y una conexión por petición) nunca se supera el límite.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('cuota', 'cuota@test.com', 'pass1234')
+
+    def _run_concurrently(self, func, count):
+        barrier = threading.Barrier(count)
+
+        def worker(index):
+            try:
+                barrier.wait()
+                return func(index)
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=count) as pool:
+            return list(pool.map(worker, range(count)))
+
+    def test_concurrent_consume_never_exceeds_limit(self):
+        results = self._run_concurrently(lambda i: quotas.consume(self.user.id, quotas.AI_REQUESTS), 20)
+        self.assertEqual(sum(r.allowed for r in results), 5)
+        self.assertEqual(sorted(r.used for r in results if r.allowed), [1, 2, 3, 4, 5])
+        self.user.profile.refresh_from_db()
+        self.assertEqual(self.user.profile.daily_ai_requests_count, 5)
+
+    def test_concurrent_leases_grant_exactly_the_limit(self):
+        granted = self._run_concurrently(lambda i: quotas.lease(self.user.id, quotas.CHAT_MESSAGES, 3), 12)
+        self.assertEqual(sum(granted), 10)
+        quotas.release(self.user.id, quotas.CHAT_MESSAGES, 4)
+        self.assertEqual(quotas.usage(self.user.id, quotas.CHAT_MESSAGES), (6, 10))
+
+    def test_counter_resets_on_a_new_day(self):
+        yesterday = timezone.now().date() - timedelta(days=1)
+        Profile.objects.filter(user=self.user).update(daily_ai_requests_count=5, last_ai_request_date=yesterday)
+        self.assertEqual(quotas.consume(self.user.id, quotas.AI_REQUESTS), (True, 1, 5))
+
+    @patch('api.views.GeminiAssistant')
+    def test_concurrent_ai_requests_and_profile_saves(self, assistant):
+        assistant.return_value.process_command.return_value = {'response': 'ok'}
+
+        def request(index):
+            client = APIClient()
+            client.force_authenticate(user=self.user)
+            if index == 0:
+                # Un guardado del perfil a la vez no debe pisar el contador
+                client.patch(reverse('profile-detail'), {'language_preference': 'en'}, format='json')
+            return client.post(reverse('ai-assistant'), {'prompt': 'hola'}, format='json').status_code
+
+        codes = self._run_concurrently(request, 12)
+        self.assertEqual(codes.count(200), 5)
+        self.assertEqual(codes.count(403), 7)
+        profile = Profile.objects.get(user=self.user)
+        self.assertEqual(profile.daily_ai_requests_count, 5)
+        self.assertEqual(profile.language_preference, 'en')
+
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        self.assertEqual(client.post(reverse('upgrade-premium')).status_code, 200)
+        profile.refresh_from_db()
+        self.assertEqual((profile.subscription_plan, profile.daily_ai_requests_count), ('premium', 5))
+        self.assertEqual(quotas.consume(self.user.id, quotas.AI_REQUESTS), (True, 6, 30))
+
+
+@override_settings(TRANSLATION_PROVIDER={'BACKEND': 'api.async_translation.FakeTranslationProvider',
+                                         'OPTIONS': {'delay': 0.05}},
+                   TRANSLATION_MAX_CONCURRENCY=2)
+class AsyncTranslationTests(TransactionTestCase):
+    """Cliente asíncrono del chat: límite de concurrencia, tiempo máximo y caché."""
+
+    def setUp(self):
+        translation.clear_translation_cache()
+        async_translation.reset_provider()
+
+    async def test_concurrency_is_limited(self):
+        texts = [f'mensaje {i}' for i in range(6)]
+        results = await asyncio.gather(*(async_translation.translate_text_async(t, 'en', 'es') for t in texts))
+        self.assertEqual([r['translated_text'] for r in results], [f'[en] {t}' for t in texts])
+        self.assertEqual(async_translation.get_provider().peak, 2)
+
+    async def test_repeated_text_uses_cache(self):
+        await async_translation.translate_text_async('Hola', 'en', 'es')
+        result = await async_translation.translate_text_async('Hola', 'en', 'es')
+        self.assertEqual(result['translated_text'], '[en] Hola')
+        self.assertEqual(len(async_translation.get_provider().calls), 1)
+        self.assertEqual(await async_translation.translate_text_async('Hola', 'xx'),
+                         {'error': "El idioma de destino 'xx' no es válido."})
+
+    @override_settings(TRANSLATION_TIMEOUT=0.01)
+    async def test_timeout_is_an_uncached_error(self):
+        result = await async_translation.translate_text_async('Hola', 'en', 'es')
+        self.assertIn('error', result)
+        stats = await sync_to_async(translation.translation_cache_stats)()
+        self.assertEqual((stats['errors'], stats['memory_entries'], stats['db_entries']), (1, 0, 0))
+
+    async def test_google_provider_parses_response(self):
+        def handler(request):
+            self.assertEqual(request.url.params['tl'], 'en')
+            return httpx.Response(200, json=[[['Hello ', 'Hola ', None, None, 10], ['world', 'mundo']], None, 'es'])
+
+        provider = async_translation.GoogleTranslateProvider(transport=httpx.MockTransport(handler))
+        result = await provider.translate('Hola mundo', 'en')
+        await provider.aclose()
+        self.assertEqual(result, {'translated_text': 'Hello world', 'detected_source_language': 'es'})
+
+    @override_settings(TRANSLATION_CACHE_DB_THREADS=1)
+    async def test_cache_thread_reuses_its_connection(self):
+        wrapper = type(connections['default'])
+        with patch.object(wrapper, 'get_new_connection', autospec=True,
+                          side_effect=wrapper.get_new_connection) as connect:
+            for i in range(3):
+                await async_translation.translate_text_async(f'mensaje {i}', 'en', 'es')
+        # Tres fallos: tres lecturas y tres escrituras con una sola conexión
+        self.assertEqual(connect.call_count, 1)
+
+    @patch('api.translation._translate_uncached', side_effect=fake_translation)
+    async def test_providers_do_not_share_cache_entries(self, translator):
+        await sync_to_async(translation.translate_text)('Hola', 'en', 'es')
+        result = await async_translation.translate_text_async('Hola', 'en', 'es')
+        self.assertEqual(result['translated_text'], '[en] Hola')
+        self.assertEqual(len(async_translation.get_provider().calls), 1)
+        keys = await sync_to_async(lambda: set(TranslationCacheEntry.objects.values_list('key', flat=True)))()
+        self.assertEqual(keys, {
+            translation.cache_key('Hola', 'en', 'es'),
+            translation.cache_key('Hola', 'en', 'es', provider='api.async_translation.FakeTranslationProvider'),
+        })
+
+
+@override_settings(ASSISTANT_CONTEXT_MAX_DOCUMENTS=20, ASSISTANT_CONTEXT_MAX_FOLDERS=10, ASSISTANT_CONTEXT_MAX_TAGS=10)
+class AssistantContextTests(TestCase):
+    """El contexto del asistente sale de una instantánea cacheada y solo incluye lo relevante."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('asistente', 'asistente@test.com', 'pass1234')
+        folders = Folder.objects.bulk_create([Folder(owner=self.user, name=f'carpeta{i}') for i in range(15)])
+        self.tags = Tag.objects.bulk_create([Tag(owner=self.user, name=f'etiqueta{i}') for i in range(15)])
+        documents = Document.objects.bulk_create([
+            Document(owner=self.user, folder=folders[i % 15], file=f'user_1/notas_{i}.txt') for i in range(300)])
+        self.report = Document.objects.create(owner=self.user, file='user_1/informe_ventas_2024.pdf')
+        self.invoices = Tag.objects.create(owner=self.user, name='facturas')
+        Document.tags.through.objects.bulk_create([
+            Document.tags.through(document=doc, tag=self.tags[i % 15]) for i, doc in enumerate(documents)])
+        documents[5].tags.add(self.invoices)
+        self.tagged = documents[5]
+
+    def test_snapshot_is_cached_and_invalidated(self):
+        with self.assertNumQueries(4):
+            assistant_context.build_context(self.user, 'hola')
+        with self.assertNumQueries(0):
+            assistant_context.build_context(self.user, 'otra petición')
+
+        Document.objects.create(owner=self.user, file='user_1/nuevo_contrato.pdf')
+        with self.assertNumQueries(4):
+            context = assistant_context.build_context(self.user, 'contrato')
+        self.assertIn('nuevo_contrato.pdf', context)
+
+    def test_prompt_is_capped_and_ranked(self):
+        context = assistant_context.build_context(self.user, 'Resume el informe de ventas')
+        lines = context.splitlines()
+        self.assertEqual(sum(1 for line in lines if line.startswith('- ID: ') and 'Nombre: user_1/' in line), 20)
+        self.assertIn('informe_ventas_2024.pdf', lines[1])
+        self.assertIn('(y 281 documentos más', context)
+        self.assertLess(len(context), 2500)
+
+        context = assistant_context.build_context(self.user, 'etiqueta las facturas')
+        self.assertIn(f'ID: {self.tagged.id},', context.splitlines()[1])
+        self.assertIn(f'ID: {self.report.id},', assistant_context.build_context(self.user, f'borra el {self.report.id}'))
+
+    def test_process_command_prompt_size(self):
+        prompts = []
+
+        class RecordingLLM(LLMProvider):
+            def generate(self, prompt):
+                prompts.append(prompt)
+                return '{"action": "ninguna"}'
+
+        assistant = GeminiAssistant(self.user, llm=RecordingLLM())
+        with self.assertNumQueries(4):
+            assistant.process_command('Resume el informe de ventas')
+        full_prompt = prompts[0]
+        self.assertIn('informe_ventas_2024.pdf', full_prompt)
+        self.assertLess(len(full_prompt), 5000)
+
+
+@override_settings(ASSISTANT_TAG_BATCH_SIZE=25, ASSISTANT_TAG_WORKERS=3)
+class AutoTaggingTests(TestCase):
+    """tag_all envía los documentos por lotes en paralelo y crea etiquetas y relaciones en bloque."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('etiquetas', 'etiquetas@test.com', 'pass1234')
+        topics = ['facturas', 'recetas', 'contratos']
+        self.documents = Document.objects.bulk_create([
+            Document(owner=self.user, file=f'user_1/doc_{i}.txt', extracted_content=f'{topics[i % 3]} y más texto')
+            for i in range(60)])
+        Document.objects.create(owner=self.user, file='user_1/vacio.txt')
+        self.existing = Tag.objects.create(owner=self.user, name='Facturas')
+        self.documents[0].tags.add(self.existing)
+
+    def test_batches_and_bulk_inserts(self):
+        model = FakeLLMProvider()
+        assistant = GeminiAssistant(self.user, llm=model)
+        with self.assertNumQueries(4):
+            result = assistant._tag_all_documents({})
+        self.assertEqual(result['message'], '60 documentos etiquetados automáticamente')
+        self.assertEqual(model.calls, 3)
+        self.assertEqual(sorted(Tag.objects.filter(owner=self.user).values_list('name', flat=True)),
+                         ['Contratos', 'Facturas', 'Recetas'])
+        self.assertEqual(self.documents[0].tags.count(), 1)
+        self.assertEqual(Document.tags.through.objects.filter(tag__owner=self.user).count(), 60)
+
+    def test_failed_batch_is_reported(self):
+        calls = []
+        first = f'### Documento {self.documents[0].id}\n'
+
+        class FlakyLLM(FakeLLMProvider):
+            def generate(self, prompt):
+                calls.append(prompt)
+                return 'no es JSON' if first in prompt else super().generate(prompt)
+
+        assistant = GeminiAssistant(self.user, llm=FlakyLLM())
+        result = assistant._tag_all_documents({})
+        self.assertEqual(result['message'], '35 documentos etiquetados automáticamente (25 sin etiqueta por errores de la IA)')
+        self.assertEqual(len(calls), 3)
+
+
+FAKE_LLM = {'BACKEND': 'api.llm.FakeLLMProvider', 'OPTIONS': {}}
+
+
+@override_settings(LLM_PROVIDER=FAKE_LLM)
+class LLMProviderTests(TestCase):
+    """El modelo del asistente se elige en LLM_PROVIDER; el falso permite probar el endpoint sin red."""
+
+    def setUp(self):
+        reset_llm()
+        self.user = User.objects.create_user('modelo', 'modelo@test.com', 'pass1234')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_provider_comes_from_settings(self):
+        self.assertIsInstance(get_llm(), FakeLLMProvider)
+        self.assertIs(get_llm(), get_llm())
+        with override_settings(LLM_PROVIDER={'BACKEND': 'api.llm.FakeLLMProvider', 'OPTIONS': {'latency': 0.01}}):
+            self.assertEqual(get_llm().latency, 0.01)
+        self.assertEqual(get_llm().latency, 0.0)
+
+    def test_fake_latency_jitter_is_reproducible(self):
+        def timings(seed):
+            llm = FakeLLMProvider(latency=0.001, jitter=0.02, seed=seed)
+            with patch('api.llm.time.sleep') as sleep:
+                for _ in range(5):
+                    llm.generate('hola')
+            return [call.args[0] for call in sleep.call_args_list]
+
+        self.assertEqual(timings(1), timings(1))
+        self.assertNotEqual(timings(1), timings(2))
+        self.assertTrue(all(0.001 <= delay <= 0.021 for delay in timings(3)))
+
+    def test_ai_assistant_end_to_end(self):
+        document = Document.objects.create(owner=self.user, file='user_1/factura.txt', extracted_content='factura')
+        prompt = json.dumps({'action': 'tag_document', 'parameters': {'document_id': document.id, 'tag_name': 'Pagos'}})
+        response = self.client.post(reverse('ai-assistant'), {'prompt': prompt}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['success'])
+        self.assertEqual(list(document.tags.values_list('name', flat=True)), ['Pagos'])
+
+        response = self.client.post(reverse('ai-assistant'), {'prompt': 'hola'}, format='json')
+        self.assertEqual(response.data, {'success': False, 'message': 'Acción no reconocida'})
+        self.assertEqual(get_llm().calls, 2)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class AssistantResponseCacheTests(TestCase):
+    """Resumen, mapa conceptual y carpeta sugerida no vuelven a llamar al modelo con el mismo contenido."""
+
+    def setUp(self):
+        assistant_cache.clear_assistant_cache()
+        self.user = User.objects.create_user('cache_ia', 'cache_ia@test.com', 'pass1234')
+        self.llm = FakeLLMProvider()
+        self.assistant = GeminiAssistant(self.user, llm=self.llm)
+        self.first = Document.objects.create(owner=self.user, file='user_1/a.txt', extracted_content='Facturas de marzo')
+        self.second = Document.objects.create(owner=self.user, file='user_1/b.txt', extracted_content='Facturas de marzo')
+
+    def test_repeated_action_skips_the_model(self):
+        self.assistant._organize_document({'document_id': self.first.id})
+        self.assistant._organize_document({'document_id': self.second.id})
+        self.assertEqual(self.llm.calls, 1)
+        self.second.refresh_from_db()
+        self.assertEqual(self.second.folder.name, 'Facturas')
+        self.assertEqual(assistant_cache.assistant_cache_stats()['hits'], 1)
+
+        self.assistant._summarize_document({'document_id': self.first.id})
+        self.assistant._summarize_document({'document_id': self.first.id})
+        self.assertEqual(self.llm.calls, 2)
+        self.assertEqual(Document.objects.filter(owner=self.user, file__contains='resumen_').count(), 2)
+
+        # Otro contenido u otra versión del prompt sí llaman al modelo
+        Document.objects.filter(pk=self.second.pk).update(extracted_content='Recetas de cocina')
+        self.assistant._organize_document({'document_id': self.second.id})
+        with patch.dict(PROMPT_VERSIONS, organize=2):
+            self.assistant._organize_document({'document_id': self.first.id})
+        self.assertEqual(self.llm.calls, 4)
+
+    def test_responses_are_not_shared_between_models(self):
+        class OtherModel(FakeLLMProvider):
+            def _respond(self, prompt):
+                return 'Otra'
+
+        self.assistant._organize_document({'document_id': self.first.id})
+        other = OtherModel()
+        GeminiAssistant(self.user, llm=other)._organize_document({'document_id': self.second.id})
+        self.assertEqual(other.calls, 1)
+        self.second.refresh_from_db()
+        self.assertEqual(self.second.folder.name, 'Otra')
+        self.assertEqual(set(AssistantResponseCacheEntry.objects.values_list('model', flat=True)),
+                         {'api.llm.FakeLLMProvider', other.identifier})
+
+    def test_empty_responses_and_errors_are_not_cached(self):
+        class EmptyLLM(LLMProvider):
+            def generate(self, prompt):
+                return '  '
+
+        assistant_cache.cached_generate(EmptyLLM().generate, 'vacío', 'summarize', 1, 'texto', 'Resume: texto')
+        with patch.object(self.llm, 'generate', side_effect=RuntimeError('sin cuota')):
+            with self.assertRaises(RuntimeError):
+                assistant_cache.cached_generate(self.llm.generate, self.llm.identifier, 'summarize', 1, 'texto', 'Resume: texto')
+        self.assertFalse(AssistantResponseCacheEntry.objects.exists())
+
+    def test_prune_evicts_least_recently_used_by_size(self):
+        for i in range(5):
+            assistant_cache.cached_generate(self.llm.generate, self.llm.identifier, 'summarize', 1, f'texto {i}', 'x' * 100)
+        assistant_cache.cached_generate(self.llm.generate, self.llm.identifier, 'summarize', 1, 'texto 0', 'x' * 100)  # acierto: pasa a ser reciente
+        self.assertEqual(assistant_cache.assistant_cache_stats()['bytes'], 500)
+
+        self.assertEqual(assistant_cache.prune_assistant_cache(max_bytes=250), 3)
+        remaining = set(AssistantResponseCacheEntry.objects.values_list('key', flat=True))
+        self.assertEqual(remaining, {assistant_cache.cache_key(self.llm.identifier, 'summarize', 1, f'texto {i}') for i in (0, 4)})
+        self.assertEqual(assistant_cache.prune_assistant_cache(max_bytes=250), 0)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(),
+                   LLM_PROVIDER={'BACKEND': 'api.llm.FakeLLMProvider', 'OPTIONS': {'chunk_words': 2}})
+class AssistantStreamTests(TransactionTestCase):
+    """ai-assistant/stream/ emite el progreso y el texto del modelo según llega, y al final el resultado."""
+
+    def setUp(self):
+        reset_llm()
+        assistant_cache.clear_assistant_cache()
+        self.user = User.objects.create_user('streaming', 'streaming@test.com', 'pass1234')
+        self.document = Document.objects.create(owner=self.user, file='user_1/notas.txt',
+                                                extracted_content='uno dos tres cuatro cinco')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def _events(self, response):
+        body = read_stream(response).decode('utf-8')
+        events = []
+        for frame in body.split('\n\n')[:-1]:
+            event, data = frame.split('\n')
+            events.append((event.removeprefix('event: '), json.loads(data.removeprefix('data: '))))
+        return events
+
+    def _prompt(self):
+        return json.dumps({'action': 'summarize', 'parameters': {'document_id': self.document.id, 'create_new': False}})
+
+    def test_stream_emits_progress_tokens_and_result(self):
+        response = self.client.post(reverse('ai-assistant-stream'), {'prompt': self._prompt()}, format='json',
+                                    HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+
+        events = self._events(response)
+        self.assertEqual([data['stage'] for event, data in events if event == 'progress'],
+                         ['context', 'interpret', 'action'])
+        self.assertEqual([data['text'] for event, data in events if event == 'token'],
+                         ['uno dos ', 'tres cuatro ', 'cinco'])
+        self.assertEqual(events[-1], ('result', {'success': True, 'message': 'Documento actualizado con resumen'}))
+        self.document.refresh_from_db()
+        self.assertEqual(self.document.extracted_content, 'uno dos tres cuatro cinco')
+        self.assertEqual(quotas.usage(self.user.id, quotas.AI_REQUESTS), (1, 5))
+
+        # El endpoint JSON da el mismo resultado sin streaming
+        response = self.client.post(reverse('ai-assistant'), {'prompt': self._prompt()}, format='json')
+        self.assertEqual(response.data, events[-1][1])
+
+    def test_cached_response_is_streamed_as_one_token(self):
+        self._events(self.client.post(reverse('ai-assistant-stream'), {'prompt': self._prompt()}, format='json'))
+        calls = get_llm().calls
+        events = self._events(self.client.post(reverse('ai-assistant-stream'), {'prompt': self._prompt()},
+                                               format='json'))
+        # Solo se llama al modelo para interpretar la orden: el resumen sale de la caché
+        self.assertEqual(get_llm().calls, calls + 1)
+        self.assertEqual([data['text'] for event, data in events if event == 'token'],
+                         ['uno dos tres cuatro cinco'])
+        self.assertEqual(events[-1], ('result', {'success': True, 'message': 'Documento actualizado con resumen'}))
+
+    def test_errors_before_streaming(self):
+        response = self.client.post(reverse('ai-assistant-stream'), {}, format='json', HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.content.decode('utf-8'),
+                         'event: error\ndata: {"error": "El prompt es requerido"}\n\n')
+
+        Profile.objects.filter(user=self.user).update(daily_ai_requests_count=5, last_ai_request_date=timezone.now().date())
+        response = self.client.post(reverse('ai-assistant-stream'), {'prompt': 'hola'}, format='json')
+        self.assertEqual(response.status_code, 403)
+        self.assertIn('límite diario', response.data['error'])
@@ -1,65 +1,210 @@
 import os
+import multiprocessing
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from django.conf import settings
 from pypdf import PdfReader
 from docx import Document
+from docx.oxml.ns import qn
 import io
 
+# Los extractores son generadores que devuelven tuplas (página, fragmento).
+# Concatenar todos los fragmentos reproduce el texto completo (incluidos los
+# separadores entre páginas, que pertenecen a la página anterior), así que
+# quien los consume puede escribirlos poco a poco sin tener todo en memoria.
+
+# Tamaño de bloque al leer archivos de texto
+TXT_CHUNK_CHARS = 64 * 1024
+
+# Pool de procesos compartido para extraer PDFs grandes en paralelo.
+# Se crea la primera vez que se necesita y se reutiliza entre documentos.
+_pdf_pool = None
+_pdf_pool_lock = threading.Lock()
+
+
+def _iter_txt_pages(file_path):
+    """Lee un .txt por bloques. El salto de página (\\f) separa páginas."""
+    page = 0
+    with open(file_path, 'r', encoding='utf-8') as f:
+        while True:
+            block = f.read(TXT_CHUNK_CHARS)
+            if not block:
+                break
+            parts = block.split('\f')
+            for part in parts[:-1]:
+                yield page, part + '\f'
+                page += 1
+            if parts[-1]:
+                yield page, parts[-1]
+
+
 def _extract_text_from_txt(file_path):
     """Extrae texto de un archivo .txt simple."""
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return f.read()
+        return "".join(chunk for _, chunk in _iter_txt_pages(file_path))
     except Exception as e:
         print(f"Error leyendo TXT: {e}")
         return ""
 
-def _extract_text_from_pdf(file_path):
+def _pdf_workers():
+    return getattr(settings, 'PDF_EXTRACTION_WORKERS', None) or os.cpu_count() or 1
+
+
+def _get_pdf_pool():
+    """Devuelve el pool de procesos compartido (contexto 'spawn', seguro con hilos)."""
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is None:
+            _pdf_pool = ProcessPoolExecutor(
+                max_workers=_pdf_workers(),
+                mp_context=multiprocessing.get_context('spawn'))
+        return _pdf_pool
+
+
+def _reset_pdf_pool():
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is not None:
+            _pdf_pool.shutdown(wait=False, cancel_futures=True)
+        _pdf_pool = None
+
+
+def _extract_pdf_page_range(file_path, start, end):
+    """Extrae las páginas [start, end) de un PDF. Se ejecuta en un proceso del pool."""
+    reader = PdfReader(file_path)
+    return [reader.pages[i].extract_text() or "" for i in range(start, end)]
+
+
+def _page_ranges(total_pages, parts):
+    """Divide `total_pages` en `parts` rangos contiguos de tamaño similar."""
+    parts = max(1, min(parts, total_pages))
+    size, extra = divmod(total_pages, parts)
+    ranges, start = [], 0
+    for i in range(parts):
+        end = start + size + (1 if i < extra else 0)
+        ranges.append((start, end))
+        start = end
+    return ranges
+
+
+def _iter_pdf_pages_parallel(file_path, total_pages, workers):
+    """
+    Reparte las páginas en rangos (varios por proceso para equilibrar la carga)
+    y los extrae en el pool. Devuelve las páginas en su orden original y nunca
+    tiene más de 2 rangos por proceso en vuelo, para acotar la memoria.
+    """
+    pool = _get_pdf_pool()
+    ranges = deque(_page_ranges(total_pages, workers * 4))
+    in_flight = deque()
+    while ranges or in_flight:
+        while ranges and len(in_flight) < workers * 2:
+            start, end = ranges.popleft()
+            in_flight.append(pool.submit(_extract_pdf_page_range, file_path, start, end))
+        try:
+            pages = in_flight.popleft().result()
+        except BrokenProcessPool:
+            # Un proceso murió (p. ej. sin memoria): se recrea el pool en el próximo uso
+            _reset_pdf_pool()
+            raise
+        yield from pages
+
+
+def _iter_pdf_pages(file_path, parallel=None):
+    """
+    Extrae un .pdf página a página. Los PDFs con al menos
+    PDF_PARALLEL_MIN_PAGES páginas se extraen en paralelo en un pool de
+    procesos; los pequeños, en serie (arrancar procesos no compensa).
+    """
+    reader = PdfReader(file_path)
+    total_pages = len(reader.pages)
+    workers = _pdf_workers()
+    if parallel is None:
+        min_pages = getattr(settings, 'PDF_PARALLEL_MIN_PAGES', 40)
+        parallel = workers > 1 and total_pages >= min_pages
+
+    if parallel:
+        pages = _iter_pdf_pages_parallel(file_path, total_pages, workers)
+    else:
+        pages = (page.extract_text() or "" for page in reader.pages)
+
+    for number, text in enumerate(pages):
+        if number:
+            yield number - 1, "\n"
+        if text:
+            yield number, text
+
+
+def _extract_text_from_pdf(file_path, parallel=None):
     """Extrae texto de un archivo .pdf."""
     try:
-        reader = PdfReader(file_path)
-        text = []
-        for page in reader.pages:
-            text.append(page.extract_text() or "")
-        return "\n".join(text)
+        try:
+            return "".join(chunk for _, chunk in _iter_pdf_pages(file_path, parallel))
+        except BrokenProcessPool as e:
+            print(f"Pool de extracción caído, se extrae en serie: {e}")
+            return "".join(chunk for _, chunk in _iter_pdf_pages(file_path, parallel=False))
     except Exception as e:
         print(f"Error leyendo PDF: {e}")
         return ""
 
+
+def _has_page_break(paragraph):
+    """Indica si el párrafo empieza una página nueva (salto de página explícito)."""
+    for br in paragraph._p.iter(qn('w:br')):
+        if br.get(qn('w:type')) == 'page':
+            return True
+    return False
+
+
+def _iter_docx_pages(file_path):
+    """Extrae un .docx párrafo a párrafo; los saltos de página explícitos separan páginas."""
+    doc = Document(file_path)
+    page = 0
+    for i, para in enumerate(doc.paragraphs):
+        if i:
+            yield page, "\n"
+        if _has_page_break(para):
+            page += 1
+        if para.text:
+            yield page, para.text
+
+
 def _extract_text_from_docx(file_path):
     """Extrae texto de un archivo .docx."""
     try:
-        doc = Document(file_path)
-        text = []
-        for para in doc.paragraphs:
-            text.append(para.text)
-        return "\n".join(text)
+        return "".join(chunk for _, chunk in _iter_docx_pages(file_path))
     except Exception as e:
         print(f"Error leyendo DOCX: {e}")
         return ""
 
+
+def iter_text_chunks(document):
+    """
+    Devuelve un generador de (página, fragmento) con el texto del documento,
+    según su extensión. Para tipos no soportados no devuelve nada.
+    A diferencia de extract_text, los errores de lectura se propagan.
+    """
+    file_path = document.file.path
+    _, extension = os.path.splitext(file_path)
+    extension = extension.lower()
+
+    if extension == '.txt':
+        return _iter_txt_pages(file_path)
+    elif extension == '.pdf':
+        return _iter_pdf_pages(file_path)
+    elif extension == '.docx':
+        return _iter_docx_pages(file_path)
+    return iter(())
+
+
 def extract_text(document):
     """
     Función principal que recibe un objeto Documento de Django,
     revisa su extensión y llama al extractor correspondiente.
     """
     try:
-        file_path = document.file.path
-        # Obtener la extensión del archivo
-        _, extension = os.path.splitext(file_path)
-        extension = extension.lower()
-
-        if extension == '.txt':
-            return _extract_text_from_txt(file_path)
-        
-        elif extension == '.pdf':
-            return _extract_text_from_pdf(file_path)
-        
-        elif extension == '.docx':
-            return _extract_text_from_docx(file_path)
-        
-        else:
-            # Tipo de archivo no soportado
-            return ""
-            
+        return "".join(chunk for _, chunk in iter_text_chunks(document))
     except Exception as e:
         print(f"Error general al extraer texto del documento {document.id}: {e}")
-        return ""
\ No newline at end of file
+        return ""
@@ -1,31 +1,407 @@
+"""
+Traducción de textos con googletrans, con una caché de dos niveles:
+
+1. Una LRU en memoria del proceso (TRANSLATION_CACHE_MEMORY_ENTRIES entradas),
+   que evita repetir la traducción del mismo mensaje para cada receptor.
+2. La tabla TranslationCacheEntry, compartida entre procesos y reinicios,
+   limitada a TRANSLATION_CACHE_DB_ENTRIES filas (se eliminan las menos usadas).
+
+Ambos niveles caducan a los TRANSLATION_CACHE_TTL segundos. Los errores de
+traducción nunca se guardan. La clave incluye el servicio que tradujo
+(PROVIDER aquí; TranslationProvider.identifier en el chat): dos servicios no
+dan exactamente el mismo texto, y cada uno solo reutiliza sus traducciones. La usan el chat, translate-text y
+translate-document a través de `translate_text`.
+
+Los textos largos (translate-document) se traducen con `translate_long_text`:
+se parten en fragmentos por párrafos y frases, se traducen en paralelo y se
+vuelven a unir en orden. Como cada fragmento pasa por la caché, al volver a
+traducir un documento editado solo se envían los fragmentos que cambiaron.
+"""
+import hashlib
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
 from googletrans import Translator, LANGUAGES
-# 1. No necesitamos importar asyncio
 
-def translate_text(text, target_language, source_language=None):
+from .models import TranslationCacheEntry, TranslationProgress
+
+AUTO_SOURCE = 'auto'
+
+# Servicio de translate_text (googletrans); forma parte de la clave de la caché
+PROVIDER = 'googletrans'
+
+# Cada cuántas escrituras en la tabla se comprueba su tamaño
+_PRUNE_EVERY = 100
+
+_local = threading.local()
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _get_translator():
+    """Un Translator por hilo: crear uno por llamada abre una conexión nueva cada vez."""
+    translator = getattr(_local, 'translator', None)
+    if translator is None:
+        translator = _local.translator = Translator()
+    return translator
+
+
+class TranslationLRUCache:
+    """LRU en memoria con caducidad por entrada. Es segura entre hilos."""
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_memory_cache = TranslationLRUCache(
+    _setting('TRANSLATION_CACHE_MEMORY_ENTRIES', 2048),
+    _setting('TRANSLATION_CACHE_TTL', 30 * 24 * 3600))
+
+_stats_lock = threading.Lock()
+_stats = {'memory_hits': 0, 'db_hits': 0, 'misses': 0, 'errors': 0}
+_db_writes = 0
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def cache_key(text, target_language, source_language=None, provider=PROVIDER):
+    digest = hashlib.sha256()
+    digest.update(f'{provider}:{source_language or AUTO_SOURCE}:{target_language}\0'.encode('utf-8'))
+    digest.update(text.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _read_db(key):
+    ttl = timedelta(seconds=_setting('TRANSLATION_CACHE_TTL', 30 * 24 * 3600))
+    entry = TranslationCacheEntry.objects.filter(
+        key=key, created_at__gte=timezone.now() - ttl
+    ).values('translated_text', 'detected_source_language').first()
+    if entry is not None:
+        TranslationCacheEntry.objects.filter(key=key).update(
+            hits=F('hits') + 1, last_used_at=timezone.now())
+    return entry
+
+
+def _write_db(key, target_language, source_language, result):
+    global _db_writes
+    # Entrada caducada, si la hay; una vigente (p. ej. recién escrita por otro
+    # proceso) se conserva y el INSERT de abajo choca con ella sin efecto
+    ttl = timedelta(seconds=_setting('TRANSLATION_CACHE_TTL', 30 * 24 * 3600))
+    TranslationCacheEntry.objects.filter(key=key, created_at__lt=timezone.now() - ttl).delete()
+    try:
+        with transaction.atomic():
+            TranslationCacheEntry.objects.create(
+                key=key,
+                source_language=source_language or AUTO_SOURCE,
+                target_language=target_language,
+                translated_text=result['translated_text'],
+                detected_source_language=result['detected_source_language'] or '',
+            )
+    except IntegrityError:
+        pass  # otro proceso la guardó a la vez
+    with _stats_lock:
+        _db_writes += 1
+        prune = _db_writes % _PRUNE_EVERY == 0
+    if prune:
+        prune_translation_cache()
+
+
+def prune_translation_cache(max_entries=None):
     """
-    Traduce un texto usando la librería googletrans (versión síncrona).
+    Elimina las entradas caducadas y, si la tabla supera el límite, las menos
+    usadas. Devuelve el número de filas eliminadas.
     """
-    # Validar que el idioma de destino sea válido
+    max_entries = max_entries if max_entries is not None else _setting('TRANSLATION_CACHE_DB_ENTRIES', 100000)
+    ttl = timedelta(seconds=_setting('TRANSLATION_CACHE_TTL', 30 * 24 * 3600))
+    removed, _ = TranslationCacheEntry.objects.filter(created_at__lt=timezone.now() - ttl).delete()
+    excess = TranslationCacheEntry.objects.count() - max_entries
+    if excess > 0:
+        oldest = TranslationCacheEntry.objects.order_by('last_used_at').values_list('pk', flat=True)[:excess]
+        deleted, _ = TranslationCacheEntry.objects.filter(pk__in=list(oldest)).delete()
+        removed += deleted
+    return removed
+
+
+def _translate_uncached(text, target_language, source_language=None):
+    translator = _get_translator()
+    if source_language and source_language in LANGUAGES:
+        translation = translator.translate(text, dest=target_language, src=source_language)
+    else:
+        translation = translator.translate(text, dest=target_language)
+    return {
+        'translated_text': translation.text,
+        'detected_source_language': translation.src
+    }
+
+
+def validate_languages(target_language, source_language):
+    """Devuelve (error o None, idioma de origen válido o None)."""
     if target_language not in LANGUAGES:
-        return {'error': f"El idioma de destino '{target_language}' no es válido."}
+        return {'error': f"El idioma de destino '{target_language}' no es válido."}, None
+    return None, (source_language if source_language in LANGUAGES else None)
+
+
+def translate_text(text, target_language, source_language=None):
+    """
+    Traduce un texto usando la librería googletrans (versión síncrona),
+    consultando antes la caché de traducciones.
+    """
+    error, source_language = validate_languages(target_language, source_language)
+    if error:
+        return error
+
+    key = cache_key(text, target_language, source_language)
+    cached = _memory_cache.get(key)
+    if cached is not None:
+        _count('memory_hits')
+        return dict(cached)
+
+    entry = _read_db(key)
+    if entry is not None:
+        _count('db_hits')
+        result = {
+            'translated_text': entry['translated_text'],
+            'detected_source_language': entry['detected_source_language'],
+        }
+        _memory_cache.set(key, result)
+        return dict(result)
 
-    # --- INICIO DE LA CORRECCIÓN ---
-    # La librería es síncrona. Eliminamos async/await.
+    _count('misses')
     try:
-        translator = Translator()
-        
-        # Simplemente llamamos a la función, sin 'await'
-        if source_language and source_language in LANGUAGES:
-            translation = translator.translate(text, dest=target_language, src=source_language)
+        result = _translate_uncached(text, target_language, source_language)
+    except Exception as e:
+        _count('errors')
+        _local.translator = None  # el cliente puede haber quedado en mal estado
+        return {'error': f"Ocurrió un error durante la traducción: {str(e)}"}
+
+    _memory_cache.set(key, result)
+    _write_db(key, target_language, source_language, result)
+    return dict(result)
+
+
+def translation_cache_stats():
+    """Contadores de aciertos/fallos del proceso y tamaño de cada nivel."""
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats['memory_hits'] + stats['db_hits'] + stats['misses']
+    stats['hit_rate'] = round((stats['memory_hits'] + stats['db_hits']) / lookups, 3) if lookups else 0.0
+    stats['memory_entries'] = len(_memory_cache)
+    stats['db_entries'] = TranslationCacheEntry.objects.count()
+    return stats
+
+
+def clear_translation_cache(persistent=True):
+    """Vacía la caché en memoria (y la tabla si `persistent`) y reinicia los contadores."""
+    global _db_writes
+    _memory_cache.clear()
+    if persistent:
+        TranslationCacheEntry.objects.all().delete()
+    with _stats_lock:
+        for name in _stats:
+            _stats[name] = 0
+        _db_writes = 0
+
+
+# --- Traducción de textos largos por fragmentos ---
+
+_PARAGRAPH_SPLIT_RE = re.compile(r'(\n\s*\n|\f)')
+_SENTENCE_SPLIT_RE = re.compile(r'(?<=[.!?…])(?=\s)')
+# En promedio, uno de cada BOUNDARY_EVERY párrafos cierra un fragmento
+BOUNDARY_EVERY = 4
+PROGRESS_TIMEOUT = 3600
+
+
+def _hard_split(text, max_chars):
+    """Parte un texto sin puntuación en trozos de hasta max_chars, por espacios."""
+    pieces = []
+    while len(text) > max_chars:
+        cut = text.rfind(' ', 0, max_chars)
+        cut = cut if cut > 0 else max_chars
+        pieces.append(text[:cut])
+        text = text[cut:]
+    pieces.append(text)
+    return pieces
+
+
+def _split_long_paragraph(paragraph, max_chars):
+    """Agrupa las frases de un párrafo largo en trozos de hasta max_chars."""
+    pieces, current = [], ''
+    for sentence in _SENTENCE_SPLIT_RE.split(paragraph):
+        for part in (_hard_split(sentence, max_chars) if len(sentence) > max_chars else [sentence]):
+            if current and len(current) + len(part) > max_chars:
+                pieces.append(current)
+                current = ''
+            current += part
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def _is_boundary(unit):
+    """
+    Decide por el contenido del propio párrafo si cierra un fragmento. Así los
+    cortes no dependen de lo que hay antes: editar un párrafo solo cambia su
+    fragmento y, como mucho, el siguiente.
+    """
+    return hashlib.md5(unit.encode('utf-8')).digest()[0] % BOUNDARY_EVERY == 0
+
+
+def split_text(text, max_chars=None):
+    """
+    Divide el texto en fragmentos de hasta max_chars caracteres, cortando entre
+    párrafos (o entre frases si un párrafo no cabe). ''.join(fragmentos) == text.
+    """
+    max_chars = max_chars or _setting('TRANSLATION_CHUNK_CHARS', 4500)
+    parts = _PARAGRAPH_SPLIT_RE.split(text)
+    units = []
+    for i in range(0, len(parts), 2):
+        paragraph = parts[i]
+        separator = parts[i + 1] if i + 1 < len(parts) else ''
+        if len(paragraph) + len(separator) <= max_chars:
+            units.append(paragraph + separator)
         else:
-            translation = translator.translate(text, dest=target_language)
+            pieces = _split_long_paragraph(paragraph, max_chars)
+            pieces[-1] += separator
+            units.extend(pieces)
 
-        return {
-            'translated_text': translation.text,
-            'detected_source_language': translation.src
+    chunks, current = [], ''
+    for unit in units:
+        if not unit:
+            continue
+        if current and len(current) + len(unit) > max_chars:
+            chunks.append(current)
+            current = ''
+        current += unit
+        if _is_boundary(unit):
+            chunks.append(current)
+            current = ''
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _translate_chunk(chunk, target_language, source_language, retries):
+    """Traduce un fragmento conservando los espacios y saltos de sus extremos."""
+    body = chunk.strip()
+    if not body:
+        return {'translated_text': chunk, 'detected_source_language': None}
+    leading = chunk[:len(chunk) - len(chunk.lstrip())]
+    trailing = chunk[len(chunk.rstrip()):]
+    try:
+        for attempt in range(retries + 1):
+            if attempt:
+                time.sleep(_setting('TRANSLATION_RETRY_DELAY', 0.5) * 2 ** (attempt - 1))
+            result = translate_text(body, target_language, source_language)
+            if 'error' not in result:
+                result['translated_text'] = leading + result['translated_text'] + trailing
+                return result
+        return result
+    finally:
+        # Cada hilo del pool abre su propia conexión; se cierra al terminar.
+        connection.close()
+
+
+def translate_long_text(text, target_language, source_language=None, on_progress=None):
+    """
+    Traduce un texto largo por fragmentos, con hasta TRANSLATION_MAX_WORKERS
+    peticiones a la vez y TRANSLATION_CHUNK_RETRIES reintentos por fragmento.
+    `on_progress(hechos, total)` se llama cada vez que termina un fragmento.
+    Devuelve el mismo formato que translate_text.
+    """
+    if target_language not in LANGUAGES:
+        return {'error': f"El idioma de destino '{target_language}' no es válido."}
+
+    chunks = split_text(text)
+    total = len(chunks)
+    if on_progress:
+        on_progress(0, total)
+    if total <= 1:
+        result = translate_text(text, target_language, source_language)
+        if on_progress and 'error' not in result:
+            on_progress(total, total)
+        return result
+
+    retries = _setting('TRANSLATION_CHUNK_RETRIES', 2)
+    results = [None] * total
+    done = 0
+    with ThreadPoolExecutor(max_workers=_setting('TRANSLATION_MAX_WORKERS', 4)) as pool:
+        futures = {
+            pool.submit(_translate_chunk, chunk, target_language, source_language, retries): index
+            for index, chunk in enumerate(chunks)
         }
-    # --- FIN DE LA CORRECCIÓN ---
-    except Exception as e:
-        # El error que viste (can't be used in 'await' expression)
-        # se estaba generando aquí.
-        return {'error': f"Ocurrió un error during la traducción: {str(e)}"}
\ No newline at end of file
+        for future in as_completed(futures):
+            result = future.result()
+            if 'error' in result:
+                for pending in futures:
+                    pending.cancel()
+                return {'error': f"No se pudo traducir el fragmento {futures[future] + 1} de {total}: "
+                                 f"{result['error']}"}
+            results[futures[future]] = result
+            done += 1
+            if on_progress:
+                on_progress(done, total)
+
+    detected = Counter(r['detected_source_language'] for r in results if r['detected_source_language'])
+    return {
+        'translated_text': ''.join(r['translated_text'] for r in results),
+        'detected_source_language': detected.most_common(1)[0][0] if detected else (source_language or ''),
+        'chunks': total,
+    }
+
+
+def set_translation_progress(document_id, target_language, done, total, status='running'):
+    """Guarda el progreso en la BD (TranslationProgress), visible desde cualquier proceso."""
+    TranslationProgress.objects.update_or_create(
+        document_id=document_id, target_language=target_language,
+        defaults={'status': status, 'done': done, 'total': total})
+
+
+def get_translation_progress(document_id, target_language):
+    """Progreso de la última traducción del documento a ese idioma (de la última hora), o None."""
+    return TranslationProgress.objects.filter(
+        document_id=document_id, target_language=target_language,
+        updated_at__gte=timezone.now() - timedelta(seconds=PROGRESS_TIMEOUT),
+    ).values('status', 'done', 'total').first()
+
@@ -2,7 +2,7 @@
 
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import test_endpoint, ProfileDetailView, FolderViewSet, DocumentViewSet, TagViewSet, TranslationHistoryViewSet, ai_assistant, upgrade_to_premium
+from .views import test_endpoint, ProfileDetailView, FolderViewSet, DocumentViewSet, TagViewSet, TranslationHistoryViewSet, ai_assistant, ai_assistant_stream, upgrade_to_premium, translation_cache_stats_view
 
 # Creamos un router y registramos nuestros viewsets
 router = DefaultRouter()
@@ -15,7 +15,9 @@ urlpatterns = [
     path('test/', test_endpoint, name='test_endpoint'),
     path('profile/', ProfileDetailView.as_view(), name='profile-detail'),
     path('ai-assistant/', ai_assistant, name='ai-assistant'),
+    path('ai-assistant/stream/', ai_assistant_stream, name='ai-assistant-stream'),
     path('upgrade-premium/', upgrade_to_premium, name='upgrade-premium'),
+    path('translation-cache/stats/', translation_cache_stats_view, name='translation-cache-stats'),
     # Las URLs para la API de documentos y carpetas son generadas por el router
     path('', include(router.urls)),
 ]
@@ -1,37 +1,43 @@
 from .models import TranslationHistory
 from .serializers import TranslationHistorySerializer
-from .translation import translate_text
+from .translation import (translate_text, translate_long_text, translation_cache_stats,
+                          get_translation_progress, set_translation_progress)
 import os
-from django.http import JsonResponse, FileResponse, HttpResponse
+from django.http import JsonResponse, FileResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import generics, permissions, viewsets
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework.filters import SearchFilter
 from rest_framework.decorators import action
-from django.db.models import Q
+from django.db.models import Q, Exists, OuterRef, Subquery
 from dj_rest_auth.registration.views import RegisterView, VerifyEmailView 
 from allauth.account.models import EmailConfirmation
 from django.urls import reverse
 from .models import Profile, Folder, Document, Tag, DocumentPermission
 from .serializers import ProfileSerializer, FolderSerializer, DocumentSerializer, TagSerializer, DocumentPermissionSerializer
 from .permissions import IsOwnerOrHasPermission
+from .search import DocumentSearchFilter, add_search_snippets
 from django.contrib.auth.models import User
-from .text_extractor import extract_text
-from django.shortcuts import redirect
+from .tasks import EXTRACT_TEXT, GENERATE_PREVIEW, enqueue
+from . import quotas
+from .content import content_length, get_page_text, iter_content_chunks, page_count
+from django.shortcuts import redirect, get_object_or_404
 from io import BytesIO
-from docx import Document as DocxDocument
+from django.utils.http import content_disposition_header, parse_etags, quote_etag
+import tempfile
 from rest_framework.exceptions import PermissionDenied
+from rest_framework.pagination import LimitOffsetPagination
 
-# IMPORTACIONES PARA PDF
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-from reportlab.lib.units import inch
+# GENERACIÓN DE ARCHIVOS PARA DESCARGA
+from .renderers import (render_pdf, render_docx, render_pdf_stream, render_docx_stream,
+                        render_txt_stream, aiter_blocks, iter_file_blocks,
+                        PDF_CONTENT_TYPE, DOCX_CONTENT_TYPE, TXT_CONTENT_TYPE)
+from .render_cache import document_etag, get_or_render
 
 from .gemini_service import GeminiAssistant
-from rest_framework.decorators import api_view, permission_classes
-from django.utils import timezone
+from .assistant_stream import EventStreamRenderer, assistant_events
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
+from rest_framework.renderers import JSONRenderer
 from django.conf import settings
 
 
@@ -53,40 +59,44 @@ def upgrade_to_premium(request):
     """Simula el pago exitoso y actualiza el plan a Premium."""
     profile = request.user.profile
     profile.subscription_plan = 'premium'
-    profile.save()
+    # Solo el plan: no pisar los contadores de cupo que actualiza api/quotas.py
+    profile.save(update_fields=['subscription_plan'])
     return Response({
         'message': '¡Pago simulado exitoso! Ahora eres usuario Premium.',
         'plan': 'premium'
     }, status=200)
 
-@api_view(['POST'])
-@permission_classes([permissions.IsAuthenticated])
-def ai_assistant(request):
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def translation_cache_stats_view(request):
+    """Aciertos y fallos de la caché de traducciones (solo administradores)."""
+    return Response(translation_cache_stats())
+
+
+def _check_ai_request(request):
+    """Prompt de la petición y, si no se puede atender, la respuesta de error."""
     prompt = request.data.get('prompt')
     if not prompt:
-        return Response({'error': 'El prompt es requerido'}, status=400)
+        return None, Response({'error': 'El prompt es requerido'}, status=400)
 
     # --- LÓGICA DE LÍMITES DE IA ---
-    profile = request.user.profile
-    today = timezone.now().date()
-    
-    # Resetear contador si es un nuevo día
-    if profile.last_ai_request_date != today:
-        profile.daily_ai_requests_count = 0
-        profile.last_ai_request_date = today
-    
-    # Definir límites
-    limit = 30 if profile.subscription_plan == 'premium' else 5
-    
-    if profile.daily_ai_requests_count >= limit:
-        return Response({
-            'error': f'Has alcanzado tu límite diario de {limit} peticiones de IA. Mejora a Premium para más.'
+    # Comprobar y descontar en un solo UPDATE condicional (ver api/quotas.py)
+    quota = quotas.consume(request.user.id, quotas.AI_REQUESTS)
+    if not quota.allowed:
+        return None, Response({
+            'error': f'Has alcanzado tu límite diario de {quota.limit} peticiones de IA. Mejora a Premium para más.'
         }, status=403)
-    
-    # Incrementar contador
-    profile.daily_ai_requests_count += 1
-    profile.save()
     # --------------------------------
+    return prompt, None
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def ai_assistant(request):
+    """Respuesta completa del asistente en un JSON (sin streaming, ver ai_assistant_stream)."""
+    prompt, error = _check_ai_request(request)
+    if error:
+        return error
 
     try:
         assistant = GeminiAssistant(request.user)
@@ -95,6 +105,24 @@ def ai_assistant(request):
     except Exception as e:
         return Response({'error': str(e)}, status=500)
 
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+@renderer_classes([JSONRenderer, EventStreamRenderer])
+def ai_assistant_stream(request):
+    """
+    Como ai_assistant, pero en Server-Sent Events: progreso, el texto del
+    modelo según se genera y al final el resultado (ver api/assistant_stream.py).
+    """
+    prompt, error = _check_ai_request(request)
+    if error:
+        return error
+
+    response = StreamingHttpResponse(assistant_events(request.user, prompt), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # que un proxy (nginx) no acumule los eventos
+    return response
+
 class CustomVerifyEmailView(VerifyEmailView):
     """
     Vista personalizada para manejar la verificación de correo electrónico.
@@ -183,13 +211,41 @@ class DocumentViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         user = self.request.user
+        # Los permisos del usuario sobre cada documento se calculan en la misma
+        # consulta (anotaciones) para que el listado no haga 2 consultas por fila.
+        user_permissions = DocumentPermission.objects.filter(
+            document=OuterRef('pk'), user=user)
         return Document.objects.filter(
-            Q(owner=user) | Q(permissions__user=user)
-        ).distinct()
+            Q(owner=user) |
+            Q(pk__in=DocumentPermission.objects.filter(user=user).values('document'))
+        ).select_related('owner').prefetch_related('tags').annotate(
+            user_permission_level=Subquery(
+                user_permissions.values('permission_level')[:1]),
+            has_permissions=Exists(
+                DocumentPermission.objects.filter(document=OuterRef('pk'))),
+        )
 
-    filter_backends = [DjangoFilterBackend, SearchFilter]
-    search_fields = ['file', 'tags__name', 'extracted_content']
+    # La búsqueda (?search=) usa el índice de texto completo (api/search.py)
+    filter_backends = [DjangoFilterBackend, DocumentSearchFilter]
     filterset_fields = ['tags', 'folder']
+    # Paginación opcional: solo con ?limit= (y ?offset=); sin ellos, la lista completa
+    pagination_class = LimitOffsetPagination
+
+    def list(self, request, *args, **kwargs):
+        """
+        Como el list() de DRF, pero con ?search= los fragmentos resaltados se
+        calculan solo para los documentos de la página que se devuelve.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        documents = page if page is not None else list(queryset)
+        raw_query = request.query_params.get(DocumentSearchFilter.search_param, '').strip()
+        if raw_query:
+            add_search_snippets(documents, raw_query)
+        serializer = self.get_serializer(documents, many=True)
+        if page is not None:
+            return self.get_paginated_response(serializer.data)
+        return Response(serializer.data)
 
     def perform_create(self, serializer):
         user = self.request.user
@@ -198,111 +254,142 @@ class DocumentViewSet(viewsets.ModelViewSet):
             if doc_count >= 5:
                 raise PermissionDenied("Has alcanzado el límite de 5 documentos gratuitos. Pásate a Premium.")
 
-        document = serializer.save(owner=user)
+        # La extracción de texto se hace en segundo plano (api/tasks.py) para
+        # que la subida responda de inmediato.
+        document = serializer.save(owner=user, processing_status=Document.STATUS_PENDING)
+        enqueue(document, EXTRACT_TEXT)
+        enqueue(document, GENERATE_PREVIEW)
+
+    def _get_object_without_content(self, pk):
+        """
+        Como get_object(), pero sin cargar extracted_content (que puede ocupar
+        varios MB) ni el índice de búsqueda.
+        """
+        queryset = self.get_queryset().defer('extracted_content', 'search_vector')
+        document = get_object_or_404(queryset, pk=pk)
+        self.check_object_permissions(self.request, document)
+        return document
+
+    @action(detail=True, methods=['get'])
+    def page(self, request, pk=None):
+        """
+        Devuelve el texto de una página (?number=1..n) leyendo de la base de
+        datos solo ese tramo de extracted_content.
+        """
+        document = self._get_object_without_content(pk)
+
         try:
-            content = extract_text(document)
-            if content:
-                document.extracted_content = content
-                document.save()
-        except Exception as e:
-            print(f"No se pudo extraer el contenido del documento {document.id}: {e}")
+            number = int(request.query_params.get('number', 1))
+            text = get_page_text(document, number - 1)
+        except (TypeError, ValueError):
+            return Response({'error': 'El parámetro "number" debe ser un entero.'}, status=400)
+        except IndexError as e:
+            return Response({'error': str(e)}, status=404)
+
+        return Response({
+            'number': number,
+            'page_count': page_count(document),
+            'text': text,
+        })
 
     @action(detail=True, methods=['get'])
     def download(self, request, pk=None):
         """
         Acción personalizada que genera un documento en el formato original
         (PDF o DOCX) usando el contenido actual (extracted_content).
-        """
-        document = self.get_object()
+        Los archivos generados se guardan en la caché de renderizado y se
+        responde 304 si el cliente ya tiene la versión actual (ETag).
 
-        # 1. Obtener el contenido de texto actual
-        content = document.extracted_content
-        if not content:
-            content = "Este documento no tiene contenido de texto extraído."
+        Con ?stream=1, o si el contenido supera STREAMING_DOWNLOAD_MIN_CHARS,
+        el contenido se lee por tramos y se genera con memoria acotada.
+        """
+        document = self._get_object_without_content(pk)
 
-        # 2. Detectar la extensión del archivo ORIGINAL
+        # 1. Detectar la extensión del archivo ORIGINAL
         original_filename = document.file.name
         _, original_extension = os.path.splitext(original_filename)
         original_extension = original_extension.lower()
         
         base_filename = os.path.basename(os.path.splitext(original_filename)[0])
 
+        # 2. Si el cliente ya tiene esta versión, no hace falta ni leer el contenido
+        if original_extension == '.pdf':
+            extension = '.pdf'
+        elif original_extension in ['.docx', '.doc']:
+            extension = '.docx'
+        else:
+            extension = '.txt'
+        etag = quote_etag(document_etag(document, extension))
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match and (if_none_match.strip() == '*' or etag in parse_etags(if_none_match)):
+            response = HttpResponseNotModified()
+            response['ETag'] = etag
+            return response
+
+        # 3. Documentos muy grandes: generación en streaming, sin cargar el contenido
+        total_chars = content_length(document.pk)
+        stream = request.query_params.get('stream', '').lower() in ('1', 'true')
+        min_chars = getattr(settings, 'STREAMING_DOWNLOAD_MIN_CHARS', 1024 * 1024)
+        if total_chars and (stream or total_chars >= min_chars):
+            try:
+                response = self._generate_streaming_response(document.pk, base_filename, extension)
+            except Exception as e:
+                print(f"Error al generar el archivo en streaming: {e}")
+                response = self._generate_streaming_response(document.pk, base_filename, '.txt')
+            response['ETag'] = etag
+            response['Cache-Control'] = 'private, no-cache'
+            return response
+
+        # 4. Obtener el contenido de texto actual
+        content = Document.objects.filter(pk=document.pk).values_list(
+            'extracted_content', flat=True).get()
+        if not content:
+            content = "Este documento no tiene contenido de texto extraído."
+
         try:
-            # 3. GENERAR PDF si el original era PDF
-            if original_extension == '.pdf':
-                return self._generate_pdf_response(content, base_filename)
+            # 5. GENERAR PDF si el original era PDF
+            if extension == '.pdf':
+                response = self._generate_pdf_response(content, base_filename)
             
-            # 4. GENERAR DOCX si el original era DOCX/DOC
-            elif original_extension in ['.docx', '.doc']:
-                return self._generate_docx_response(content, base_filename)
+            # 6. GENERAR DOCX si el original era DOCX/DOC
+            elif extension == '.docx':
+                response = self._generate_docx_response(content, base_filename)
             
-            # 5. GENERAR TXT para otros formatos
+            # 7. GENERAR TXT para otros formatos
             else:
-                return self._generate_txt_response(content, base_filename)
+                response = self._generate_txt_response(content, base_filename)
 
         except Exception as e:
             print(f"Error al generar el archivo: {e}")
             # Fallback: devolver como TXT
             return self._generate_txt_response(content, base_filename)
 
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+    def _file_download_response(self, file, size, filename, content_type):
+        """Descarga de un archivo abierto, leída por bloques también bajo ASGI (ver aiter_blocks)."""
+        response = StreamingHttpResponse(aiter_blocks(iter_file_blocks(file)), content_type=content_type)
+        response['Content-Length'] = str(size)
+        response['Content-Disposition'] = content_disposition_header(True, filename)
+        return response
+
+    def _cached_file_response(self, content, base_filename, extension, renderer, content_type):
+        """Sirve el archivo generado desde la caché de renderizado (streaming)."""
+        path = get_or_render(content, base_filename, extension, renderer)
+        return self._file_download_response(
+            open(path, 'rb'), os.path.getsize(path), f"{base_filename}_contenido{extension}", content_type)
+
     def _generate_pdf_response(self, content, base_filename):
         """Genera un PDF con el contenido."""
-        buffer = BytesIO()
-        pdf = SimpleDocTemplate(buffer, pagesize=letter)
-        
-        # Estilos
-        styles = getSampleStyleSheet()
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=16,
-            spaceAfter=12,
-        )
-        body_style = ParagraphStyle(
-            'CustomBody',
-            parent=styles['BodyText'],
-            fontSize=11,
-            leading=14,
-        )
-        
-        # Contenido del PDF
-        story = []
-        title = Paragraph(f"Documento: {base_filename}", title_style)
-        story.append(title)
-        story.append(Spacer(1, 0.2 * inch))
-        
-        # Dividir en párrafos
-        for line in content.split('\n'):
-            if line.strip():
-                # Escapar caracteres especiales de XML
-                safe_line = line.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
-                p = Paragraph(safe_line, body_style)
-                story.append(p)
-                story.append(Spacer(1, 0.1 * inch))
-        
-        pdf.build(story)
-        buffer.seek(0)
-        
-        response = HttpResponse(buffer, content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="{base_filename}_contenido.pdf"'
-        return response
+        return self._cached_file_response(
+            content, base_filename, '.pdf', render_pdf, PDF_CONTENT_TYPE)
 
     def _generate_docx_response(self, content, base_filename):
         """Genera un DOCX con el contenido."""
-        new_doc = DocxDocument()
-        new_doc.add_paragraph(content)
-        
-        buffer = BytesIO()
-        new_doc.save(buffer)
-        buffer.seek(0)
-
-        response = FileResponse(
-            buffer,
-            as_attachment=True,
-            filename=f"{base_filename}_contenido.docx"
-        )
-        response['Content-Type'] = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
-        return response
+        return self._cached_file_response(
+            content, base_filename, '.docx', render_docx, DOCX_CONTENT_TYPE)
 
     def _generate_txt_response(self, content, base_filename):
         """Genera un TXT con el contenido."""
@@ -312,9 +399,37 @@ class DocumentViewSet(viewsets.ModelViewSet):
             as_attachment=True,
             filename=f"{base_filename}_contenido.txt"
         )
-        response['Content-Type'] = 'text/plain; charset=utf-8'
+        response['Content-Type'] = TXT_CONTENT_TYPE
         return response
 
+    def _generate_streaming_response(self, document_id, base_filename, extension):
+        """
+        Genera la descarga a partir del contenido leído por tramos. El TXT se
+        envía según se lee; PDF y DOCX se escriben en un temporal que solo
+        ocupa memoria hasta DOWNLOAD_SPOOL_MAX_BYTES y después pasa a disco.
+        """
+        chunks = iter_content_chunks(document_id)
+        filename = f"{base_filename}_contenido{extension}"
+        if extension == '.txt':
+            response = StreamingHttpResponse(aiter_blocks(render_txt_stream(chunks)), content_type=TXT_CONTENT_TYPE)
+            response['Content-Disposition'] = content_disposition_header(True, filename)
+            return response
+
+        if extension == '.pdf':
+            renderer, content_type = render_pdf_stream, PDF_CONTENT_TYPE
+        else:
+            renderer, content_type = render_docx_stream, DOCX_CONTENT_TYPE
+        spool = tempfile.SpooledTemporaryFile(
+            max_size=getattr(settings, 'DOWNLOAD_SPOOL_MAX_BYTES', 1024 * 1024))
+        try:
+            renderer(chunks, base_filename, spool)
+        except Exception:
+            spool.close()
+            raise
+        size = spool.tell()
+        spool.seek(0)
+        return self._file_download_response(spool, size, filename, content_type)
+
     @action(detail=True, methods=['post'], url_path='share')
     def share(self, request, pk=None):
         """
@@ -381,6 +496,8 @@ class DocumentViewSet(viewsets.ModelViewSet):
     def translate_document(self, request, pk=None):
         """
         UC-17 & UC-18: Traduce el contenido extraído de un documento.
+        El texto se traduce por fragmentos en paralelo; el progreso se puede
+        consultar mientras tanto en translation-progress.
         """
         document = self.get_object()
         target_language = request.data.get('target_language')
@@ -392,11 +509,19 @@ class DocumentViewSet(viewsets.ModelViewSet):
         if not document.extracted_content:
             return Response({'error': 'El documento no tiene contenido extraído para traducir.'}, status=400)
 
-        result = translate_text(
-            document.extracted_content, target_language, source_language)
+        def on_progress(done, total):
+            set_translation_progress(document.pk, target_language, done, total)
+
+        result = translate_long_text(
+            document.extracted_content, target_language, source_language, on_progress=on_progress)
 
+        progress = get_translation_progress(document.pk, target_language) or {'done': 0, 'total': 0}
         if 'error' in result:
+            set_translation_progress(document.pk, target_language,
+                                     progress['done'], progress['total'], status='failed')
             return Response(result, status=400)
+        set_translation_progress(document.pk, target_language,
+                                 progress['total'], progress['total'], status='done')
 
         TranslationHistory.objects.create(
             original_document=document,
@@ -408,6 +533,18 @@ class DocumentViewSet(viewsets.ModelViewSet):
 
         return Response(result, status=200)
 
+    @action(detail=True, methods=['get'], url_path='translation-progress')
+    def translation_progress(self, request, pk=None):
+        """Progreso (fragmentos traducidos / total) de translate-document."""
+        document = self._get_object_without_content(pk)
+        target_language = request.query_params.get('target_language')
+        if not target_language:
+            return Response({'error': 'El parámetro "target_language" es requerido.'}, status=400)
+        progress = get_translation_progress(document.pk, target_language)
+        if progress is None:
+            return Response({'detail': 'No hay ninguna traducción en curso para este idioma.'}, status=404)
+        return Response(progress)
+
 
 class TranslationHistoryViewSet(viewsets.ReadOnlyModelViewSet):
     """
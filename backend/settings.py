@@ -104,6 +104,11 @@ DATABASES = {
         'PASSWORD': os.environ.get('DB_PASSWORD', '123456789'),
         'HOST': os.environ.get('DB_HOST', 'localhost'),
         'PORT': os.environ.get('DB_PORT', '5432'),
+        # Conexiones persistentes: los hilos de larga duración (p. ej. los de la
+        # caché de traducciones del chat) reutilizan la suya en vez de abrir una
+        # por consulta. Se comprueba que siga viva antes de reutilizarla.
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
@@ -196,11 +201,165 @@ if not CORS_ALLOW_ALL_ORIGINS:
 # Opcional: Permite que el frontend envíe cookies (necesario para sesiones)
 CORS_ALLOW_CREDENTIALS = True
 
-CHANNEL_LAYERS = {
-    'default': {
-        'BACKEND': 'channels.layers.InMemoryChannelLayer',
-    },
-}
+# Capa de canales del chat. La capa en memoria solo funciona dentro de un
+# proceso; con REDIS_URL varios procesos Daphne (o nodos) comparten los grupos.
+#   CHANNEL_LAYER_BACKEND=redis   -> channels_redis.core (por defecto con REDIS_URL)
+#   CHANNEL_LAYER_BACKEND=pubsub  -> channels_redis.pubsub (también con run_local_redis)
+#   CHANNEL_LAYER_BACKEND=memory  -> InMemoryChannelLayer
+# bench_channel_layer mide esta capa (RedisChannelLayer si es la de memoria).
+REDIS_URL = os.environ.get('REDIS_URL')
+CHANNEL_LAYER_BACKEND = os.environ.get('CHANNEL_LAYER_BACKEND', 'redis' if REDIS_URL else 'memory')
+if CHANNEL_LAYER_BACKEND == 'redis':
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {
+                'hosts': [REDIS_URL or 'redis://127.0.0.1:6379/0'],
+                'capacity': int(os.environ.get('CHANNEL_LAYER_CAPACITY', '1500')),
+                'expiry': int(os.environ.get('CHANNEL_LAYER_EXPIRY', '10')),
+            },
+        },
+    }
+elif CHANNEL_LAYER_BACKEND == 'pubsub':
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.pubsub.RedisPubSubChannelLayer',
+            'CONFIG': {
+                'hosts': [REDIS_URL or 'redis://127.0.0.1:6379/0'],
+            },
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer',
+        },
+    }
+
+# Caché de Django compartida por todos los procesos (por defecto el Redis de
+# REDIS_URL). Sin ella cada proceso tiene su propia LocMemCache, y lo que se
+# invalida o escribe en un proceso no lo ven los demás.
+CACHE_URL = os.environ.get('CACHE_URL', REDIS_URL or '')
+if CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+        },
+    }
 
 # URL del frontend para redirecciones
-FRONTEND_URL = os.environ.get('FRONTEND_URL', 'http://localhost:5173')
\ No newline at end of file
+FRONTEND_URL = os.environ.get('FRONTEND_URL', 'http://localhost:5173')
+# Configuración de texto completo de PostgreSQL para la búsqueda de documentos.
+# 'simple' no aplica stemming, lo que funciona igual para contenido en varios idiomas.
+SEARCH_CONFIG = os.environ.get('SEARCH_CONFIG', 'simple')
+
+# Cola de trabajos de documentos (api/tasks.py). Con DOCUMENT_TASKS_EAGER=True los
+# trabajos se ejecutan durante la petición, sin necesidad de run_document_worker.
+DOCUMENT_TASKS_EAGER = os.environ.get('DOCUMENT_TASKS_EAGER', 'False').lower() in ('true', '1', 't')
+DOCUMENT_TASKS_MAX_ATTEMPTS = int(os.environ.get('DOCUMENT_TASKS_MAX_ATTEMPTS', '3'))
+# Segundos en ejecución tras los que un trabajo se considera de un worker caído
+# y vuelve a la cola (run_document_worker lo revisa periódicamente)
+DOCUMENT_TASKS_STALE_SECONDS = int(os.environ.get('DOCUMENT_TASKS_STALE_SECONDS', '600'))
+# Cada cuántos segundos renueva su marca un trabajo en ejecución (menor que el anterior)
+DOCUMENT_TASKS_HEARTBEAT_SECONDS = int(os.environ.get('DOCUMENT_TASKS_HEARTBEAT_SECONDS', '60'))
+
+# Extracción de PDFs grandes en paralelo (api/text_extractor.py)
+PDF_PARALLEL_MIN_PAGES = int(os.environ.get('PDF_PARALLEL_MIN_PAGES', '40'))
+PDF_EXTRACTION_WORKERS = int(os.environ.get('PDF_EXTRACTION_WORKERS', '0')) or None
+
+# Vistas previas de documentos (api/previews.py): anchos en píxeles y formato
+PREVIEW_SIZES = tuple(int(w) for w in os.environ.get('PREVIEW_SIZES', '640,320,160').split(','))
+PREVIEW_FORMAT = os.environ.get('PREVIEW_FORMAT', 'WEBP')
+
+# Caché en disco de los archivos generados al descargar (api/render_cache.py)
+RENDER_CACHE_DIR = os.environ.get('RENDER_CACHE_DIR', str(BASE_DIR / 'render_cache'))
+RENDER_CACHE_MAX_BYTES = int(os.environ.get('RENDER_CACHE_MAX_MB', '512')) * 1024 * 1024
+
+# Descargas en streaming: a partir de este tamaño (caracteres) no se carga el
+# contenido completo, y los PDF/DOCX se generan en un temporal que pasa a disco
+# al superar DOWNLOAD_SPOOL_MAX_BYTES
+STREAMING_DOWNLOAD_MIN_CHARS = int(os.environ.get('STREAMING_DOWNLOAD_MIN_CHARS', str(1024 * 1024)))
+DOWNLOAD_SPOOL_MAX_BYTES = 1024 * 1024
+
+# Caché de traducciones (api/translation.py): LRU en memoria + tabla en la BD
+TRANSLATION_CACHE_TTL = int(os.environ.get('TRANSLATION_CACHE_TTL', str(30 * 24 * 3600)))
+TRANSLATION_CACHE_MEMORY_ENTRIES = int(os.environ.get('TRANSLATION_CACHE_MEMORY_ENTRIES', '2048'))
+TRANSLATION_CACHE_DB_ENTRIES = int(os.environ.get('TRANSLATION_CACHE_DB_ENTRIES', '100000'))
+
+# Traducción de documentos por fragmentos (translate_long_text)
+TRANSLATION_CHUNK_CHARS = int(os.environ.get('TRANSLATION_CHUNK_CHARS', '4500'))
+TRANSLATION_MAX_WORKERS = int(os.environ.get('TRANSLATION_MAX_WORKERS', '4'))
+TRANSLATION_CHUNK_RETRIES = 2
+
+# Traducción asíncrona del chat (api/async_translation.py). Con
+# TRANSLATION_PROVIDER_BACKEND=api.async_translation.FakeTranslationProvider
+# se traduce en local, sin red.
+TRANSLATION_PROVIDER = {
+    'BACKEND': os.environ.get('TRANSLATION_PROVIDER_BACKEND', 'api.async_translation.GoogleTranslateProvider'),
+    'OPTIONS': {},
+}
+TRANSLATION_MAX_CONCURRENCY = int(os.environ.get('TRANSLATION_MAX_CONCURRENCY', '8'))
+TRANSLATION_TIMEOUT = float(os.environ.get('TRANSLATION_TIMEOUT', '10'))
+# Hilos (cada uno con su conexión persistente) que leen y escriben la caché en BD
+TRANSLATION_CACHE_DB_THREADS = int(os.environ.get('TRANSLATION_CACHE_DB_THREADS', '4'))
+
+
+# Asistente de IA: máximo de entradas de cada tipo en el contexto del prompt y
+# segundos que se guarda la instantánea de cada usuario (api/assistant_context.py)
+ASSISTANT_CONTEXT_MAX_DOCUMENTS = int(os.environ.get('ASSISTANT_CONTEXT_MAX_DOCUMENTS', '40'))
+ASSISTANT_CONTEXT_MAX_FOLDERS = 30
+ASSISTANT_CONTEXT_MAX_TAGS = 50
+ASSISTANT_CONTEXT_CACHE_TTL = 600
+
+# Asistente de IA: documentos por prompt y lotes en paralelo del etiquetado automático
+ASSISTANT_TAG_BATCH_SIZE = 25
+ASSISTANT_TAG_WORKERS = int(os.environ.get('ASSISTANT_TAG_WORKERS', '4'))
+
+# Asistente de IA: bytes máximos de la caché persistente de respuestas del
+# modelo (resúmenes, mapas conceptuales, carpetas sugeridas; api/assistant_cache.py)
+ASSISTANT_CACHE_MAX_BYTES = int(os.environ.get('ASSISTANT_CACHE_MAX_BYTES', str(50 * 1024 * 1024)))
+
+# Modelo del asistente de IA (api/llm.py). Con
+# LLM_PROVIDER_BACKEND=api.llm.FakeLLMProvider responde en local, sin red ni
+# clave; LLM_FAKE_LATENCY y LLM_FAKE_JITTER simulan el tiempo de respuesta.
+if os.environ.get('LLM_PROVIDER_BACKEND') == 'api.llm.FakeLLMProvider':
+    LLM_PROVIDER = {
+        'BACKEND': 'api.llm.FakeLLMProvider',
+        'OPTIONS': {
+            'latency': float(os.environ.get('LLM_FAKE_LATENCY', '0')),
+            'jitter': float(os.environ.get('LLM_FAKE_JITTER', '0')),
+        },
+    }
+else:
+    LLM_PROVIDER = {
+        'BACKEND': os.environ.get('LLM_PROVIDER_BACKEND', 'api.llm.GeminiProvider'),
+        'OPTIONS': {'model': os.environ.get('GEMINI_MODEL', 'gemini-2.5-flash')},
+    }
+
+# Chat: mensajes que cada conexión reserva de una vez en planes sin límite (api/quotas.py)
+CHAT_QUOTA_LEASE_SIZE = 5
+
+# Chat: Redis donde TokenAuthMiddleware guarda el usuario de cada token, y
+# durante cuántos segundos. Sin Redis compartido no se cachea: el logout en un
+# proceso no invalidaría la caché de los demás
+CHAT_TOKEN_CACHE_URL = CACHE_URL
+CHAT_TOKEN_CACHE_TTL = int(os.environ.get('CHAT_TOKEN_CACHE_TTL', 300))
+
+# Chat de voz: segundos durante los que se agrupan los fragmentos de cada
+# hablante antes de traducirlos y enviarlos, y tamaño que fuerza el envío
+VOICE_COALESCE_WINDOW = float(os.environ.get('VOICE_COALESCE_WINDOW', 0.3))
+VOICE_COALESCE_MAX_CHARS = 500
+
+# Chat: frames pendientes por conexión a partir de los cuales se agrupan los de
+# presencia y voz, y máximo antes de descartarlos o cerrar la conexión (chat/outbound.py)
+CHAT_OUTBOUND_HIGH_WATER = int(os.environ.get('CHAT_OUTBOUND_HIGH_WATER', '100'))
+CHAT_OUTBOUND_MAX_FRAMES = int(os.environ.get('CHAT_OUTBOUND_MAX_FRAMES', '400'))
+# Bytes enviados a cada conexión sin confirmar por el cliente (acks) a partir
+# de los cuales se deja de enviar, y segundos sin acks tras los que se cierra
+CHAT_OUTBOUND_WINDOW_BYTES = int(os.environ.get('CHAT_OUTBOUND_WINDOW_BYTES', str(256 * 1024)))
+CHAT_ACK_TIMEOUT = float(os.environ.get('CHAT_ACK_TIMEOUT', '30'))
+# Clientes sin acks: ritmo máximo (bytes/s) y ráfaga con que se les entregan
+# frames; Daphne no espera al cliente, así que el exceso se queda en la cola (0 = sin límite)
+CHAT_OUTBOUND_BYTES_PER_SECOND = int(os.environ.get('CHAT_OUTBOUND_BYTES_PER_SECOND', str(64 * 1024)))
+CHAT_OUTBOUND_BURST_BYTES = int(os.environ.get('CHAT_OUTBOUND_BURST_BYTES', str(64 * 1024)))
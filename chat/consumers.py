@@ -1,10 +1,41 @@
-import json
+import asyncio
+import logging
+
 from channels.generic.websocket import AsyncWebsocketConsumer
 from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.utils import timezone
 
+from api import quotas
 from api.models import Profile 
-from api.translation import translate_text
+from api.async_translation import translate_text_async
+from . import wire
+from .outbound import PRESENCE, TEXT, VOICE, AckWindow, OutboundQueue, SendBudget
+from .registry import room_languages, room_presence
+
+# Trazas por receptor de chat_message: solo en debug, están en el camino de difusión
+logger = logging.getLogger(__name__)
+
+def user_group_name(user_id):
+    """Grupo con todas las conexiones de un usuario (invalidación del perfil)."""
+    return f'user_{user_id}'
+
+
+async def translate_for_languages(message, source_lang, languages, translate):
+    """
+    Traduce `message` una sola vez por idioma de destino, todas en paralelo.
+    Devuelve {idioma: texto traducido}.
+    """
+    targets = sorted(lang for lang in languages if lang and lang != source_lang)
+    results = await asyncio.gather(*(translate(message, lang, source_lang) for lang in targets))
+    translations = {}
+    for lang, result in zip(targets, results):
+        if 'error' not in result:
+            translations[lang] = result['translated_text']
+        else:
+            print(f"❌ Error de traducción a {lang}: {result['error']}")
+            translations[lang] = f"Error al traducir: {message}"
+    return translations
 
 
 class ChatConsumer(AsyncWebsocketConsumer):
@@ -28,12 +59,51 @@ class ChatConsumer(AsyncWebsocketConsumer):
             self.channel_name
         )
         
-        # 2. Aceptar la conexiÃ³n WebSocket
-        await self.accept()
+        # 2. Cargar el perfil una sola vez: el idioma queda en memoria y los
+        # cambios llegan por el grupo del usuario (profile_updated). El cupo de
+        # mensajes se reserva por bloques en la BD (ver check_message_limit)
+        await self.load_profile_state()
+        self.quota_lease = 0
+        self.quota_lease_date = timezone.now().date()
+        # Fragmentos de voz pendientes de enviar (ver queue_voice_fragment)
+        self.voice_fragments = []
+        self.voice_task = None
+        self.voice_flush_now = asyncio.Event()
+        await self.channel_layer.group_add(user_group_name(self.user.id), self.channel_name)
+        room_languages.join(self.room_group_name, self.channel_name, self.language)
+
+        # 3. Aceptar la conexiÃ³n WebSocket. Lo que se envía al cliente pasa
+        # por una cola acotada y una tarea de escritura (ver chat/outbound.py)
+        self.outbound = OutboundQueue(
+            getattr(settings, 'CHAT_OUTBOUND_HIGH_WATER', 100),
+            getattr(settings, 'CHAT_OUTBOUND_MAX_FRAMES', 400))
+        self.ack_window = AckWindow(
+            getattr(settings, 'CHAT_OUTBOUND_WINDOW_BYTES', 256 * 1024),
+            getattr(settings, 'CHAT_ACK_TIMEOUT', 30))
+        self.send_budget = SendBudget(
+            getattr(settings, 'CHAT_OUTBOUND_BYTES_PER_SECOND', 64 * 1024),
+            getattr(settings, 'CHAT_OUTBOUND_BURST_BYTES', 64 * 1024))
+        self.outbound_closed = False
+        # JSON por defecto; msgpack si el cliente ofrece el subprotocolo (chat/wire.py)
+        self.wire_format, subprotocol = wire.negotiate(self.scope.get('subprotocols'))
+        await self.accept(subprotocol)
+        self.writer_task = asyncio.create_task(self.write_outbound())
         print(f"Usuario {self.user.username} conectado a la sala: {self.room_name}")
 
 
     async def disconnect(self, close_code):
+        room_languages.leave(self.room_group_name, self.channel_name)
+        if not self.user.is_authenticated:
+            return
+        self.writer_task.cancel()
+        # Enviar lo que quede de voz antes de salir de la sala
+        await self.drain_voice()
+        if self.quota_lease:
+            await self.release_message_quota()
+        await self.channel_layer.group_discard(user_group_name(self.user.id), self.channel_name)
+        # Cerrar el socket sin enviar 'leave' también es salir de la sala de voz
+        if room_presence.contains(self.room_group_name, self.channel_name):
+            await self.handle_presence('leave', False, timezone.now().isoformat())
         # Salir del grupo de la sala
         await self.channel_layer.group_discard(
             self.room_group_name,
@@ -43,8 +113,12 @@ class ChatConsumer(AsyncWebsocketConsumer):
 
 
     # 3. Esta función se llama cuando recibimos un mensaje del cliente (Frontend)
-    async def receive(self, text_data):
-        data = json.loads(text_data)
+    async def receive(self, text_data=None, bytes_data=None):
+        data = wire.decode(text_data, bytes_data)
+        # Confirmación de lo recibido (ver write_outbound)
+        if data.get('type') == 'ack':
+            self.ack_window.ack(data.get('seq'))
+            return
         message = data['message']
         message_type = data.get('type', 'text')  # 'text', 'voice', 'join', 'presence_request', 'presence_response', 'mute_status'
         timestamp = data.get('timestamp', '')
@@ -52,58 +126,44 @@ class ChatConsumer(AsyncWebsocketConsumer):
 
         # Si es un mensaje de join, presence_request, presence_response, mute_status o leave, no verificar límites
         if message_type in ['join', 'presence_request', 'presence_response', 'mute_status', 'leave']:
-            # Enviar notificación a todos sin traducir
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    'type': 'chat_message',
-                    'message': message,
-                    'username': self.user.username,
-                    'source_lang': 'en',
-                    'message_type': message_type,
-                    'timestamp': timestamp,
-                    'is_muted': is_muted
-                }
-            )
+            await self.handle_presence(message_type, is_muted, timestamp)
             if message_type == 'leave':
                 print(f"👋 {self.user.username} está abandonando la sala: {self.room_group_name}")
             return
 
         # IMPORTANTE: Los mensajes de voz NO verifican límites (son fragmentos pequeños y frecuentes)
-        # PERO SÍ deben traducirse como los mensajes normales
+        # Se agrupan por hablante durante VOICE_COALESCE_WINDOW segundos y cada
+        # grupo se traduce y difunde una sola vez
         if message_type == 'voice':
-            print(f"📨 Mensaje de voz recibido de {self.user.username}: '{message}' (idioma: {await self.get_user_language(self.user)})")
-            source_language = await self.get_user_language(self.user)
-            # Enviar al grupo para que se traduzca (igual que mensajes de texto)
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    'type': 'chat_message',  # Esto llamará a chat_message() que traduce
-                    'message': message,
-                    'username': self.user.username,
-                    'source_lang': source_language,
-                    'message_type': message_type,
-                    'timestamp': timestamp
-                }
-            )
+            self.queue_voice_fragment(message, timestamp)
             return
 
         # Solo verificar límites para mensajes de texto normales
-        can_send = await self.check_message_limit(self.user)
+        can_send = await self.check_message_limit()
         if not can_send:
-            await self.send(text_data=json.dumps({
+            await self.send_frame({
                 'message': "Límite diario alcanzado (10 msgs). Actualiza tu Plan a Premium para continuar.",
                 'username': "Sistema",
                 'type': 'system'
-            }))
+            })
             return
         
         # Obtenemos el idioma de origen del usuario que envía
-        source_language = await self.get_user_language(self.user)
+        source_language = self.language
         
         print(f"📨 Mensaje de texto recibido de {self.user.username}: '{message}' (idioma: {source_language})")
 
+        # Traducir una vez por idioma presente en la sala, no una vez por receptor
+        translations = await self.translate_for_room(message, source_language)
+
         # Enviar el mensaje al grupo (esto llamará a la función 'chat_message')
+        await self.broadcast_message(message, source_language, message_type, timestamp, translations)
+
+    async def broadcast_message(self, message, source_language, message_type, timestamp, translations):
+        """
+        Difunde un mensaje ya traducido. La parte del frame común a todos los
+        receptores se codifica aquí una sola vez (ver chat/wire.py).
+        """
         await self.channel_layer.group_send(
             self.room_group_name,
             {
@@ -112,33 +172,88 @@ class ChatConsumer(AsyncWebsocketConsumer):
                 'username': self.user.username,
                 'source_lang': source_language,
                 'message_type': message_type,
-                'timestamp': timestamp
+                'timestamp': timestamp,
+                'translations': translations,
+                'wire': wire.encode_shared({
+                    'username': self.user.username,
+                    'type': message_type,
+                    'timestamp': timestamp,
+                }),
             }
         )
 
-    @sync_to_async
-    def check_message_limit(self, user):
+    # --- Voz: ventana de agrupación por hablante ---
+
+    def queue_voice_fragment(self, message, timestamp):
+        """
+        Guarda el fragmento; el primero de cada ventana arranca la tarea que
+        los envía. La ventana se cuenta desde el primer fragmento pendiente, así
+        que ningún fragmento espera más de VOICE_COALESCE_WINDOW segundos (o
+        menos si se superan VOICE_COALESCE_MAX_CHARS caracteres).
+        """
+        if not self.voice_fragments:
+            self.voice_window_start = asyncio.get_running_loop().time()
+        self.voice_fragments.append((message, timestamp))
+        if sum(len(text) for text, _ in self.voice_fragments) >= getattr(settings, 'VOICE_COALESCE_MAX_CHARS', 500):
+            self.voice_flush_now.set()
+        if self.voice_task is None:
+            self.voice_task = asyncio.create_task(self.voice_flush_loop())
+
+    async def voice_flush_loop(self):
+        """Envía los fragmentos por ventanas, en orden, hasta vaciar la cola."""
+        window = getattr(settings, 'VOICE_COALESCE_WINDOW', 0.3)
+        loop = asyncio.get_running_loop()
         try:
-            profile = user.profile
-            today = timezone.now().date()
-            
-            # Resetear si es otro dÃ­a
-            if profile.last_message_date != today:
-                profile.daily_messages_count = 0
-                profile.last_message_date = today
-            
-            # Validar
-            limit = 10 # Demo limit
-            if profile.subscription_plan == 'free' and profile.daily_messages_count >= limit:
-                profile.save()
+            while self.voice_fragments:
+                remaining = self.voice_window_start + window - loop.time()
+                try:
+                    await asyncio.wait_for(self.voice_flush_now.wait(), timeout=max(remaining, 0))
+                except asyncio.TimeoutError:
+                    pass
+                self.voice_flush_now.clear()
+                fragments, self.voice_fragments = self.voice_fragments, []
+                await self.send_voice(fragments)
+        finally:
+            self.voice_task = None
+
+    async def send_voice(self, fragments):
+        message = ' '.join(text.strip() for text, _ in fragments if text.strip())
+        if not message:
+            return
+        source_language = self.language
+        translations = await self.translate_for_room(message, source_language)
+        # Enviar al grupo ya traducido (igual que mensajes de texto)
+        await self.broadcast_message(message, source_language, 'voice', fragments[0][1], translations)
+
+    async def drain_voice(self):
+        """Envía ya los fragmentos pendientes (al desconectar)."""
+        if self.voice_task is not None:
+            self.voice_flush_now.set()
+            await self.voice_task
+
+    async def check_message_limit(self):
+        """
+        Descuenta un mensaje del cupo diario con un UPDATE condicional
+        (api/quotas.py), así el límite se respeta aunque el usuario tenga
+        varias conexiones abiertas. Sin límite (premium) se reserva por
+        bloques de CHAT_QUOTA_LEASE_SIZE mensajes que se gastan en memoria y
+        lo no usado se devuelve al desconectar; con límite se descuenta cada
+        mensaje para que ninguna conexión retenga cupo que otra necesita.
+        """
+        today = timezone.now().date()
+
+        # Lo reservado otro día no vale para hoy
+        if self.quota_lease_date != today:
+            self.quota_lease = 0
+            self.quota_lease_date = today
+
+        if not self.quota_lease:
+            self.quota_lease = await self.lease_message_quota()
+            if not self.quota_lease:
                 return False
-            
-            # Contar
-            profile.daily_messages_count += 1
-            profile.save()
-            return True
-        except:
-            return True
+
+        self.quota_lease -= 1
+        return True
 
     # 4. Esta función se llama en CADA consumidor (usuario) del grupo
     async def chat_message(self, event):
@@ -147,66 +262,193 @@ class ChatConsumer(AsyncWebsocketConsumer):
         source_lang = event['source_lang']
         message_type = event.get('message_type', 'text')
         timestamp = event.get('timestamp', '')
-        is_muted = event.get('is_muted', False)
-        
-        # Si es un mensaje de join, presence_request, presence_response, mute_status o leave, enviarlo directamente sin traducir
-        if message_type in ['join', 'presence_request', 'presence_response', 'mute_status', 'leave']:
-            await self.send(text_data=json.dumps({
-                'message': message,
-                'username': username,
-                'type': message_type,
-                'timestamp': timestamp,
-                'isMuted': is_muted
-            }))
-            return
         
         # Obtenemos el idioma de destino de ESTE usuario (el receptor)
-        target_language = await self.get_user_language(self.scope['user'])
+        target_language = self.language
 
         translated_text = message
         
-        print(f"🔄 Traduciendo mensaje de {username}: '{message}' | {source_lang} → {target_language}")
+        logger.debug("Traduciendo mensaje de %s | %s → %s", username, source_lang, target_language)
         
-        # 5. Usamos sync_to_async para la traducción si los idiomas son diferentes
-        if source_lang != target_language:
-            # ¡Aquí ocurre la magia!
+        # 5. El emisor ya tradujo a los idiomas de la sala; solo se traduce aquí
+        # si este idioma no estaba (p. ej. receptor conectado a otro proceso)
+        translations = event.get('translations') or {}
+        if source_lang != target_language and target_language in translations:
+            translated_text = translations[target_language]
+        elif source_lang != target_language:
             translation_result = await self.perform_translation(message, target_language, source_lang)
             
             if 'error' not in translation_result:
                 translated_text = translation_result['translated_text']
-                print(f"✅ Traducción exitosa: '{translated_text}'")
             else:
-                print(f"❌ Error de traducción: {translation_result['error']}")
+                logger.warning("Error de traducción: %s", translation_result['error'])
                 translated_text = f"Error al traducir: {message}" # Enviar error al cliente
-        else:
-            print(f"⏭️ Mismo idioma, no se traduce")
 
         # 6. Enviar el mensaje (traducido o no) de vuelta al frontend de este usuario
-        print(f"📤 Enviando a {self.scope['user'].username}: '{translated_text}'")
-        await self.send(text_data=json.dumps({
+        await self.send_frame({
             'message': translated_text,
             'username': username,
             'type': message_type,
-            'timestamp': timestamp
-        }))
+            'timestamp': timestamp,
+            wire.SHARED: event.get('wire'),
+        }, VOICE if message_type == 'voice' else TEXT, username)
+
+    # --- Envío al cliente ---
+
+    async def send_frame(self, payload, kind=TEXT, key=None):
+        """Encola un frame para este cliente; si ya no cabe, se cierra la conexión."""
+        if self.outbound_closed:
+            return
+        if not self.outbound.put(payload, kind, key):
+            self.writer_task.cancel()
+            await self.close_slow_client()
+
+    async def close_slow_client(self):
+        print(f"🐢 {self.user.username} no recibe a tiempo, se cierra la conexión")
+        self.outbound_closed = True
+        await self.close(code=4008)
+
+    async def write_outbound(self):
+        """
+        Envía los frames de la cola de uno en uno. Daphne no espera al
+        cliente, así que no se envía más de lo que cabe en su ventana de acks
+        (o, si el cliente no los envía, de su presupuesto): lo demás se queda
+        en la cola acotada.
+        """
+        while True:
+            frame = wire.encode_frame(await self.outbound.get(), self.wire_format)
+            if self.ack_window.enabled:
+                self.outbound.congested = True
+                fits = await self.ack_window.reserve(len(frame))
+                self.outbound.congested = False
+                if not fits:
+                    await self.close_slow_client()
+                    return
+            else:
+                await self.send_budget.spend(len(frame))
+            self.ack_window.sent_frame(len(frame))
+            if isinstance(frame, bytes):
+                await self.send(bytes_data=frame)
+            else:
+                await self.send(text_data=frame)
+
+    # --- Presencia en la sala de voz ---
+
+    async def handle_presence(self, message_type, is_muted, timestamp):
+        """
+        La presencia se resuelve en el servidor: quien entra recibe la lista
+        completa en un solo mensaje (presence_list) y el resto de la sala solo
+        los cambios (join, leave, mute_status). presence_request responde solo
+        a quien lo pide y presence_response ya no se difunde.
+        """
+        event = {
+            'channel': self.channel_name,
+            'username': self.user.username,
+            'is_muted': is_muted,
+            'timestamp': timestamp,
+        }
+        if message_type == 'join':
+            await self.channel_layer.group_send(self.room_group_name, {'type': 'presence_join', **event})
+        elif message_type == 'leave':
+            # Este canal puede dejar de recibir el evento del grupo (desconexión)
+            room_presence.leave(self.room_group_name, self.channel_name)
+            await self.channel_layer.group_send(self.room_group_name, {'type': 'presence_leave', **event})
+        elif message_type == 'mute_status':
+            await self.channel_layer.group_send(self.room_group_name, {'type': 'presence_mute', **event})
+        elif message_type == 'presence_request':
+            await self.send_presence_list()
+
+    async def send_presence_list(self):
+        await self.send_frame({
+            'type': 'presence_list',
+            'members': room_presence.members(self.room_group_name),
+        }, PRESENCE)
+
+    async def send_presence_delta(self, message_type, event, message):
+        # Si el cliente va con retraso, solo importa el último estado de cada usuario
+        await self.send_frame({
+            'message': message,
+            'username': event['username'],
+            'type': message_type,
+            'timestamp': event['timestamp'],
+            'isMuted': event['is_muted']
+        }, PRESENCE, event['username'])
+
+    async def presence_join(self, event):
+        room_presence.join(self.room_group_name, event['channel'], event['username'], event['is_muted'])
+        if event['channel'] == self.channel_name:
+            await self.send_presence_list()
+            return
+        await self.send_presence_delta('join', event, 'joined')
+
+        # Si quien entra está en otro proceso, la primera conexión de este
+        # proceso le envía los miembros que solo conoce este proceso
+        local_channels = room_languages.channels(self.room_group_name)
+        if event['channel'] not in local_channels and local_channels[:1] == [self.channel_name]:
+            snapshot = room_presence.snapshot(self.room_group_name, local_channels)
+            if snapshot:
+                await self.channel_layer.send(event['channel'], {
+                    'type': 'presence_snapshot',
+                    'members': snapshot,
+                })
+
+    async def presence_snapshot(self, event):
+        room_presence.merge(self.room_group_name, event['members'])
+        await self.send_presence_list()
+
+    async def presence_leave(self, event):
+        room_presence.leave(self.room_group_name, event['channel'])
+        if event['channel'] != self.channel_name and not room_presence.has_user(
+                self.room_group_name, event['username']):
+            await self.send_presence_delta('leave', event, 'left')
+
+    async def presence_mute(self, event):
+        room_presence.set_muted(self.room_group_name, event['channel'], event['is_muted'])
+        if event['channel'] != self.channel_name:
+            await self.send_presence_delta('mute_status', event, 'mute_status')
 
     # --- Funciones de Ayuda ---
 
     @sync_to_async
-    def get_user_language(self, user):
+    def load_profile_state(self):
         """
-        Obtiene la preferencia de idioma del perfil del usuario (acceso a BBDD).
+        Lee del perfil (acceso a BBDD) el idioma y el plan.
         """
         try:
-            # Usamos el modelo Profile que ya tenÃ­as
-            return user.profile.language_preference
+            profile = Profile.objects.get(user=self.user)
         except Profile.DoesNotExist:
-            return 'es' # Idioma por defecto si no tiene perfil
+            profile = None
+        self.language = profile.language_preference if profile else 'es'  # Idioma por defecto si no tiene perfil
+        self.subscription_plan = profile.subscription_plan if profile else 'free'
+
+    @sync_to_async
+    def lease_message_quota(self):
+        """Reserva el siguiente bloque de mensajes. Devuelve cuántos se obtuvieron."""
+        block = getattr(settings, 'CHAT_QUOTA_LEASE_SIZE', 5)
+        return quotas.lease(self.user.id, quotas.CHAT_MESSAGES, block)
 
     @sync_to_async
-    def perform_translation(self, text, target_lang, source_lang):
+    def release_message_quota(self):
+        """Devuelve al cupo de hoy los mensajes reservados y no enviados."""
+        unused, self.quota_lease = self.quota_lease, 0
+        if self.quota_lease_date == timezone.now().date():
+            quotas.release(self.user.id, quotas.CHAT_MESSAGES, unused)
+
+    async def profile_updated(self, event):
+        """El perfil cambió (ver chat/signals.py): actualizar el estado en memoria."""
+        self.language = event['language']
+        self.subscription_plan = event['subscription_plan']
+        if self.channel_name in room_languages.channels(self.room_group_name):
+            room_languages.join(self.room_group_name, self.channel_name, self.language)
+
+    async def perform_translation(self, text, target_lang, source_lang):
         """
-        Ejecuta la traducciÃ³n sÃ­ncrona (de translation.py) en un hilo separado.
+        Traduce con el cliente asíncrono (api/async_translation.py): la espera
+        al servicio no ocupa hilos del executor, que quedan para la BD.
         """
-        # Usamos la funciÃ³n que ya tenÃ­as
-        return translate_text(text, target_lang, source_lang)
\ No newline at end of file
+        return await translate_text_async(text, target_lang, source_lang)
+
+    async def translate_for_room(self, message, source_lang):
+        """Traduce el mensaje a cada idioma registrado en la sala."""
+        languages = room_languages.languages(self.room_group_name)
+        return await translate_for_languages(message, source_lang, languages, self.perform_translation)
\ No newline at end of file
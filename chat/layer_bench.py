@@ -0,0 +1,132 @@
+"""
+Prueba de la capa de canales con varios procesos.
+
+Cada worker es un proceso independiente que, como un proceso Daphne con una
+conexión abierta, crea su canal, lo une al grupo y consume mensajes de la capa.
+El proceso principal hace group_send y mide cuánto tardan todos los workers en
+recibir los mensajes de cada tamaño. Lo usan el comando bench_channel_layer y
+las pruebas de chat.
+
+La capa se describe como en CHANNEL_LAYERS ({'BACKEND': ..., 'CONFIG': ...});
+`layer_config` da la configurada en settings (la de producción con REDIS_URL
+es channels_redis.core.RedisChannelLayer), para medir la que realmente se usa.
+"""
+import asyncio
+import copy
+import multiprocessing
+import queue
+import time
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+GROUP = 'chat_bench'
+
+CORE_BACKEND = 'channels_redis.core.RedisChannelLayer'
+PUBSUB_BACKEND = 'channels_redis.pubsub.RedisPubSubChannelLayer'
+
+
+def layer_config(redis_url=None, backend=None):
+    """
+    Configuración de la capa: la de CHANNEL_LAYERS['default'] (o la de
+    `backend`), con `redis_url` como host si se indica. La capa en memoria no
+    cruza procesos, así que en su lugar se usa la de producción (core).
+    """
+    config = copy.deepcopy(settings.CHANNEL_LAYERS['default'])
+    if backend is None and not config['BACKEND'].startswith('channels_redis.'):
+        backend = CORE_BACKEND
+    if backend is not None and backend != config['BACKEND']:
+        config = {'BACKEND': backend, 'CONFIG': {}}
+    config.setdefault('CONFIG', {})
+    if redis_url:
+        config['CONFIG']['hosts'] = [redis_url]
+    return config
+
+
+def _make_layer(config):
+    return import_string(config['BACKEND'])(**config.get('CONFIG', {}))
+
+
+async def _consume(config, ready, results):
+    layer = _make_layer(config)
+    channel = await layer.new_channel()
+    await layer.group_add(GROUP, channel)
+    ready.put(channel)
+    received = 0
+    try:
+        while True:
+            message = await layer.receive(channel)
+            if message['type'] == 'bench.message':
+                received += 1
+            elif message['type'] == 'bench.end':
+                results.put((channel, message['size'], received, time.time()))
+                received = 0
+            elif message['type'] == 'bench.stop':
+                break
+    finally:
+        await layer.flush()
+
+
+def run_worker(config, ready, results):
+    """Punto de entrada de cada proceso worker."""
+    asyncio.run(_consume(config, ready, results))
+
+
+async def _send_round(layer, size, messages):
+    payload = 'x' * size
+    start = time.time()
+    for i in range(messages):
+        await layer.group_send(GROUP, {'type': 'bench.message', 'seq': i, 'payload': payload})
+    await layer.group_send(GROUP, {'type': 'bench.end', 'size': size})
+    return start
+
+
+def run_benchmark(config, workers=3, sizes=(64, 1024, 16384), messages=200, timeout=60):
+    """
+    Arranca `workers` procesos sobre la capa `config` (ver layer_config) y
+    envía `messages` mensajes al grupo por cada tamaño. Devuelve una lista de
+    dicts con los mensajes recibidos por cada worker, el tiempo total y el
+    rendimiento.
+    """
+    context = multiprocessing.get_context('spawn')
+    ready, results = context.Queue(), context.Queue()
+    processes = [context.Process(target=run_worker, args=(config, ready, results), daemon=True)
+                 for _ in range(workers)]
+    for process in processes:
+        process.start()
+
+    async def main():
+        layer = _make_layer(config)
+        rows = []
+        try:
+            for size in sizes:
+                start = await _send_round(layer, size, messages)
+                received, finished = [], []
+                for _ in range(workers):
+                    _, _, count, finished_at = await asyncio.to_thread(results.get, True, timeout)
+                    received.append(count)
+                    finished.append(finished_at)
+                elapsed = max(finished) - start
+                rows.append({
+                    'size': size,
+                    'received': received,
+                    'elapsed': elapsed,
+                    'messages_per_second': messages / elapsed if elapsed else 0.0,
+                    'mb_per_second': messages * size * workers / elapsed / (1024 * 1024) if elapsed else 0.0,
+                })
+            await layer.group_send(GROUP, {'type': 'bench.stop'})
+        finally:
+            await layer.flush()
+        return rows
+
+    try:
+        for _ in range(workers):
+            ready.get(True, timeout)
+        return asyncio.run(main())
+    except queue.Empty:
+        raise RuntimeError('Los workers no respondieron a tiempo')
+    finally:
+        for process in processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
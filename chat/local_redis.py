@@ -0,0 +1,213 @@
+"""
+Servidor mínimo compatible con el protocolo de Redis (RESP2) para desarrollo y
+pruebas del chat en varios procesos sin instalar Redis.
+
+Solo implementa lo que usa channels_redis.pubsub.RedisPubSubChannelLayer
+(PUBLISH, SUBSCRIBE, UNSUBSCRIBE, PING y los comandos de conexión de
+redis-py) y claves simples con caducidad (GET, SET, SETEX, DEL) para las
+cachés compartidas. No sirve para RedisChannelLayer, que necesita scripts Lua
+y estructuras de datos: en producción se usa un Redis real (ver settings).
+"""
+import asyncio
+import threading
+import time
+from collections import defaultdict
+
+
+class _Client:
+    def __init__(self, writer):
+        self.writer = writer
+        self.channels = set()
+
+
+def _encode(value):
+    """Codifica una respuesta en RESP2."""
+    if value is None:
+        return b'$-1\r\n'
+    if isinstance(value, int):
+        return b':%d\r\n' % value
+    if isinstance(value, str):
+        value = value.encode('utf-8')
+    if isinstance(value, bytes):
+        return b'$%d\r\n%s\r\n' % (len(value), value)
+    if isinstance(value, (list, tuple)):
+        return b'*%d\r\n' % len(value) + b''.join(_encode(item) for item in value)
+    raise TypeError(f'Tipo no soportado en RESP: {type(value)}')
+
+
+async def _read_command(reader):
+    """Lee un comando (array de bulk strings o comando en línea). None si se cerró."""
+    line = await reader.readline()
+    if not line:
+        return None
+    if not line.startswith(b'*'):
+        return line.strip().split()
+    args = []
+    for _ in range(int(line[1:])):
+        header = await reader.readline()
+        length = int(header[1:])
+        data = await reader.readexactly(length + 2)
+        args.append(data[:-2])
+    return args
+
+
+class LocalRedisServer:
+    """
+    Servidor pub/sub en su propio hilo y event loop.
+
+        server = LocalRedisServer()
+        url = server.start()   # redis://127.0.0.1:<puerto>/0
+        ...
+        server.stop()
+    """
+
+    def __init__(self, host='127.0.0.1', port=0):
+        self.host = host
+        self.port = port
+        self._subscribers = defaultdict(set)
+        # clave -> (valor, caducidad en time.monotonic() o None)
+        self._values = {}
+        # tarea de cada conexión abierta -> su cliente
+        self._connections = {}
+        self._loop = None
+        self._server = None
+        self._thread = None
+        self._ready = threading.Event()
+        self.published = 0
+
+    @property
+    def url(self):
+        return f'redis://{self.host}:{self.port}/0'
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='local-redis', daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        return self.url
+
+    def stop(self):
+        if self._loop is not None:
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result(timeout=5)
+            self._thread.join(timeout=5)
+
+    async def _shutdown(self):
+        """Cierra las conexiones abiertas antes de parar el loop."""
+        self._server.close()
+        # Cerrar el socket termina la tarea de cada conexión (lee fin de datos)
+        for client in self._connections.values():
+            client.writer.close()
+        await asyncio.gather(*self._connections, return_exceptions=True)
+        self._loop.call_soon(self._loop.stop)
+
+    def serve_forever(self):
+        """Ejecuta el servidor en el hilo actual (comando run_local_redis)."""
+        self._run()
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._server = self._loop.run_until_complete(
+            asyncio.start_server(self._handle, self.host, self.port))
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            self._server.close()
+            self._loop.close()
+
+    async def _handle(self, reader, writer):
+        client = _Client(writer)
+        self._connections[asyncio.current_task()] = client
+        try:
+            while True:
+                args = await _read_command(reader)
+                if args is None:
+                    break
+                if not args:
+                    continue
+                if not self._execute(client, args):
+                    break
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._connections.pop(asyncio.current_task(), None)
+            for channel in client.channels:
+                self._subscribers[channel].discard(client)
+            writer.close()
+
+    def _execute(self, client, args):
+        """Ejecuta un comando. Devuelve False si hay que cerrar la conexión."""
+        command = args[0].upper()
+        write = client.writer.write
+        if command == b'PING':
+            if client.channels:
+                write(_encode([b'pong', args[1] if len(args) > 1 else b'']))
+            else:
+                write(b'+PONG\r\n' if len(args) == 1 else _encode(args[1]))
+        elif command in (b'CLIENT', b'SELECT', b'READONLY'):
+            write(b'+OK\r\n')
+        elif command == b'ECHO':
+            write(_encode(args[1]))
+        elif command == b'QUIT':
+            write(b'+OK\r\n')
+            return False
+        elif command == b'SUBSCRIBE':
+            for channel in args[1:]:
+                client.channels.add(channel)
+                self._subscribers[channel].add(client)
+                write(_encode([b'subscribe', channel, len(client.channels)]))
+        elif command == b'UNSUBSCRIBE':
+            for channel in (args[1:] or list(client.channels)):
+                client.channels.discard(channel)
+                self._subscribers[channel].discard(client)
+                if not self._subscribers[channel]:
+                    del self._subscribers[channel]
+                write(_encode([b'unsubscribe', channel, len(client.channels)]))
+        elif command == b'PUBLISH':
+            channel, data = args[1], args[2]
+            receivers = list(self._subscribers.get(channel, ()))
+            frame = _encode([b'message', channel, data])
+            for receiver in receivers:
+                receiver.writer.write(frame)
+            self.published += 1
+            write(_encode(len(receivers)))
+        elif command == b'GET':
+            write(_encode(self._get(args[1])))
+        elif command in (b'SET', b'SETEX'):
+            if command == b'SETEX':
+                key, value, options = args[1], args[3], [b'EX', args[2]]
+            else:
+                key, value, options = args[1], args[2], [option.upper() for option in args[3:]]
+            expires = None
+            if b'EX' in options:
+                expires = time.monotonic() + int(options[options.index(b'EX') + 1])
+            elif b'PX' in options:
+                expires = time.monotonic() + int(options[options.index(b'PX') + 1]) / 1000
+            exists = self._get(key) is not None
+            if (b'NX' in options and exists) or (b'XX' in options and not exists):
+                write(_encode(None))
+            else:
+                self._values[key] = (value, expires)
+                write(b'+OK\r\n')
+        elif command == b'DEL':
+            deleted = 0
+            for key in args[1:]:
+                if self._get(key) is not None:
+                    del self._values[key]
+                    deleted += 1
+            write(_encode(deleted))
+        elif command == b'FLUSHDB':
+            self._values.clear()
+            write(b'+OK\r\n')
+        else:
+            write(b'-ERR unknown command \'%s\'\r\n' % command.lower())
+        return True
+
+    def _get(self, key):
+        value, expires = self._values.get(key, (None, None))
+        if expires is not None and expires <= time.monotonic():
+            del self._values[key]
+            return None
+        return value
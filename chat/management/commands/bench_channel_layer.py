@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from chat.layer_bench import CORE_BACKEND, PUBSUB_BACKEND, layer_config, run_benchmark
+from chat.local_redis import LocalRedisServer
+
+
+class Command(BaseCommand):
+    help = ('Arranca varios procesos worker sobre la capa de canales configurada en '
+            'CHANNEL_LAYERS (RedisChannelLayer si es la capa en memoria) y mide '
+            'group_send entre procesos por tamaño de mensaje.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=3)
+        parser.add_argument('--sizes', type=int, nargs='+', default=[64, 1024, 16384, 65536])
+        parser.add_argument('--messages', type=int, default=200)
+        parser.add_argument('--redis-url', help='Redis real; si no se indica se usa el de la configuración')
+        parser.add_argument('--backend', choices=['configured', 'core', 'pubsub'], default='configured',
+                            help='Capa a medir; pubsub puede usar el servidor local sin --redis-url')
+
+    def handle(self, *args, **options):
+        backend = {'configured': None, 'core': CORE_BACKEND, 'pubsub': PUBSUB_BACKEND}[options['backend']]
+        config = layer_config(options['redis_url'], backend)
+        server = None
+        if not config['CONFIG'].get('hosts'):
+            if config['BACKEND'] != PUBSUB_BACKEND:
+                raise CommandError(f"{config['BACKEND']} necesita un Redis real: indique --redis-url "
+                                   '(o --backend pubsub para usar el servidor local)')
+            server = LocalRedisServer()
+            config['CONFIG']['hosts'] = [server.start()]
+            self.stdout.write(f"Servidor local compatible con Redis en {config['CONFIG']['hosts'][0]}")
+        self.stdout.write(f"Capa: {config['BACKEND']}")
+        try:
+            rows = run_benchmark(config, options['workers'], options['sizes'], options['messages'])
+        finally:
+            if server is not None:
+                server.stop()
+
+        self.stdout.write(f"{'bytes':>7} {'recibidos por worker':>22} {'s':>7} {'msg/s':>9} {'MB/s':>7}")
+        for row in rows:
+            received = '/'.join(str(count) for count in row['received'])
+            self.stdout.write(f"{row['size']:>7} {received:>22} {row['elapsed']:>7.2f} "
+                              f"{row['messages_per_second']:>9.0f} {row['mb_per_second']:>7.2f}")
+            if any(count != options['messages'] for count in row['received']):
+                self.stderr.write(f"Se perdieron mensajes de {row['size']} bytes")
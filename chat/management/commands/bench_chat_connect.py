@@ -0,0 +1,62 @@
+import asyncio
+import time
+import uuid
+
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from rest_framework.authtoken.models import Token
+
+from chat.middleware import TokenAuthMiddleware, invalidate_token
+
+
+async def accept_and_wait(scope, receive, send):
+    """Aplicación mínima tras el middleware: acepta y espera el cierre."""
+    await receive()
+    await send({'type': 'websocket.accept'})
+    await receive()
+
+
+class Command(BaseCommand):
+    help = ('Mide conexiones WebSocket por segundo a través de TokenAuthMiddleware '
+            'con y sin la caché de tokens (ráfaga de reconexiones).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, default=500)
+        parser.add_argument('--concurrency', type=int, default=50)
+
+    async def _storm(self, token_key, connections, concurrency):
+        application = TokenAuthMiddleware(accept_and_wait)
+
+        async def connect_once():
+            communicator = WebsocketCommunicator(application, f'/ws/chat/bench/?token={token_key}')
+            connected, _ = await communicator.connect()
+            assert connected
+            await communicator.disconnect()
+
+        start = time.perf_counter()
+        for offset in range(0, connections, concurrency):
+            batch = min(concurrency, connections - offset)
+            await asyncio.gather(*(connect_once() for _ in range(batch)))
+        return time.perf_counter() - start
+
+    def _run(self, token_key, ttl, options):
+        invalidate_token(token_key)
+        with override_settings(CHAT_TOKEN_CACHE_TTL=ttl):
+            elapsed = asyncio.run(self._storm(token_key, options['connections'], options['concurrency']))
+        return options['connections'] / elapsed if elapsed else 0.0
+
+    def handle(self, *args, **options):
+        user = User.objects.create_user(f'bench_{uuid.uuid4().hex[:8]}')
+        token = Token.objects.create(user=user)
+        try:
+            self.stdout.write(f"{options['connections']} conexiones, {options['concurrency']} a la vez")
+            # TTL 0: la caché no guarda nada, cada conexión consulta la BD
+            without_cache = self._run(token.key, 0, options)
+            with_cache = self._run(token.key, 300, options)
+        finally:
+            user.delete()
+
+        self.stdout.write(f'{"sin caché":>10}: {without_cache:8.0f} conexiones/s')
+        self.stdout.write(f'{"con caché":>10}: {with_cache:8.0f} conexiones/s')
@@ -0,0 +1,69 @@
+import asyncio
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.management.base import BaseCommand
+
+from chat.consumers import translate_for_languages
+
+LANGUAGES = ['es', 'en', 'fr', 'de', 'it', 'pt', 'ja', 'zh-cn']
+
+
+class FakeTranslator:
+    """Traductor con latencia fija que cuenta las llamadas."""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, text, target_language, source_language=None):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency)
+        return {'translated_text': f'[{target_language}] {text}', 'detected_source_language': source_language}
+
+
+class Command(BaseCommand):
+    help = 'Compara la traducción por receptor con la traducción una vez por idioma en una sala.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--members', type=int, nargs='+', default=[5, 20, 50, 100])
+        parser.add_argument('--languages', type=int, default=3)
+        parser.add_argument('--latency', type=float, default=0.05,
+                            help='Segundos que tarda cada llamada al traductor')
+
+    async def _per_receiver(self, languages, translator):
+        """Comportamiento anterior: cada receptor traduce en su chat_message."""
+        translate = sync_to_async(translator)
+
+        async def receiver(language):
+            if language != 'es':
+                await translate('Hola a todos', language, 'es')
+
+        await asyncio.gather(*(receiver(lang) for lang in languages))
+
+    async def _fan_out(self, languages, translator):
+        """El emisor traduce una vez por idioma y difunde el mapa."""
+        translate = sync_to_async(translator, thread_sensitive=False)
+        await translate_for_languages('Hola a todos', 'es', set(languages), translate)
+
+    def _run(self, strategy, languages, latency):
+        translator = FakeTranslator(latency)
+        start = time.perf_counter()
+        asyncio.run(strategy(languages, translator))
+        return translator.calls, time.perf_counter() - start
+
+    def handle(self, *args, **options):
+        room_languages = LANGUAGES[:max(1, options['languages'])]
+        self.stdout.write(f"Idiomas en la sala: {', '.join(room_languages)} (origen: es), "
+                          f"latencia por llamada: {options['latency'] * 1000:.0f} ms")
+        self.stdout.write(f"{'miembros':>8} {'llamadas antes':>15} {'ms antes':>9} "
+                          f"{'llamadas ahora':>15} {'ms ahora':>9}")
+        for members in options['members']:
+            languages = [room_languages[i % len(room_languages)] for i in range(members)]
+            old_calls, old_time = self._run(self._per_receiver, languages, options['latency'])
+            new_calls, new_time = self._run(self._fan_out, languages, options['latency'])
+            self.stdout.write(f'{members:>8} {old_calls:>15} {old_time * 1000:>9.0f} '
+                              f'{new_calls:>15} {new_time * 1000:>9.0f}')
@@ -0,0 +1,51 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from chat import wire
+
+
+class Command(BaseCommand):
+    help = ('Compara el coste de codificar un mensaje difundido a una sala y los bytes '
+            'enviados: JSON completo por receptor, JSON y msgpack con la parte común precodificada.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--receivers', type=int, default=100)
+        parser.add_argument('--rounds', type=int, default=2000)
+        parser.add_argument('--message', default='vale, nos vemos en la sala de reuniones en cinco minutos')
+
+    def _measure(self, encode_round, rounds):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            frames = encode_round()
+        return (time.perf_counter() - start) / rounds, frames
+
+    def handle(self, *args, **options):
+        receivers, rounds = options['receivers'], options['rounds']
+        fields = {'username': 'usuario_de_prueba', 'type': 'voice', 'timestamp': '2025-01-01T10:00:00.000Z'}
+        # Cada receptor recibe su traducción: el texto cambia, el resto no
+        messages = [f"[{i % 5}] {options['message']}" for i in range(receivers)]
+
+        def json_per_receiver():
+            return [json.dumps({'message': message, **fields}) for message in messages]
+
+        def shared(wire_format):
+            def encode_round():
+                encoded = wire.encode_shared(fields)
+                return [wire.encode_frame({'message': message, **fields, wire.SHARED: encoded}, wire_format)
+                        for message in messages]
+            return encode_round
+
+        rows = [
+            ('JSON por receptor', json_per_receiver),
+            ('JSON parte común', shared(wire.JSON)),
+            ('msgpack parte común', shared(wire.MSGPACK)),
+        ]
+        self.stdout.write(f'{receivers} receptores, {rounds} mensajes difundidos')
+        self.stdout.write(f"{'formato':>20} {'µs/mensaje':>11} {'µs/frame':>9} {'bytes/frame':>12}")
+        for name, encode_round in rows:
+            elapsed, frames = self._measure(encode_round, rounds)
+            size = sum(len(frame.encode('utf-8') if isinstance(frame, str) else frame) for frame in frames)
+            self.stdout.write(f'{name:>20} {elapsed * 1e6:>11.1f} {elapsed * 1e6 / receivers:>9.2f} '
+                              f'{size / receivers:>12.1f}')
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from chat.local_redis import LocalRedisServer
+
+
+class Command(BaseCommand):
+    help = ('Servidor local compatible con Redis (pub/sub y claves simples) para probar el chat '
+            'con varios procesos: CHANNEL_LAYER_BACKEND=pubsub REDIS_URL=redis://127.0.0.1:6379/0')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=6379)
+
+    def handle(self, *args, **options):
+        server = LocalRedisServer(options['host'], options['port'])
+        self.stdout.write(f"Escuchando en redis://{options['host']}:{options['port']}/0 (Ctrl+C para salir)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
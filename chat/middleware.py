@@ -1,33 +1,104 @@
+import asyncio
+import pickle
+import weakref
+
+import redis
+import redis.asyncio
+from django.conf import settings
 from django.contrib.auth.models import AnonymousUser
 from rest_framework.authtoken.models import Token
 from channels.db import database_sync_to_async
 from channels.middleware import BaseMiddleware
 from urllib.parse import parse_qs
 
+# Clientes de Redis de la caché de tokens: uno síncrono por URL y uno
+# asíncrono por event loop (sus conexiones son de un solo loop)
+_sync_clients = {}
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def token_cache_key(token_key):
+    return f'chat_token:{token_key}'
+
+
+def _cache_url():
+    return getattr(settings, 'CHAT_TOKEN_CACHE_URL', '')
+
+
+def _sync_client(url):
+    if url not in _sync_clients:
+        _sync_clients[url] = redis.Redis.from_url(url)
+    return _sync_clients[url]
+
+
+def _async_client(url):
+    loop = asyncio.get_running_loop()
+    clients = _async_clients.setdefault(loop, {})
+    if url not in clients:
+        clients[url] = redis.asyncio.Redis.from_url(url)
+    return clients[url]
+
+
+def invalidate_token(token_key):
+    """Olvida el usuario cacheado de un token (ver chat/signals.py)."""
+    url = _cache_url()
+    if not url:
+        return
+    try:
+        _sync_client(url).delete(token_cache_key(token_key))
+    except redis.RedisError as e:
+        print(f"❌ No se pudo invalidar el token en la caché: {e}")
+
+
 @database_sync_to_async
-def get_user(token_key):
+def _load_user(token_key):
+    """Usuario del token desde la BD; si hay caché compartida, se guarda en ella."""
     try:
-        token = Token.objects.get(key=token_key)
-        print(f"✅ Middleware: Usuario encontrado: {token.user.username}")
-        return token.user
+        # Una sola consulta: token y usuario juntos
+        token = Token.objects.select_related('user').get(key=token_key)
     except Token.DoesNotExist:
-        print(f"❌ Middleware: Token {token_key} no existe en la base de datos.")
         return AnonymousUser()
+    user = token.user
+    if not user.is_active:
+        return AnonymousUser()
+    url = _cache_url()
+    if url:
+        try:
+            _sync_client(url).set(token_cache_key(token_key), pickle.dumps(user),
+                                  ex=getattr(settings, 'CHAT_TOKEN_CACHE_TTL', 300))
+        except redis.RedisError:
+            pass
+    return user
+
+
+async def get_user(token_key):
+    """
+    Usuario del token. Los clientes móviles se reconectan a menudo, así que el
+    usuario se guarda en Redis (CHAT_TOKEN_CACHE_URL, compartido por todos los
+    procesos) durante CHAT_TOKEN_CACHE_TTL segundos; borrar el token (logout)
+    o modificar el usuario lo invalida. Los aciertos se leen con el cliente
+    asíncrono, sin pasar por el hilo de la BD. Sin Redis no se cachea.
+    """
+    url = _cache_url()
+    if url:
+        try:
+            cached = await _async_client(url).get(token_cache_key(token_key))
+        except redis.RedisError:
+            cached = None
+        if cached is not None:
+            return pickle.loads(cached)
+    return await _load_user(token_key)
 
 class TokenAuthMiddleware(BaseMiddleware):
     async def __call__(self, scope, receive, send):
         # Obtener la query string
         query_string = scope.get("query_string", b"").decode("utf-8")
-        print(f"🔍 Middleware: Query string recibida: {query_string}")
-        
         query_params = parse_qs(query_string)
         token_key = query_params.get("token", [None])[0]
 
         if token_key:
-            print(f"🔑 Middleware: Token extraído: {token_key}")
             scope["user"] = await get_user(token_key)
         else:
-            print("⚠️ Middleware: No se encontró el parámetro 'token' en la URL.")
             scope["user"] = AnonymousUser()
 
-        return await super().__call__(scope, receive, send)
\ No newline at end of file
+        return await super().__call__(scope, receive, send)
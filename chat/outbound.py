@@ -0,0 +1,219 @@
+"""
+Cola de salida de cada conexión del chat.
+
+Los manejadores del consumidor (chat_message, presencia...) no escriben en el
+socket: dejan el frame en la cola y una tarea de escritura por conexión lo
+envía. Así un cliente lento no frena la lectura de la capa de canales, y la
+cola queda acotada:
+
+- Por encima de CHAT_OUTBOUND_HIGH_WATER frames pendientes, o mientras el
+  cliente va retrasado (ventana llena, ver abajo), los de presencia y voz se
+  agrupan: un cambio de presencia sustituye al pendiente del mismo usuario y
+  un fragmento de voz se une al pendiente del mismo hablante.
+- Con CHAT_OUTBOUND_MAX_FRAMES pendientes se descarta el frame de presencia o
+  voz más antiguo. Si solo quedan mensajes de texto, que nunca se descartan,
+  `put` devuelve False y el consumidor cierra la conexión (código 4008).
+
+Con Daphne, `send` vuelve en cuanto Twisted guarda el frame en su búfer, así
+que la cola se vaciaría al instante y el búfer del servidor crecería sin
+límite. Por eso la tarea de escritura se guía por lo que el cliente confirma
+haber recibido (`AckWindow`): el cliente manda {"type": "ack", "seq": n} con
+el número de frames que lleva recibidos, y no se envía más mientras haya
+CHAT_OUTBOUND_WINDOW_BYTES sin confirmar. Lo demás espera en la cola, donde
+se agrupa y descarta como se indica arriba, y si el cliente no confirma nada
+en CHAT_ACK_TIMEOUT segundos se cierra la conexión (4008). Así el búfer del
+servidor no pasa de la ventana por conexión, sea cual sea el cliente, y un
+cliente rápido no espera nunca.
+
+Los clientes que no envían acks (versiones anteriores) no dan esa señal; a
+ellos se les aplica un ritmo fijo (`SendBudget`, CHAT_OUTBOUND_BYTES_PER_SECOND).
+
+Los contadores globales del proceso están en `outbound_stats()`.
+"""
+import asyncio
+import threading
+from collections import Counter, deque
+
+TEXT = 'text'
+VOICE = 'voice'
+PRESENCE = 'presence'
+
+# Frames que pueden agruparse o descartarse si el cliente no da abasto
+DROPPABLE = (VOICE, PRESENCE)
+
+_stats_lock = threading.Lock()
+_stats = Counter()
+
+
+def _count(name, amount=1):
+    with _stats_lock:
+        _stats[name] += amount
+
+
+def outbound_stats():
+    """
+    Frames encolados, enviados, agrupados y descartados, cierres por cliente
+    lento (cola llena o sin acks), esperas por la ventana y por el
+    presupuesto de envío.
+    """
+    with _stats_lock:
+        stats = dict(_stats)
+    for name in ('queued', 'sent', 'coalesced', 'dropped', 'overflows', 'stalled', 'window_waits', 'paced'):
+        stats.setdefault(name, 0)
+    return stats
+
+
+def reset_outbound_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+class OutboundQueue:
+    """Frames pendientes de una conexión: [tipo, clave, payload] en orden de llegada."""
+
+    def __init__(self, high_water=100, max_frames=400):
+        self.high_water = high_water
+        self.max_frames = max(max_frames, high_water)
+        self._frames = deque()
+        self._ready = asyncio.Event()
+        self.peak = 0
+        # True mientras el cliente no confirma lo enviado: se agrupa ya
+        self.congested = False
+
+    def __len__(self):
+        return len(self._frames)
+
+    def put(self, payload, kind=TEXT, key=None):
+        """Encola un frame. Devuelve False si no cabe (cliente demasiado lento)."""
+        behind = self.congested or len(self._frames) >= self.high_water
+        if behind and kind in DROPPABLE and self._coalesce(payload, kind, key):
+            _count('coalesced')
+            return True
+
+        if len(self._frames) >= self.max_frames:
+            if not self._drop_oldest():
+                if kind in DROPPABLE:
+                    _count('dropped')
+                    return True
+                _count('overflows')
+                return False
+
+        self._frames.append([kind, key, payload])
+        self.peak = max(self.peak, len(self._frames))
+        self._ready.set()
+        _count('queued')
+        return True
+
+    def _coalesce(self, payload, kind, key):
+        for frame in reversed(self._frames):
+            if frame[0] != kind or frame[1] != key:
+                continue
+            if kind == VOICE:
+                # Se conserva el resto del frame pendiente (hora del primer fragmento)
+                merged = dict(frame[2])
+                merged['message'] = f"{frame[2]['message']} {payload['message']}"
+                frame[2] = merged
+            else:
+                frame[2] = payload
+            return True
+        return False
+
+    def _drop_oldest(self):
+        for frame in self._frames:
+            if frame[0] in DROPPABLE:
+                self._frames.remove(frame)
+                _count('dropped')
+                return True
+        return False
+
+    async def get(self):
+        """Espera y devuelve el siguiente payload."""
+        while not self._frames:
+            self._ready.clear()
+            await self._ready.wait()
+        _count('sent')
+        return self._frames.popleft()[2]
+
+
+class AckWindow:
+    """
+    Bytes enviados a una conexión que el cliente aún no ha confirmado. Se
+    activa con el primer ack; hasta entonces solo lleva la cuenta.
+    """
+
+    def __init__(self, max_bytes, timeout):
+        self.max_bytes = max(max_bytes, 1)
+        self.timeout = timeout
+        self.enabled = False
+        self.sent = 0
+        self.unacked_bytes = 0
+        self.peak = 0
+        # Tamaño de los últimos frames enviados, del más antiguo al más reciente
+        self._sizes = deque()
+        self._progress = asyncio.Event()
+
+    def ack(self, seq):
+        """El cliente ha recibido los `seq` primeros frames de la conexión."""
+        if not isinstance(seq, int):
+            return
+        self.enabled = True
+        pending = self.sent - max(seq, 0)
+        while len(self._sizes) > max(pending, 0):
+            self.unacked_bytes -= self._sizes.popleft()
+        self._progress.set()
+
+    def sent_frame(self, size):
+        self.sent += 1
+        self._sizes.append(size)
+        self.unacked_bytes += size
+        self.peak = max(self.peak, self.unacked_bytes)
+        if not self.enabled:
+            # Sin acks no se puede saber qué tiene el cliente: solo se guarda
+            # la última ventana, por si el primer ack llega después
+            while self.unacked_bytes > self.max_bytes:
+                self.unacked_bytes -= self._sizes.popleft()
+
+    async def reserve(self, size):
+        """
+        Espera a que quepan `size` bytes más (siempre cabe uno si no hay nada
+        pendiente). False si el cliente no confirma nada en `timeout` segundos.
+        """
+        while self._sizes and self.unacked_bytes + size > self.max_bytes:
+            _count('window_waits')
+            self._progress.clear()
+            try:
+                await asyncio.wait_for(self._progress.wait(), self.timeout)
+            except asyncio.TimeoutError:
+                _count('stalled')
+                return False
+        return True
+
+
+class SendBudget:
+    """
+    Presupuesto de envío de una conexión (cubeta de tokens): `rate` bytes por
+    segundo con ráfagas de hasta `burst` bytes. rate=0 lo desactiva. Solo para
+    clientes que no envían acks (ver AckWindow).
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._tokens = self.burst
+        self._stamp = None
+
+    async def spend(self, size):
+        """Descuenta `size` bytes; si no hay presupuesto, espera a tenerlo."""
+        if not self.rate:
+            return
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        if self._stamp is not None:
+            self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+        self._tokens -= size
+        if self._tokens < 0:
+            _count('paced')
+            await asyncio.sleep(-self._tokens / self.rate)
+            self._tokens = 0
+            self._stamp = loop.time()
@@ -0,0 +1,117 @@
+"""
+Registros en memoria de cada sala de chat.
+
+- room_languages: conexiones abiertas y su idioma. El consumidor que envía un
+  mensaje lo consulta para traducirlo una sola vez por idioma. Es local a cada
+  proceso: si un receptor conectado a otro proceso no encuentra su idioma en
+  el mensaje, lo traduce él mismo (ver ChatConsumer.chat_message).
+- room_presence: quién está en la sala de voz y si tiene el micrófono
+  silenciado. Cada proceso lo mantiene con los eventos de presencia del grupo
+  y, al entrar alguien conectado a otro proceso, le envía sus miembros locales.
+"""
+import threading
+from collections import defaultdict
+
+
+class RoomLanguageRegistry:
+    """Sala -> {canal: idioma} de las conexiones abiertas en este proceso."""
+
+    def __init__(self):
+        self._rooms = defaultdict(dict)
+        self._lock = threading.Lock()
+
+    def join(self, room, channel_name, language):
+        with self._lock:
+            self._rooms[room][channel_name] = language
+
+    def leave(self, room, channel_name):
+        with self._lock:
+            members = self._rooms.get(room)
+            if members is None:
+                return
+            members.pop(channel_name, None)
+            if not members:
+                del self._rooms[room]
+
+    def languages(self, room):
+        """Idiomas distintos de los miembros de la sala."""
+        with self._lock:
+            return set(self._rooms.get(room, {}).values())
+
+    def member_count(self, room):
+        with self._lock:
+            return len(self._rooms.get(room, {}))
+
+    def channels(self, room):
+        """Canales de la sala en este proceso, por orden de conexión."""
+        with self._lock:
+            return list(self._rooms.get(room, {}))
+
+    def clear(self):
+        with self._lock:
+            self._rooms.clear()
+
+
+room_languages = RoomLanguageRegistry()
+
+
+class RoomPresenceRegistry:
+    """Sala -> {canal: (usuario, silenciado)} de los miembros de la sala de voz."""
+
+    def __init__(self):
+        self._rooms = defaultdict(dict)
+        self._lock = threading.Lock()
+
+    def join(self, room, channel_name, username, is_muted=False):
+        with self._lock:
+            self._rooms[room][channel_name] = (username, bool(is_muted))
+
+    def leave(self, room, channel_name):
+        with self._lock:
+            members = self._rooms.get(room)
+            if members is None:
+                return
+            members.pop(channel_name, None)
+            if not members:
+                del self._rooms[room]
+
+    def has_user(self, room, username):
+        """Si el usuario sigue en la sala por alguna de sus conexiones."""
+        with self._lock:
+            return any(name == username for name, _ in self._rooms.get(room, {}).values())
+
+    def set_muted(self, room, channel_name, is_muted):
+        with self._lock:
+            members = self._rooms.get(room)
+            if members and channel_name in members:
+                members[channel_name] = (members[channel_name][0], bool(is_muted))
+
+    def contains(self, room, channel_name):
+        with self._lock:
+            return channel_name in self._rooms.get(room, {})
+
+    def members(self, room):
+        """Lista para el cliente: un elemento por usuario, ordenada por nombre."""
+        with self._lock:
+            users = {}
+            for username, is_muted in self._rooms.get(room, {}).values():
+                users[username] = users.get(username, True) and is_muted
+        return [{'username': name, 'isMuted': muted} for name, muted in sorted(users.items())]
+
+    def snapshot(self, room, channel_names):
+        """Miembros de la sala entre `channel_names` (los conectados a este proceso)."""
+        with self._lock:
+            members = self._rooms.get(room, {})
+            return [{'channel': channel, 'username': members[channel][0], 'is_muted': members[channel][1]}
+                    for channel in channel_names if channel in members]
+
+    def merge(self, room, snapshot):
+        for member in snapshot:
+            self.join(room, member['channel'], member['username'], member['is_muted'])
+
+    def clear(self):
+        with self._lock:
+            self._rooms.clear()
+
+
+room_presence = RoomPresenceRegistry()
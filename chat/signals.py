@@ -0,0 +1,62 @@
+"""
+Mantiene al día el estado que el chat guarda en memoria.
+
+- ChatConsumer guarda el idioma y el plan al conectar; el evento
+  profile_updated en el grupo user_<id> avisa a las conexiones abiertas.
+- TokenAuthMiddleware cachea el usuario de cada token; borrar el token
+  (logout) o guardar el usuario invalida la entrada.
+"""
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from api.models import Profile
+
+from .consumers import user_group_name
+from .middleware import invalidate_token
+
+WATCHED_FIELDS = ('language_preference', 'subscription_plan')
+
+
+def _watched_state(profile):
+    return tuple(getattr(profile, field) for field in WATCHED_FIELDS)
+
+
+@receiver(post_init, sender=Profile)
+def remember_profile_state(sender, instance, **kwargs):
+    instance._chat_state = _watched_state(instance)
+
+
+@receiver(post_save, sender=Profile)
+def notify_profile_change(sender, instance, created, **kwargs):
+    state = _watched_state(instance)
+    if created or state == instance._chat_state:
+        return
+    instance._chat_state = state
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    event = {
+        'type': 'profile_updated',
+        'language': instance.language_preference,
+        'subscription_plan': instance.subscription_plan,
+    }
+    transaction.on_commit(
+        lambda: async_to_sync(channel_layer.group_send)(user_group_name(instance.user_id), event))
+
+
+@receiver(post_delete, sender=Token)
+def forget_deleted_token(sender, instance, **kwargs):
+    invalidate_token(instance.key)
+
+
+@receiver(post_save, sender=User)
+def forget_user_tokens(sender, instance, created, **kwargs):
+    if created:
+        return
+    for key in Token.objects.filter(user=instance).values_list('key', flat=True):
+        invalidate_token(key)
@@ -1,3 +1,571 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import tracemalloc
+from unittest import skipUnless
+from unittest.mock import patch
 
-# Create your tests here.
+import msgpack
+from asgiref.sync import async_to_sync, sync_to_async
+
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import AnonymousUser, User
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import re_path
+
+from api import translation
+from api.async_translation import get_provider, reset_provider
+from api.models import Profile
+from rest_framework.authtoken.models import Token
+
+from .layer_bench import CORE_BACKEND, PUBSUB_BACKEND, layer_config, run_benchmark
+from .consumers import ChatConsumer
+from .local_redis import LocalRedisServer
+from .middleware import get_user
+from .outbound import outbound_stats, reset_outbound_stats
+from .registry import RoomLanguageRegistry, room_languages, room_presence
+from .routing import websocket_urlpatterns
+from . import wire
+
+
+def make_user(username, language):
+    user = User.objects.create_user(username, f'{username}@test.com', 'pass1234')
+    user.profile.language_preference = language
+    user.profile.save()
+    return user
+
+
+async def connect(user, room='sala', urlpatterns=websocket_urlpatterns, subprotocols=None):
+    communicator = WebsocketCommunicator(URLRouter(urlpatterns), f'/ws/chat/{room}/', subprotocols=subprotocols)
+    communicator.scope['user'] = user
+    connected, subprotocol = await communicator.connect()
+    assert connected
+    communicator.accepted_subprotocol = subprotocol
+    return communicator
+
+
+class RoomLanguageRegistryTests(TestCase):
+
+    def test_languages_follow_members(self):
+        registry = RoomLanguageRegistry()
+        registry.join('sala', 'c1', 'es')
+        registry.join('sala', 'c2', 'en')
+        registry.join('sala', 'c3', 'en')
+        self.assertEqual(registry.languages('sala'), {'es', 'en'})
+        registry.leave('sala', 'c2')
+        registry.leave('sala', 'c3')
+        self.assertEqual(registry.languages('sala'), {'es'})
+        registry.leave('sala', 'c1')
+        self.assertEqual(registry.member_count('sala'), 0)
+
+
+FAKE_PROVIDER = {'BACKEND': 'api.async_translation.FakeTranslationProvider', 'OPTIONS': {}}
+SLOW_FAKE_PROVIDER = {'BACKEND': 'api.async_translation.FakeTranslationProvider', 'OPTIONS': {'delay': 0.05}}
+
+
+@override_settings(TRANSLATION_PROVIDER=FAKE_PROVIDER)
+class ChatFanOutTests(TransactionTestCase):
+    """
+    El emisor traduce una vez por idioma; cada receptor toma su entrada.
+    Channels cierra las conexiones a la BD al desconectar, por eso se usa
+    TransactionTestCase.
+    """
+
+    def setUp(self):
+        room_languages.clear()
+        translation.clear_translation_cache()
+        reset_provider()
+        self.sender = make_user('emisor', 'es')
+        self.receivers = [make_user(f'receptor{i}', lang) for i, lang in enumerate(['en', 'en', 'fr', 'es'])]
+
+    async def test_message_is_translated_once_per_language(self):
+        sender = await connect(self.sender)
+        receivers = [await connect(user) for user in self.receivers]
+
+        await sender.send_json_to({'message': 'Hola', 'type': 'text'})
+        received = [await communicator.receive_json_from() for communicator in receivers]
+        await sender.receive_json_from()
+
+        self.assertEqual(len(get_provider().calls), 2)
+        self.assertEqual([r['message'] for r in received], ['[en] Hola', '[en] Hola', '[fr] Hola', 'Hola'])
+
+        for communicator in [sender] + receivers:
+            await communicator.disconnect()
+        self.assertEqual(room_languages.member_count('chat_sala'), 0)
+
+    async def test_receiver_missing_from_map_translates_itself(self):
+        sender = await connect(self.sender)
+        receiver = await connect(self.receivers[2])
+        # Simula un receptor conectado a otro proceso: no está en el registro local
+        room_languages.clear()
+        room_languages.join('chat_sala', 'otro', 'es')
+
+        await sender.send_json_to({'message': 'Hola', 'type': 'text'})
+        self.assertEqual((await receiver.receive_json_from())['message'], '[fr] Hola')
+        self.assertEqual(len(get_provider().calls), 1)
+
+        await sender.disconnect()
+        await receiver.disconnect()
+
+
+@override_settings(VOICE_COALESCE_WINDOW=0.2, TRANSLATION_PROVIDER=SLOW_FAKE_PROVIDER)
+class VoiceCoalescingTests(TransactionTestCase):
+    """
+    Los fragmentos de voz de cada hablante se agrupan y se traducen una vez
+    por idioma (con un traductor falso que tarda 50 ms por llamada).
+    """
+
+    def setUp(self):
+        room_languages.clear()
+        translation.clear_translation_cache()
+        reset_provider()
+        self.speaker = make_user('hablante', 'es')
+        self.listeners = [make_user('oyente_en', 'en'), make_user('oyente_fr', 'fr')]
+
+    async def _voice(self, communicator, text):
+        await communicator.send_json_to({'message': text, 'type': 'voice', 'timestamp': text})
+
+    async def test_fragments_in_one_window_are_sent_once(self):
+        speaker = await connect(self.speaker)
+        listeners = [await connect(user) for user in self.listeners]
+        for word in ['uno', 'dos', 'tres', 'cuatro', 'cinco']:
+            await self._voice(speaker, word)
+
+        received = [await listener.receive_json_from() for listener in listeners]
+        self.assertEqual([r['message'] for r in received],
+                         ['[en] uno dos tres cuatro cinco', '[fr] uno dos tres cuatro cinco'])
+        self.assertEqual(received[0]['timestamp'], 'uno')
+        self.assertEqual(len(get_provider().calls), 2)
+        for listener in listeners:
+            self.assertTrue(await listener.receive_nothing(0.3))
+
+        for communicator in [speaker] + listeners:
+            await communicator.disconnect()
+
+    async def test_later_fragments_arrive_as_updates_in_order(self):
+        speaker = await connect(self.speaker)
+        listener = await connect(self.listeners[0])
+        await self._voice(speaker, 'hola')
+        await asyncio.sleep(0.3)
+        await self._voice(speaker, 'qué tal')
+        await self._voice(speaker, 'estás')
+        messages = [(await listener.receive_json_from())['message'] for _ in range(2)]
+        self.assertEqual(messages, ['[en] hola', '[en] qué tal estás'])
+
+        # Lo pendiente se envía al desconectar sin esperar a la ventana
+        await self._voice(speaker, 'adiós')
+        await speaker.disconnect()
+        self.assertEqual((await listener.receive_json_from())['message'], '[en] adiós')
+        await listener.disconnect()
+
+
+class TrackedChatConsumer(ChatConsumer):
+    """ChatConsumer que guarda sus instancias para inspeccionar la cola."""
+    instances = []
+
+    async def connect(self):
+        TrackedChatConsumer.instances.append(self)
+        await super().connect()
+
+
+tracked_urlpatterns = [re_path(r'^ws/chat/(?P<room_name>[^/]+)/$', TrackedChatConsumer.as_asgi())]
+
+
+# Como con Daphne, send no espera al cliente: solo la ventana de acks o, si el
+# cliente no los envía, el presupuesto de envío (unos 40 frames/s) frena la
+# tarea de escritura
+@override_settings(CHAT_OUTBOUND_HIGH_WATER=20, CHAT_OUTBOUND_MAX_FRAMES=50,
+                   CHAT_OUTBOUND_BYTES_PER_SECOND=5000, CHAT_OUTBOUND_BURST_BYTES=500, CHANNEL_LAYERS={
+                       'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer', 'CONFIG': {'capacity': 1000}}})
+class SlowClientTests(TransactionTestCase):
+    """
+    La cola de salida no crece sin límite aunque el servidor acepte todos los
+    envíos: la tarea de escritura no pasa de la ventana de acks del cliente
+    (o, sin acks, del presupuesto de la conexión) y lo demás se agrupa o
+    descarta en la cola. La capa de canales admite todos los eventos.
+    """
+
+    def setUp(self):
+        room_languages.clear()
+        room_presence.clear()
+        reset_outbound_stats()
+        TrackedChatConsumer.instances = []
+        self.user = make_user('lento', 'es')
+
+    async def _drain(self, communicator):
+        frames = []
+        while not await communicator.receive_nothing(0.2):
+            frames.append(await communicator.receive_json_from())
+        return frames
+
+    async def test_voice_and_presence_are_coalesced_under_load(self):
+        communicator = await connect(self.user, urlpatterns=tracked_urlpatterns)
+        consumer = TrackedChatConsumer.instances[0]
+        layer = get_channel_layer()
+        for i in range(300):
+            speaker = f'hablante{i % 10}'
+            await layer.group_send('chat_sala', {
+                'type': 'chat_message', 'message': f'f{i}', 'username': speaker, 'source_lang': 'es',
+                'message_type': 'voice', 'timestamp': str(i), 'translations': {}})
+            await layer.group_send('chat_sala', {
+                'type': 'presence_mute', 'channel': f'otro{i % 10}', 'username': speaker,
+                'is_muted': i % 2 == 0, 'timestamp': str(i)})
+            await asyncio.sleep(0)
+
+        frames = await self._drain(communicator)
+        stats = outbound_stats()
+        self.assertLessEqual(consumer.outbound.peak, 50)
+        self.assertGreater(stats['coalesced'], 0)
+        self.assertGreater(stats['paced'], 0)
+        self.assertLess(len(frames), 600)
+        # El último estado de cada usuario llega aunque se agrupen los intermedios
+        last_mute = {f['username']: f['isMuted'] for f in frames if f['type'] == 'mute_status'}
+        self.assertEqual(last_mute, {f'hablante{i % 10}': i % 2 == 0 for i in range(290, 300)})
+        voice_text = ' '.join(f['message'] for f in frames if f['type'] == 'voice')
+        self.assertIn('f299', voice_text)
+        await communicator.disconnect()
+
+    @override_settings(CHAT_OUTBOUND_HIGH_WATER=5, CHAT_OUTBOUND_MAX_FRAMES=10)
+    async def test_text_overflow_closes_the_connection(self):
+        communicator = await connect(self.user, urlpatterns=tracked_urlpatterns)
+        layer = get_channel_layer()
+        for i in range(30):
+            await layer.group_send('chat_sala', {
+                'type': 'chat_message', 'message': f'texto {i}', 'username': 'otro', 'source_lang': 'es',
+                'message_type': 'text', 'timestamp': '', 'translations': {}})
+        while True:
+            output = await communicator.receive_output(1)
+            if output['type'] == 'websocket.close':
+                break
+        self.assertEqual(output['code'], 4008)
+        self.assertEqual(outbound_stats()['overflows'], 1)
+        await communicator.disconnect()
+
+    @override_settings(CHAT_OUTBOUND_WINDOW_BYTES=16 * 1024, CHAT_ACK_TIMEOUT=2)
+    async def test_stalled_reader_keeps_server_memory_bounded(self):
+        communicator = await connect(self.user, urlpatterns=tracked_urlpatterns)
+        consumer = TrackedChatConsumer.instances[0]
+        await communicator.send_json_to({'type': 'ack', 'seq': 0})
+        layer = get_channel_layer()
+        # Unos 2 MB de presencia de 20 usuarios; el cliente no lee ni confirma nada
+        names = [f'{i:02d}' + 'x' * 1000 for i in range(20)]
+        tracemalloc.start()
+        try:
+            baseline = tracemalloc.get_traced_memory()[0]
+            for i in range(2000):
+                await layer.group_send('chat_sala', {
+                    'type': 'presence_mute', 'channel': 'otro', 'username': names[i % 20],
+                    'is_muted': i % 2 == 0, 'timestamp': str(i)})
+                await asyncio.sleep(0)
+            peak = tracemalloc.get_traced_memory()[1] - baseline
+        finally:
+            tracemalloc.stop()
+        self.assertLess(peak, 512 * 1024)
+        self.assertLessEqual(consumer.ack_window.peak, 16 * 1024)
+        self.assertLessEqual(consumer.outbound.peak, 50)
+        self.assertGreater(outbound_stats()['coalesced'], 0)
+
+        # Lo entregado al servidor (el búfer de Twisted en Daphne) no pasa de
+        # la ventana, y la conexión se cierra al no llegar ningún ack
+        delivered = 0
+        while True:
+            output = await communicator.receive_output(5)
+            if output['type'] == 'websocket.close':
+                break
+            delivered += len(output['text'])
+        self.assertLessEqual(delivered, 16 * 1024)
+        self.assertEqual(output['code'], 4008)
+        stats = outbound_stats()
+        self.assertEqual((stats['stalled'], stats['paced']), (1, 0))
+        await communicator.disconnect()
+
+    @override_settings(CHAT_OUTBOUND_WINDOW_BYTES=4096)
+    async def test_acking_client_is_not_paced(self):
+        communicator = await connect(self.user, urlpatterns=tracked_urlpatterns)
+        consumer = TrackedChatConsumer.instances[0]
+        await communicator.send_json_to({'type': 'ack', 'seq': 0})
+        layer = get_channel_layer()
+        received = []
+        for batch in range(20):
+            for i in range(10):
+                await layer.group_send('chat_sala', {
+                    'type': 'chat_message', 'message': f'texto {batch}-{i} ' + 'y' * 200, 'username': 'otro',
+                    'source_lang': 'es', 'message_type': 'text', 'timestamp': '', 'translations': {}})
+            for _ in range(10):
+                received.append(await communicator.receive_json_from())
+                await communicator.send_json_to({'type': 'ack', 'seq': len(received)})
+        # 200 frames de unos 250 bytes: con el presupuesto (5000 B/s) tardarían 10 s
+        self.assertEqual(len(received), 200)
+        self.assertEqual(received[-1]['message'], 'texto 19-9 ' + 'y' * 200)
+        stats = outbound_stats()
+        self.assertEqual((stats['paced'], stats['overflows'], stats['stalled']), (0, 0, 0))
+        self.assertLessEqual(consumer.ack_window.peak, 4096)
+        await communicator.disconnect()
+
+    @override_settings(CHAT_OUTBOUND_BYTES_PER_SECOND=0)
+    async def test_without_budget_the_queue_drains_at_once(self):
+        communicator = await connect(self.user, urlpatterns=tracked_urlpatterns)
+        consumer = TrackedChatConsumer.instances[0]
+        layer = get_channel_layer()
+        for i in range(100):
+            await layer.group_send('chat_sala', {
+                'type': 'presence_mute', 'channel': 'otro', 'username': 'otro',
+                'is_muted': i % 2 == 0, 'timestamp': str(i)})
+            await asyncio.sleep(0)
+        self.assertEqual(len(await self._drain(communicator)), 100)
+        self.assertLessEqual(consumer.outbound.peak, 2)
+        self.assertEqual(outbound_stats()['paced'], 0)
+        await communicator.disconnect()
+
+
+class WireFormatTests(TestCase):
+
+    def test_shared_part_encodes_like_the_full_payload(self):
+        fields = {'username': 'ana', 'type': 'voice', 'timestamp': '2025-01-01T10:00:00'}
+        payload = {'message': 'Hola "mundo" ñ', **fields, wire.SHARED: wire.encode_shared(fields)}
+        plain = {'message': 'Hola "mundo" ñ', **fields}
+        self.assertEqual(json.loads(wire.encode_frame(payload, wire.JSON)), plain)
+        self.assertEqual(msgpack.unpackb(wire.encode_frame(payload, wire.MSGPACK)), plain)
+        self.assertEqual(json.loads(wire.encode_frame(plain, wire.JSON)), plain)
+
+    def test_negotiation(self):
+        self.assertEqual(wire.negotiate(['chat.msgpack']), (wire.MSGPACK, 'chat.msgpack'))
+        self.assertEqual(wire.negotiate([]), (wire.JSON, None))
+
+
+class MsgpackSubprotocolTests(TransactionTestCase):
+
+    def setUp(self):
+        room_languages.clear()
+        self.ana = make_user('ana', 'es')
+        self.beto = make_user('beto', 'es')
+
+    async def test_msgpack_and_json_clients_share_a_room(self):
+        binary = await connect(self.ana, subprotocols=['chat.msgpack'])
+        text = await connect(self.beto)
+        self.assertEqual(binary.accepted_subprotocol, 'chat.msgpack')
+        self.assertIsNone(text.accepted_subprotocol)
+
+        await binary.send_to(bytes_data=msgpack.packb({'message': 'Hola', 'type': 'text', 'timestamp': 't1'}))
+        expected = {'message': 'Hola', 'username': 'ana', 'type': 'text', 'timestamp': 't1'}
+        self.assertEqual(msgpack.unpackb(await binary.receive_from()), expected)
+        self.assertEqual(await text.receive_json_from(), expected)
+
+        await binary.disconnect()
+        await text.disconnect()
+
+
+class MultiProcessChannelLayerTests(TestCase):
+    """group_send llega a consumidores de otros procesos a través de Redis."""
+
+    def assert_every_worker_received(self, config):
+        rows = run_benchmark(config, workers=2, sizes=[64, 4096], messages=20, timeout=30)
+        self.assertEqual([row['size'] for row in rows], [64, 4096])
+        for row in rows:
+            self.assertEqual(row['received'], [20, 20])
+
+    def test_benchmark_uses_the_configured_layer(self):
+        redis = {'BACKEND': CORE_BACKEND, 'CONFIG': {'hosts': ['redis://a:6379'], 'capacity': 1500}}
+        with override_settings(CHANNEL_LAYERS={'default': redis}):
+            self.assertEqual(layer_config('redis://b:6379'), {
+                'BACKEND': CORE_BACKEND, 'CONFIG': {'hosts': ['redis://b:6379'], 'capacity': 1500}})
+        # Con la capa en memoria (sin REDIS_URL) se mide la de producción
+        self.assertEqual(layer_config('redis://b:6379')['BACKEND'], CORE_BACKEND)
+
+    @skipUnless(os.environ.get('REDIS_URL'), 'RedisChannelLayer necesita un Redis real (REDIS_URL)')
+    def test_group_send_reaches_every_worker_process(self):
+        self.assert_every_worker_received(layer_config(os.environ['REDIS_URL']))
+
+    def test_pubsub_group_send_reaches_every_worker_process(self):
+        # El servidor local solo implementa publicar/suscribir
+        server = LocalRedisServer()
+        redis_url = server.start()
+        try:
+            self.assert_every_worker_received(layer_config(redis_url, backend=PUBSUB_BACKEND))
+        finally:
+            server.stop()
+
+
+class PresenceTests(TransactionTestCase):
+    """La lista de la sala de voz se envía una vez al entrar; después solo cambios."""
+
+    def setUp(self):
+        room_languages.clear()
+        room_presence.clear()
+        self.ana = make_user('ana', 'es')
+        self.beto = make_user('beto', 'es')
+
+    async def test_join_list_and_deltas(self):
+        ana = await connect(self.ana)
+        await ana.send_json_to({'message': 'joined', 'type': 'join'})
+        self.assertEqual(await ana.receive_json_from(),
+                         {'type': 'presence_list', 'members': [{'username': 'ana', 'isMuted': False}]})
+
+        beto = await connect(self.beto)
+        await beto.send_json_to({'message': 'joined', 'type': 'join', 'isMuted': True})
+        members = (await beto.receive_json_from())['members']
+        self.assertEqual(members, [{'username': 'ana', 'isMuted': False}, {'username': 'beto', 'isMuted': True}])
+        delta = await ana.receive_json_from()
+        self.assertEqual((delta['type'], delta['username'], delta['isMuted']), ('join', 'beto', True))
+
+        await beto.send_json_to({'message': 'mute_status', 'type': 'mute_status', 'isMuted': False})
+        delta = await ana.receive_json_from()
+        self.assertEqual((delta['type'], delta['isMuted']), ('mute_status', False))
+
+        # presence_request ya no se difunde: solo responde a quien lo pide
+        await ana.send_json_to({'message': 'request_presence', 'type': 'presence_request'})
+        self.assertEqual(len((await ana.receive_json_from())['members']), 2)
+        self.assertTrue(await beto.receive_nothing())
+
+        await beto.disconnect()
+        delta = await ana.receive_json_from()
+        self.assertEqual((delta['type'], delta['username']), ('leave', 'beto'))
+        self.assertEqual(room_presence.members('chat_sala'), [{'username': 'ana', 'isMuted': False}])
+        await ana.disconnect()
+
+    async def test_member_from_other_process_receives_snapshot(self):
+        ana = await connect(self.ana)
+        await ana.send_json_to({'message': 'joined', 'type': 'join'})
+        await ana.receive_json_from()
+
+        beto = await connect(self.beto)
+        # Simula que beto está conectado a otro proceso
+        beto_channel = room_languages.channels('chat_sala')[-1]
+        room_languages.leave('chat_sala', beto_channel)
+        await beto.send_json_to({'message': 'joined', 'type': 'join'})
+        lists = [await beto.receive_json_from(), await beto.receive_json_from()]
+        self.assertEqual([m['type'] for m in lists], ['presence_list', 'presence_list'])
+        self.assertIn({'username': 'ana', 'isMuted': False}, lists[-1]['members'])
+
+        await beto.disconnect()
+        await ana.disconnect()
+
+
+@override_settings(CHAT_QUOTA_LEASE_SIZE=5)
+class ProfileStateTests(TransactionTestCase):
+    """El perfil se lee al conectar; los mensajes no consultan la BD salvo al reservar cupo."""
+
+    def setUp(self):
+        room_languages.clear()
+        self.user = make_user('cupo', 'es')
+
+    async def _send_texts(self, communicator, count):
+        replies = []
+        for i in range(count):
+            await communicator.send_json_to({'message': f'mensaje {i}', 'type': 'text'})
+            replies.append(await communicator.receive_json_from())
+        return replies
+
+    def _db_count(self):
+        return Profile.objects.get(user=self.user).daily_messages_count
+
+    async def test_quota_is_leased_in_blocks_and_released_on_disconnect(self):
+        await sync_to_async(Profile.objects.filter(user=self.user).update)(subscription_plan='premium')
+        communicator = await connect(self.user)
+        await self._send_texts(communicator, 1)
+        self.assertEqual(await sync_to_async(self._db_count)(), 5)
+
+        with patch('chat.consumers.quotas') as quota_service, patch('chat.consumers.Profile') as profile_model:
+            await self._send_texts(communicator, 4)
+        self.assertFalse(quota_service.mock_calls)
+        self.assertFalse(profile_model.mock_calls)
+
+        await self._send_texts(communicator, 2)
+        self.assertEqual(await sync_to_async(self._db_count)(), 10)
+        await communicator.disconnect()
+        self.assertEqual(await sync_to_async(self._db_count)(), 7)
+
+    async def test_free_plan_limit(self):
+        await sync_to_async(Profile.objects.filter(user=self.user).update)(daily_messages_count=9)
+        communicator = await connect(self.user)
+        replies = await self._send_texts(communicator, 2)
+        self.assertEqual(replies[0]['message'], 'mensaje 0')
+        self.assertEqual(replies[1]['type'], 'system')
+        await communicator.disconnect()
+        self.assertEqual(await sync_to_async(self._db_count)(), 10)
+
+    async def test_limited_plan_is_shared_between_connections(self):
+        # Dos pestañas: lo que no gasta una queda disponible para la otra
+        first = await connect(self.user)
+        second = await connect(self.user, room='otra')
+        await self._send_texts(first, 1)
+        self.assertEqual(await sync_to_async(self._db_count)(), 1)
+        replies = await self._send_texts(second, 10)
+        self.assertEqual([r['message'] for r in replies[:9]], [f'mensaje {i}' for i in range(9)])
+        self.assertEqual(replies[9]['type'], 'system')
+        await first.disconnect()
+        await second.disconnect()
+        self.assertEqual(await sync_to_async(self._db_count)(), 10)
+
+    async def test_profile_changes_reach_open_connections(self):
+        communicator = await connect(self.user)
+        self.assertEqual(room_languages.languages('chat_sala'), {'es'})
+
+        def change_language():
+            profile = Profile.objects.get(user=self.user)
+            profile.language_preference = 'fr'
+            profile.save()
+
+        await sync_to_async(change_language)()
+        for _ in range(50):
+            if room_languages.languages('chat_sala') == {'fr'}:
+                break
+            await asyncio.sleep(0.02)
+        self.assertEqual(room_languages.languages('chat_sala'), {'fr'})
+        await communicator.disconnect()
+
+
+
+class TokenCacheTests(TransactionTestCase):
+    """
+    El usuario de cada token se cachea en Redis, compartido por los procesos;
+    logout o cambios del usuario lo invalidan.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = LocalRedisServer()
+        cls.settings_override = override_settings(CHAT_TOKEN_CACHE_URL=cls.server.start())
+        cls.settings_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings_override.disable()
+        cls.server.stop()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.user = User.objects.create_user('movil', 'movil@test.com', 'pass1234')
+        self.token = Token.objects.create(user=self.user)
+        self.lookup = async_to_sync(get_user)
+
+    def test_reconnects_hit_the_cache(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.lookup(self.token.key), self.user)
+        # El acierto no pasa por el hilo de la BD
+        with self.assertNumQueries(0), patch('chat.middleware._load_user') as load_user:
+            self.assertEqual(self.lookup(self.token.key).username, 'movil')
+        load_user.assert_not_called()
+
+    def test_without_shared_cache_every_lookup_reads_the_database(self):
+        with override_settings(CHAT_TOKEN_CACHE_URL=''):
+            for _ in range(2):
+                with self.assertNumQueries(1):
+                    self.assertEqual(self.lookup(self.token.key), self.user)
+
+    def test_logout_invalidates_token(self):
+        self.lookup(self.token.key)
+        self.token.delete()
+        self.assertIsInstance(self.lookup(self.token.key), AnonymousUser)
+
+    def test_user_changes_invalidate_token(self):
+        self.lookup(self.token.key)
+        self.user.is_active = False
+        self.user.save()
+        self.assertIsInstance(self.lookup(self.token.key), AnonymousUser)
+
+    def test_unknown_token(self):
+        self.assertIsInstance(self.lookup('no-existe'), AnonymousUser)
@@ -0,0 +1,64 @@
+"""
+Formato de los frames del chat en el WebSocket.
+
+JSON es el formato por defecto. Un cliente puede pedir msgpack (frames
+binarios, más pequeños y rápidos de codificar) con el subprotocolo
+`chat.msgpack` al abrir la conexión.
+
+En los mensajes difundidos a la sala solo cambia el texto de cada receptor
+(su traducción); el resto (usuario, tipo, hora) es igual para todos. El
+emisor lo codifica una vez en ambos formatos con `encode_shared` y lo manda
+en el evento; cada receptor solo codifica su texto y lo une (`encode_frame`).
+"""
+import json
+
+import msgpack
+
+JSON = 'json'
+MSGPACK = 'msgpack'
+MSGPACK_SUBPROTOCOL = 'chat.msgpack'
+
+# Clave del payload con la parte común ya codificada
+SHARED = '_wire'
+
+
+def negotiate(subprotocols):
+    """Formato según los subprotocolos que ofrece el cliente: (formato, subprotocolo aceptado)."""
+    if MSGPACK_SUBPROTOCOL in (subprotocols or []):
+        return MSGPACK, MSGPACK_SUBPROTOCOL
+    return JSON, None
+
+
+def decode(text_data=None, bytes_data=None):
+    if bytes_data is not None:
+        return msgpack.unpackb(bytes_data, raw=False)
+    return json.loads(text_data)
+
+
+def encode_shared(fields):
+    """Codifica una vez los campos comunes de un mensaje difundido."""
+    return {
+        JSON: json.dumps(fields)[1:-1],
+        # Cabecera del mapa (con 'message') + clave 'message', y el resto de pares
+        MSGPACK: (
+            msgpack.Packer().pack_map_header(len(fields) + 1) + msgpack.packb('message'),
+            b''.join(msgpack.packb(key) + msgpack.packb(value) for key, value in fields.items()),
+        ),
+    }
+
+
+def encode_frame(payload, wire_format):
+    """
+    Codifica un payload para el cliente: str en JSON, bytes en msgpack. Si
+    trae la parte común precodificada, solo se codifica 'message'.
+    """
+    shared = payload.get(SHARED)
+    if shared is None:
+        payload = {key: value for key, value in payload.items() if key != SHARED}
+        return msgpack.packb(payload) if wire_format == MSGPACK else json.dumps(payload)
+
+    message = payload['message']
+    if wire_format == MSGPACK:
+        prefix, rest = shared[MSGPACK]
+        return prefix + msgpack.packb(message) + rest
+    return '{"message": ' + json.dumps(message) + ', ' + shared[JSON] + '}'
@@ -14,4 +14,59 @@ export const sendAIPrompt = async (prompt) => {
         console.error('Error al comunicarse con la IA:', error);
         throw error;
     }
-};
\ No newline at end of file
+};
+
+/**
+ * Envía un prompt al asistente y recibe la respuesta en streaming (SSE).
+ * onEvent(evento, datos) recibe 'progress', 'token', 'result' y 'error';
+ * la promesa se resuelve con el resultado final (el mismo de sendAIPrompt).
+ * Las respuestas de error (401, 429...) y los eventos 'error' rechazan la
+ * promesa con un Error cuyo mensaje es el del servidor.
+ */
+export const streamAIPrompt = async (prompt, onEvent = () => {}) => {
+    const response = await fetch(`${apiClient.defaults.baseURL}/ai-assistant/stream/`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'Accept': 'text/event-stream',
+            'Authorization': apiClient.defaults.headers.common['Authorization'],
+        },
+        body: JSON.stringify({ prompt }),
+    });
+
+    if (!response.ok) {
+        // El servidor responde el error como evento SSE o como JSON
+        const body = await response.text();
+        let message = `Error ${response.status} al comunicarse con la IA`;
+        try {
+            const payload = JSON.parse(body.match(/^data: (.*)$/m)?.[1] ?? body);
+            message = payload?.error || payload?.detail || message;
+        } catch {
+            // Cuerpo vacío o no JSON: se queda el mensaje genérico
+        }
+        const error = new Error(message);
+        error.status = response.status;
+        throw error;
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let result = null;
+    for (;;) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const frames = buffer.split('\n\n');
+        buffer = frames.pop();
+        for (const frame of frames) {
+            const event = frame.match(/^event: (.*)$/m)?.[1];
+            const data = JSON.parse(frame.match(/^data: (.*)$/m)?.[1] ?? 'null');
+            onEvent(event, data);
+            if (event === 'result') result = data;
+            if (event === 'error') throw new Error(data?.error || 'Error al comunicarse con la IA');
+        }
+    }
+    if (result === null) throw new Error('La respuesta de la IA terminó sin resultado');
+    return result;
+};
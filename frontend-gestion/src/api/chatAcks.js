@@ -0,0 +1,32 @@
+/**
+ * Confirmaciones (acks) de lo recibido por el WebSocket del chat. El servidor
+ * deja de enviar cuando hay demasiados bytes sin confirmar y cierra la
+ * conexión si no llega ninguno (ver chat/outbound.py en el backend). Los
+ * frames recibidos se confirman juntos, como mucho cada ACK_INTERVAL_MS.
+ */
+const ACK_INTERVAL_MS = 100;
+
+export const createAckSender = (socket) => {
+  let received = 0;
+  let timer = null;
+
+  const flush = () => {
+    timer = null;
+    if (socket.readyState === WebSocket.OPEN) {
+      socket.send(JSON.stringify({ type: 'ack', seq: received }));
+    }
+  };
+
+  return {
+    // Al abrir: el primer ack activa la ventana en el servidor
+    start: flush,
+    received: () => {
+      received += 1;
+      if (!timer) timer = setTimeout(flush, ACK_INTERVAL_MS);
+    },
+    stop: () => {
+      clearTimeout(timer);
+      timer = null;
+    },
+  };
+};
@@ -1,3 +1,5 @@
+import { createAckSender } from './chatAcks';
+
 class WebSocketService {
   static instance = null;
   callbacks = {}; // Almacena funciones para actualizar la UI
@@ -34,12 +36,14 @@ class WebSocketService {
     const path = `${wsHost}/ws/chat/${roomName}/?token=${token}`;
     
     this.socketRef = new WebSocket(path);
+    // Confirmar al servidor lo recibido (ver chatAcks.js)
+    const acks = createAckSender(this.socketRef);
 
     // ... (el resto del codigo onopen, onmessage, etc. sigue igual)
-    this.socketRef.onopen = () => { console.log('âœ… WebSocket conectado correctamente'); };
-    this.socketRef.onmessage = (e) => { this.socketNewMessage(e.data); };
+    this.socketRef.onopen = () => { acks.start(); console.log('âœ… WebSocket conectado correctamente'); };
+    this.socketRef.onmessage = (e) => { acks.received(); this.socketNewMessage(e.data); };
     this.socketRef.onerror = (e) => { console.error('âŒ Error de WebSocket:', e); };
-    this.socketRef.onclose = () => { console.log('ðŸ”Œ WebSocket desconectado'); };
+    this.socketRef.onclose = () => { acks.stop(); console.log('ðŸ”Œ WebSocket desconectado'); };
   }
 
   // Desconectar
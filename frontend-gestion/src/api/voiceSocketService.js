@@ -1,3 +1,5 @@
+import { createAckSender } from './chatAcks';
+
 class VoiceSocketService {
   static instance = null;
   callbacks = {}; // Almacena funciones para actualizar la UI
@@ -33,12 +35,16 @@ class VoiceSocketService {
     const path = `${wsHost}/ws/chat/${roomName}/?token=${token}`;
     
     this.socketRef = new WebSocket(path);
+    // Confirmar al servidor lo recibido (ver chatAcks.js)
+    const acks = createAckSender(this.socketRef);
 
     this.socketRef.onopen = () => { 
+      acks.start();
       console.log('✅ [VOICE] WebSocket de voz conectado correctamente'); 
     };
     
     this.socketRef.onmessage = (e) => { 
+      acks.received();
       this.socketNewMessage(e.data); 
     };
     
@@ -47,6 +53,7 @@ class VoiceSocketService {
     };
     
     this.socketRef.onclose = () => { 
+      acks.stop();
       console.log('🔌 [VOICE] WebSocket de voz desconectado'); 
     };
   }
@@ -1,12 +1,14 @@
 import React, { useState, useRef, useEffect } from 'react';
 import { Textarea, Button, Loader, Alert, Stack, Text, ActionIcon, Tooltip, Badge, Group, Paper } from '@mantine/core';
 import { IconSparkles, IconCheck, IconAlertCircle, IconX, IconMinus, IconMaximize, IconMinimize, IconArrowsMove } from '@tabler/icons-react';
-import { sendAIPrompt } from '../api/aiService';
+import { streamAIPrompt } from '../api/aiService';
 
 const AIAssistantModal = ({ opened, onClose, onSuccess }) => {
   const [prompt, setPrompt] = useState('');
   const [loading, setLoading] = useState(false);
   const [result, setResult] = useState(null);
+  // Texto que genera el modelo (resúmenes, mapas...), según va llegando
+  const [streamedText, setStreamedText] = useState('');
   const [isMinimized, setIsMinimized] = useState(false);
   const [isMaximized, setIsMaximized] = useState(false);
   const [position, setPosition] = useState({ x: window.innerWidth / 2 - 350, y: 100 });
@@ -67,9 +69,14 @@ const AIAssistantModal = ({ opened, onClose, onSuccess }) => {
 
     setLoading(true);
     setResult(null);
+    setStreamedText('');
 
     try {
-      const data = await sendAIPrompt(prompt);
+      const data = await streamAIPrompt(prompt, (event, payload) => {
+        if (event === 'token') {
+          setStreamedText((text) => text + payload.text);
+        }
+      });
       
       setResult({
         success: data.success,
@@ -101,6 +108,7 @@ const AIAssistantModal = ({ opened, onClose, onSuccess }) => {
   const handleClose = () => {
     setPrompt('');
     setResult(null);
+    setStreamedText('');
     onClose();
   };
 
@@ -276,6 +284,16 @@ const AIAssistantModal = ({ opened, onClose, onSuccess }) => {
                 }}
               />
 
+              {/* Respuesta del modelo en streaming */}
+              {streamedText && (
+                <div
+                  data-testid="ai-stream"
+                  style={{ background: '#f8f9fa', padding: '12px', borderRadius: 8, whiteSpace: 'pre-wrap' }}
+                >
+                  <Text size="sm">{streamedText}</Text>
+                </div>
+              )}
+
               {/* Resultado */}
               {result && (
                 <Alert
@@ -0,0 +1,86 @@
+import { afterEach, describe, expect, it, vi } from 'vitest';
+import { fireEvent, render, screen } from '@testing-library/react';
+import { MantineProvider } from '@mantine/core';
+import AIAssistantModal from './AIAssistantModal';
+
+const encoder = new TextEncoder();
+
+/**
+ * Respuesta de fetch cuyo cuerpo SSE se va enviando desde la prueba:
+ * cada send() entrega un evento al lector, end() cierra el stream.
+ */
+const streamingResponse = () => {
+  const chunks = [];
+  let waiting = null;
+  const push = (chunk) => {
+    if (waiting) {
+      const resolve = waiting;
+      waiting = null;
+      resolve(chunk);
+    } else {
+      chunks.push(chunk);
+    }
+  };
+  const reader = {
+    read: () => new Promise((resolve) => {
+      if (chunks.length) resolve(chunks.shift());
+      else waiting = resolve;
+    }),
+  };
+  return {
+    response: { ok: true, status: 200, body: { getReader: () => reader } },
+    send: (event, data) => push({
+      value: encoder.encode(`event: ${event}\ndata: ${JSON.stringify(data)}\n\n`),
+      done: false,
+    }),
+    end: () => push({ value: undefined, done: true }),
+  };
+};
+
+const submit = (prompt) => {
+  render(
+    <MantineProvider>
+      <AIAssistantModal opened onClose={() => {}} onSuccess={() => {}} />
+    </MantineProvider>
+  );
+  fireEvent.change(screen.getByPlaceholderText(/Escribe tu comando aquí/), { target: { value: prompt } });
+  fireEvent.click(screen.getByRole('button', { name: /Procesar con IA/ }));
+};
+
+describe('AIAssistantModal', () => {
+  afterEach(() => {
+    vi.unstubAllGlobals();
+  });
+
+  it('muestra los tokens según llegan, antes del resultado', async () => {
+    const stream = streamingResponse();
+    vi.stubGlobal('fetch', vi.fn().mockResolvedValue(stream.response));
+    submit('Resume el documento informe.pdf');
+
+    stream.send('progress', { stage: 'interpret' });
+    stream.send('token', { text: 'El informe ' });
+    expect((await screen.findByTestId('ai-stream')).textContent).toBe('El informe ');
+    expect(screen.queryByText('✓ Completado')).toBeNull();
+
+    stream.send('token', { text: 'trata de ventas.' });
+    await screen.findByText('El informe trata de ventas.');
+    expect(screen.queryByText('✓ Completado')).toBeNull();
+
+    stream.send('result', { success: true, message: 'Resumen guardado' });
+    stream.end();
+    await screen.findByText('Resumen guardado');
+    expect(screen.getByTestId('ai-stream').textContent).toBe('El informe trata de ventas.');
+  });
+
+  it('muestra el error de una respuesta no OK', async () => {
+    vi.stubGlobal('fetch', vi.fn().mockResolvedValue({
+      ok: false,
+      status: 429,
+      text: async () => `event: error\ndata: ${JSON.stringify({ error: 'Has superado tu cuota de IA.' })}\n\n`,
+    }));
+    submit('Etiqueta todos mis documentos');
+
+    await screen.findByText('Has superado tu cuota de IA.');
+    expect(screen.getByText('⚠ Error')).toBeTruthy();
+  });
+});
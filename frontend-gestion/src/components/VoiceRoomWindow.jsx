@@ -254,6 +254,16 @@ const VoiceRoomWindow = ({ roomName, onClose, position = 0 }) => {
         if (data.username === 'Sistema' || data.type === 'system') {
           return;
         }
+
+        // Lista completa de la sala (al entrar); después solo llegan cambios
+        if (data.type === 'presence_list') {
+          setParticipants(new Map(data.members.map((member) => [member.username, {
+            lastSeen: new Date(),
+            isSpeaking: false,
+            isMuted: member.isMuted
+          }])));
+          return;
+        }
         
         // Actualizar lista de participantes solo con usuarios reales
         if (data.username && data.username !== 'Sistema') {
@@ -282,16 +292,6 @@ const VoiceRoomWindow = ({ roomName, onClose, position = 0 }) => {
           return;
         }
         
-        if (data.type === 'presence_request' && data.username !== user?.username) {
-          setTimeout(() => {
-            const presenceResponse = {
-              message: 'present',
-              type: 'presence_response',
-              timestamp: new Date().toISOString()
-            };
-            VoiceSocketInstance.sendMessage(presenceResponse);
-          }, 100);
-        }
       };
       
       // Registrar callback UNA SOLA VEZ
@@ -314,16 +314,8 @@ const VoiceRoomWindow = ({ roomName, onClose, position = 0 }) => {
           type: 'join',
           timestamp: new Date().toISOString()
         };
+        // El servidor responde al join con la lista de participantes (presence_list)
         VoiceSocketInstance.sendMessage(joinMessage);
-        
-        setTimeout(() => {
-          const presenceRequest = {
-            message: 'request_presence',
-            type: 'presence_request',
-            timestamp: new Date().toISOString()
-          };
-          VoiceSocketInstance.sendMessage(presenceRequest);
-        }, 200);
       }, 800);
     }
     
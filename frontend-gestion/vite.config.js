@@ -17,4 +17,9 @@ export default defineConfig({
       },
     },
   },
+  // Pruebas de componentes (npm test)
+  test: {
+    environment: 'jsdom',
+    setupFiles: './src/setupTests.js',
+  },
 })